@@ -19,8 +19,11 @@ load_dotenv()
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # 导入数据库函数
-from database import get_all_articles_with_details, get_plain_text_by_title_id
+from corpus import get_all_articles_with_details, get_section_bodies
 from query_data import query_article_titles
+from bm25_index import prefilter_articles, prefilter_sections
+import embedding_index
+from reranker import rerank_sections
 
 # DeepSeek API配置
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
@@ -32,6 +35,20 @@ if not DEEPSEEK_API_KEY:
 client = OpenAI(api_key=DEEPSEEK_API_KEY, base_url=DEEPSEEK_BASE_URL)
 MODEL_NAME = "deepseek-chat"
 
+# BM25 预筛选：发给大模型的候选文章数和候选章节数，0 表示不筛选（发送全部）
+BM25_ARTICLE_CANDIDATES = int(os.getenv("BM25_ARTICLE_CANDIDATES", "0"))
+BM25_SECTION_CANDIDATES = int(os.getenv("BM25_SECTION_CANDIDATES", "0"))
+# 向量预筛选：按文章标题和摘要的向量相似度保留的候选文章数，0 表示不筛选
+# 与 BM25_ARTICLE_CANDIDATES 同时设置时先按向量筛选，再用 BM25 进一步缩小
+EMBEDDING_ARTICLE_CANDIDATES = int(os.getenv("EMBEDDING_ARTICLE_CANDIDATES", "0"))
+# 向量预筛选：按章节向量相似度保留的候选章节数，0 表示不筛选；
+# EMBEDDING_SECTION_SEARCH=ivf 时使用 IVF 近似最近邻索引（ann_index.py），默认 exact 为暴力检索
+EMBEDDING_SECTION_CANDIDATES = int(os.getenv("EMBEDDING_SECTION_CANDIDATES", "0"))
+# 章节重排序（reranker.py）: off 不使用；narrow 只把得分最高的 RERANK_CANDIDATES 个章节发给大模型；
+# replace 直接取得分最高的 2 个章节，不再调用大模型选章节
+RERANK_MODE = os.getenv("RERANK_MODE", "off").lower()
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "8"))
+
 def get_enhanced_deepseek_response_article(prompt, articles_details):
     """
     调用DeepSeek API获取模型响应，基于文章标题和摘要判断最相关文章
@@ -43,6 +60,13 @@ def get_enhanced_deepseek_response_article(prompt, articles_details):
     Returns:
         str: 最相关文章的标题
     """
+    if EMBEDDING_ARTICLE_CANDIDATES > 0:
+        articles_details = embedding_index.prefilter_articles(prompt, articles_details, EMBEDDING_ARTICLE_CANDIDATES)
+        print(f"向量预筛选后剩余 {len(articles_details)} 篇候选文章")
+    if BM25_ARTICLE_CANDIDATES > 0:
+        articles_details = prefilter_articles(prompt, articles_details, BM25_ARTICLE_CANDIDATES)
+        print(f"BM25 预筛选后剩余 {len(articles_details)} 篇候选文章")
+
     # 构建包含摘要的文章上下文
     articles_context = []
     for id, title, summary in articles_details:
@@ -119,6 +143,22 @@ def get_enhanced_deepseek_response_title(prompt, response_article):
     if not titles:
         print(f"文章 '{response_article}' 没有找到任何章节")
         return None, None
+
+    if EMBEDDING_SECTION_CANDIDATES > 0:
+        titles = embedding_index.prefilter_sections(prompt, titles, EMBEDDING_SECTION_CANDIDATES)
+        print(f"向量预筛选后剩余 {len(titles)} 个候选章节")
+    if BM25_SECTION_CANDIDATES > 0:
+        titles = prefilter_sections(prompt, titles, BM25_SECTION_CANDIDATES)
+        print(f"BM25 预筛选后剩余 {len(titles)} 个候选章节")
+
+    if RERANK_MODE == "replace":
+        ranked = rerank_sections(prompt, titles, 2)
+        print(f"重排序选出章节: {[(section['id'], round(score, 3)) for section, score in ranked]}")
+        return ", ".join(str(section["id"]) for section, _ in ranked), titles
+    if RERANK_MODE == "narrow":
+        candidate_ids = {section["id"] for section, _ in rerank_sections(prompt, titles, RERANK_CANDIDATES)}
+        titles = [t for t in titles if t["id"] in candidate_ids] or titles
+        print(f"重排序后剩余 {len(titles)} 个候选章节")
         
     # 直接使用JSON格式作为上下文，更加简洁且利于模型结构化理解
     context_str = json.dumps(titles, ensure_ascii=False, indent=2)
@@ -203,20 +243,18 @@ def get_deepseek_response_rag(prompt, response_title_ids):
     Returns:
         str: 模型的回答
     """
+    # 一次查询取回所有章节的正文；没有正文的标题已在入库时解析到第一个有正文的子章节
+    texts = get_section_bodies(response_title_ids)
+    
     all_contents = []
     for title_id in response_title_ids:
         # 获取正文内容
-        contents = get_plain_text_by_title_id(title_id)
-        
-        # 简单的容错逻辑：如果当前ID没内容，尝试找下一个ID（仅尝试一次）
-        if contents is None:
-            print(f"标题ID {title_id} 对应的正文为None，尝试下一个ID...")
-            contents = get_plain_text_by_title_id(title_id + 1)
+        contents = texts.get(title_id)
             
         if contents:
             all_contents.append(contents)
         else:
-            print(f"无法获取章节ID {title_id} (或 {title_id+1}) 的内容")
+            print(f"无法获取章节ID {title_id} 及其子章节的内容")
     
     if not all_contents:
         return "很抱歉，我无法获取到相关章节的具体内容，无法回答您的问题。"
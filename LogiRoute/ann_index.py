@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+章节向量的近似最近邻索引（IVF，纯 NumPy 实现）
+
+embedding_index.py 的暴力检索每个问题都要与全部章节向量做内积，章节数达到几十万时延迟随之线性增长。
+本索引离线用球面 k-means 把向量划分为 nlist 个簇，检索时只扫描与问题最近的 nprobe 个簇:
+
+- 主段按簇连续存放（vectors.npy + offsets.npy），启动时以只读内存映射打开，多个工作进程共享同一份页缓存。
+- 增量写入不改动主段: 新增向量进入小的增量段（暴力检索），删除记为墓碑；
+  按 title.id 更新即先删除再插入。增量段过大时 compact() 把它们按现有簇中心并入主段。
+- refresh() 通过变更日志和 embedding_index 同步有变化的文章。
+
+目录 ANN_INDEX_PATH 下的文件:
+    centroids.npy  簇中心 (nlist x 维度)
+    vectors.npy    主段向量，按簇排序 (N x 维度, float32)
+    ids.npy        主段 (title_id, article_id)
+    offsets.npy    第 i 个簇在主段中的范围为 offsets[i]:offsets[i+1]
+    delta_vectors.npy / delta_ids.npy / deleted.npy / meta.json
+
+用法:
+    python ann_index.py build    # 从 embedding_index 的向量矩阵训练并保存
+    python ann_index.py update   # 按变更日志增量更新，增量段过大时自动合并
+"""
+
+import json
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from changelog import ChangeConsumer
+from database import get_latest_change_version, save_change_checkpoint
+
+ANN_INDEX_PATH = os.getenv(
+    "ANN_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "ann_index")
+)
+# 检索时扫描的簇数，越大召回率越高、速度越慢
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))
+# 增量段超过主段的该比例时 refresh 后自动合并
+ANN_COMPACT_RATIO = float(os.getenv("ANN_COMPACT_RATIO", "0.1"))
+# k-means 迭代次数和每个簇的训练样本数
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLES_PER_LIST = 64
+# 分配向量到簇时每块的行数，限制内积矩阵的内存占用
+ASSIGN_CHUNK_ROWS = 65536
+# 索引文件格式版本，结构变化时递增
+INDEX_FORMAT_VERSION = 1
+# 变更日志中本索引的消费者名称
+ANN_CONSUMER = "ann_index"
+
+
+def default_nlist(count):
+    """簇数默认取 4 * sqrt(N)，每个簇平均约 sqrt(N) / 4 个向量"""
+    return max(1, min(count, int(4 * math.sqrt(count))))
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def assign_lists(vectors, centroids):
+    """返回每个向量最近（内积最大）的簇编号"""
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), ASSIGN_CHUNK_ROWS):
+        chunk = np.asarray(vectors[start:start + ASSIGN_CHUNK_ROWS], dtype=np.float32)
+        assignments[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+def train_centroids(vectors, nlist, seed=0):
+    """在采样的向量上训练球面 k-means，返回归一化的簇中心"""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), nlist * KMEANS_SAMPLES_PER_LIST)
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = assign_lists(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        counts = np.bincount(assignments, minlength=nlist)
+        # 空簇重新取一个随机样本作为中心
+        empty = counts == 0
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """
+    倒排文件（IVF）近似最近邻索引，向量须已归一化（内积即余弦相似度）
+
+    Attributes:
+        version (int): 已同步到的变更日志版本
+    """
+
+    def __init__(self, centroids, vectors, ids, offsets, version=0):
+        self.centroids = centroids
+        self.vectors = vectors
+        self.ids = ids
+        self.offsets = offsets
+        self.version = version
+        dimension = centroids.shape[1]
+        self.delta_vectors = np.zeros((0, dimension), dtype=np.float32)
+        self.delta_ids = np.zeros((0, 2), dtype=np.int64)
+        self.deleted = set()
+        self._alive = None
+
+    # ---------- 构建 ----------
+
+    @classmethod
+    def build(cls, vectors, title_ids, article_ids, nlist=None, version=0):
+        """训练簇中心并按簇重排向量"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        nlist = nlist or default_nlist(len(vectors))
+        centroids = train_centroids(vectors, nlist)
+        return cls._from_assignments(centroids, vectors, np.column_stack([title_ids, article_ids]), version)
+
+    @classmethod
+    def _from_assignments(cls, centroids, vectors, ids, version):
+        assignments = assign_lists(vectors, centroids)
+        order = np.argsort(assignments, kind="stable")
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=len(centroids)), out=offsets[1:])
+        return cls(centroids, np.ascontiguousarray(vectors[order]), np.ascontiguousarray(ids[order]),
+                   offsets, version)
+
+    def compact(self):
+        """把增量段并入主段并清除墓碑（沿用现有簇中心，不重新训练）"""
+        alive = self._alive_mask()
+        vectors = np.concatenate([np.asarray(self.vectors)[alive], self.delta_vectors])
+        ids = np.concatenate([np.asarray(self.ids)[alive], self.delta_ids])
+        compacted = IVFIndex._from_assignments(self.centroids, vectors, ids, self.version)
+        self.__dict__.update(compacted.__dict__)
+
+    # ---------- 增量更新 ----------
+
+    def _alive_mask(self):
+        """主段中未被删除的行"""
+        if self._alive is None:
+            self._alive = ~np.isin(self.ids[:, 0], np.fromiter(self.deleted, dtype=np.int64))
+        return self._alive
+
+    def delete(self, title_ids):
+        """按 title.id 删除（主段记墓碑，增量段直接移除）"""
+        title_ids = np.fromiter(title_ids, dtype=np.int64)
+        if not len(title_ids):
+            return
+        keep = ~np.isin(self.delta_ids[:, 0], title_ids)
+        self.delta_vectors = self.delta_vectors[keep]
+        self.delta_ids = self.delta_ids[keep]
+        in_main = title_ids[np.isin(title_ids, self.ids[:, 0])]
+        if len(in_main):
+            self.deleted.update(int(title_id) for title_id in in_main)
+            self._alive = None
+
+    def delete_articles(self, article_ids):
+        article_ids = np.fromiter(article_ids, dtype=np.int64)
+        title_ids = np.concatenate([
+            self.ids[np.isin(self.ids[:, 1], article_ids), 0],
+            self.delta_ids[np.isin(self.delta_ids[:, 1], article_ids), 0],
+        ])
+        self.delete(title_ids)
+
+    def insert(self, vectors, title_ids, article_ids):
+        """插入或覆盖（同一 title.id 的旧向量先被删除）"""
+        title_ids = np.asarray(title_ids, dtype=np.int64)
+        self.delete(title_ids)
+        self.delta_vectors = np.concatenate([self.delta_vectors, np.asarray(vectors, dtype=np.float32)])
+        self.delta_ids = np.concatenate([
+            self.delta_ids, np.column_stack([title_ids, np.asarray(article_ids, dtype=np.int64)])
+        ])
+
+    def refresh(self, embedding_index, consumer=None):
+        """
+        按变更日志同步有变化的文章，返回处理的变更条数
+
+        embedding_index 须已刷新到不低于本索引的版本（向量从其矩阵中取出，不重新编码）。
+        """
+        consumer = consumer or ChangeConsumer(ANN_CONSUMER)
+        processed = 0
+        while True:
+            changes = consumer.poll(after=self.version)
+            if changes is None or changes.version > embedding_index.version:
+                break
+            if changes.reload:
+                rebuilt = IVFIndex.build(embedding_index.matrix, embedding_index.title_ids,
+                                         embedding_index.article_ids, len(self.centroids), embedding_index.version)
+                self.__dict__.update(rebuilt.__dict__)
+                return processed + len(changes)
+            article_ids = changes.article_ids()
+            self.delete_articles(article_ids)
+            rows = np.isin(embedding_index.article_ids, np.fromiter(article_ids, dtype=np.int64))
+            if rows.any():
+                self.insert(embedding_index.matrix[rows], embedding_index.title_ids[rows],
+                            embedding_index.article_ids[rows])
+            self.version = changes.version
+            processed += len(changes)
+        if len(self.delta_ids) + len(self.deleted) > ANN_COMPACT_RATIO * max(len(self.ids), 1):
+            self.compact()
+        return processed
+
+    # ---------- 持久化 ----------
+
+    def save(self, path=ANN_INDEX_PATH):
+        """写入全部文件（先写临时文件再替换；已映射的旧文件在各进程重新加载前仍然有效）"""
+        os.makedirs(path, exist_ok=True)
+        arrays = {
+            "centroids": self.centroids,
+            "vectors": self.vectors,
+            "ids": self.ids,
+            "offsets": self.offsets,
+            "delta_vectors": self.delta_vectors,
+            "delta_ids": self.delta_ids,
+            "deleted": np.array(sorted(self.deleted), dtype=np.int64),
+        }
+        for name, array in arrays.items():
+            with open(os.path.join(path, f"{name}.npy.tmp"), "wb") as f:
+                np.save(f, array)
+        with open(os.path.join(path, "meta.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump({"format_version": INDEX_FORMAT_VERSION, "version": self.version}, f)
+        for name in arrays:
+            os.replace(os.path.join(path, f"{name}.npy.tmp"), os.path.join(path, f"{name}.npy"))
+        os.replace(os.path.join(path, "meta.json.tmp"), os.path.join(path, "meta.json"))
+
+    @classmethod
+    def load(cls, path=ANN_INDEX_PATH, mmap=True):
+        """读取索引，主段向量和ID默认以只读内存映射打开；文件不存在或格式不符时返回 None"""
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format_version") != INDEX_FORMAT_VERSION:
+            return None
+        mmap_mode = "r" if mmap else None
+        index = cls(
+            np.load(os.path.join(path, "centroids.npy")),
+            np.load(os.path.join(path, "vectors.npy"), mmap_mode=mmap_mode),
+            np.load(os.path.join(path, "ids.npy"), mmap_mode=mmap_mode),
+            np.load(os.path.join(path, "offsets.npy")),
+            meta["version"],
+        )
+        index.delta_vectors = np.load(os.path.join(path, "delta_vectors.npy"))
+        index.delta_ids = np.load(os.path.join(path, "delta_ids.npy"))
+        index.deleted = set(np.load(os.path.join(path, "deleted.npy")).tolist())
+        return index
+
+    # ---------- 检索 ----------
+
+    def search_vectors(self, queries, k=10, nprobe=ANN_NPROBE, article_ids=None):
+        """
+        批量检索
+
+        Args:
+            queries (ndarray): (问题数 x 维度) 的归一化问题向量
+            k (int): 每个问题返回的最大结果数
+            nprobe (int): 扫描的簇数
+            article_ids (iterable): 只返回这些文章的章节，为 None 时不过滤
+
+        Returns:
+            list: 每个问题一个 [(title_id, article_id, score), ...]，按得分从高到低排列
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        nprobe = min(nprobe, len(self.centroids))
+        probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        alive = self._alive_mask() if self.deleted else None
+        article_filter = np.fromiter(article_ids, dtype=np.int64) if article_ids is not None else None
+
+        results = []
+        for query, lists in zip(queries, probes):
+            segments = []
+            for list_id in lists:
+                start, end = self.offsets[list_id], self.offsets[list_id + 1]
+                if start < end:
+                    segments.append(np.arange(start, end))
+            positions = np.concatenate(segments) if segments else np.zeros(0, dtype=np.int64)
+            if alive is not None:
+                positions = positions[alive[positions]]
+            ids = np.concatenate([self.ids[positions], self.delta_ids])
+            scores = np.concatenate([self.vectors[positions] @ query, self.delta_vectors @ query])
+            if article_filter is not None:
+                matched = np.isin(ids[:, 1], article_filter)
+                ids, scores = ids[matched], scores[matched]
+            top = min(k, len(scores))
+            if top == 0:
+                results.append([])
+                continue
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[np.argsort(-scores[best])]
+            results.append([(int(ids[i, 0]), int(ids[i, 1]), float(scores[i])) for i in best])
+        return results
+
+    def search(self, query, k=10, nprobe=ANN_NPROBE, article_ids=None):
+        """编码问题后检索（使用进程共享的编码模型，不加载章节向量矩阵），返回 [(title_id, article_id, score), ...]"""
+        from embedding_index import encode_queries
+        return self.search_vectors(encode_queries([query]), k, nprobe, article_ids)[0]
+
+    def article_ids_of(self, title_ids):
+        """返回这些章节所属的文章ID集合（在主段和增量段中按 title.id 查找）"""
+        ids = np.concatenate([np.asarray(self.ids), self.delta_ids])
+        return set(ids[np.isin(ids[:, 0], np.fromiter(title_ids, dtype=np.int64)), 1].tolist())
+
+    def __len__(self):
+        return len(self.ids) - len(self.deleted) + len(self.delta_ids)
+
+
+_index = None
+_index_stamp = None
+_missing_warned = False
+
+def _meta_stamp(path):
+    """meta.json 最后写入，其修改时间或 inode 变化说明索引已被 build/update 重写"""
+    try:
+        stat = os.stat(os.path.join(path, "meta.json"))
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_ino
+
+def get_ann_index(path=ANN_INDEX_PATH):
+    """
+    返回进程内的 IVF 索引（以只读内存映射加载，多个工作进程共享页缓存）
+
+    查询时只加载文件，不构建；文件不存在时返回 None（只提示一次），需先执行 python ann_index.py build，
+    之后由 update 命令按变更日志维护。每次调用检查 meta.json，被重写后重新加载。
+    """
+    global _index, _index_stamp, _missing_warned
+    # 先取文件状态再加载，加载期间的重写会在下次调用时发现
+    stamp = _meta_stamp(path)
+    if _index is not None and (stamp is None or stamp == _index_stamp):
+        return _index
+    index = IVFIndex.load(path)
+    if index is None:
+        if not _missing_warned:
+            _missing_warned = True
+            print(f"IVF 索引不存在: {path}，请先执行 python ann_index.py build")
+        return _index
+    _index, _index_stamp = index, stamp
+    return _index
+
+
+if __name__ == "__main__":
+    from embedding_index import EmbeddingIndex, update_embedding_index
+
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "build":
+        embedding_index = EmbeddingIndex.load(mmap=True)
+        if embedding_index is None:
+            print("向量索引不存在，请先执行 python embedding_index.py build")
+            sys.exit(1)
+        start = time.perf_counter()
+        ann = IVFIndex.build(embedding_index.matrix, embedding_index.title_ids, embedding_index.article_ids,
+                             version=embedding_index.version)
+        ann.save()
+        save_change_checkpoint(ANN_CONSUMER, ann.version)
+        print(f"已构建 IVF 索引: {len(ann)} 个向量，{len(ann.centroids)} 个簇，"
+              f"耗时 {time.perf_counter() - start:.2f} 秒")
+    elif command == "update":
+        ann = IVFIndex.load(mmap=False)
+        if ann is None:
+            print("IVF 索引不存在，请先执行 build")
+            sys.exit(1)
+        embedding_index = update_embedding_index(build=False)
+        if embedding_index is None:
+            print("向量索引不存在，请先执行 python embedding_index.py build")
+            sys.exit(1)
+        processed = ann.refresh(embedding_index)
+        ann.save()
+        save_change_checkpoint(ANN_CONSUMER, ann.version)
+        print(f"已处理 {processed} 条变更，当前版本 {ann.version}（最新 {get_latest_change_version()}），"
+              f"增量段 {len(ann.delta_ids)} 条，墓碑 {len(ann.deleted)} 条")
+    else:
+        print(__doc__)
+        sys.exit(1)
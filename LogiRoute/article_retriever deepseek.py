@@ -16,7 +16,7 @@ from openai import OpenAI
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # 导入查询文章的函数
-from database import get_all_articles, get_plain_text_by_title, get_plain_text_by_title_id
+from corpus import get_all_articles, get_plain_text_by_title, get_section_bodies
 from query_data import query_title_content, query_article_titles
 
 # DeepSeek API配置
@@ -171,21 +171,20 @@ def get_deepseek_response_rag(prompt, response_title):
     Returns:
         str: 模型的响应结果，基于文章内容回答问题
     """
-    # 根据标题数量调用query_title_content方法
+    # 一次查询取回所有章节的正文；没有正文的标题已在入库时解析到第一个有正文的子章节
+    texts = get_section_bodies(response_title)
+    
     all_contents = []
     for title_id in response_title:
-        contents = get_plain_text_by_title_id(title_id)
-        # 如果获取到的正文为None，则对title_id加1并继续查询，直到获取到非None的正文内容
-        while contents is None:
-            print(f"标题ID {title_id} 对应的正文为None，尝试下一个ID...")
-            title_id += 1
-            contents = get_plain_text_by_title_id(title_id)
+        contents = texts.get(title_id)
+        if contents is None:
+            print(f"标题ID {title_id} 及其子章节都没有正文")
         # print(contents)
         if contents:
-            all_contents.extend(contents)
+            all_contents.append(contents)
     
     # 将正文内容列表转换为文本上下文
-    content_context = "\n".join([content for content, in all_contents]) if all_contents else "无正文内容"
+    content_context = "\n".join(all_contents) if all_contents else "无正文内容"
     
     # 构建系统提示词
     system_prompt = f"""
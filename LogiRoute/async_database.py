@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+database.py 辅助函数的异步版本
+
+同步辅助函数在一个有界线程池中执行，线程数与连接池大小一致（DB_POOL_SIZE），
+每个工作线程从连接池检出自己的连接。这样 asyncio 程序可以在等待 DeepSeek 响应的同时
+并发执行数据库读取，而不会阻塞事件循环。
+
+示例:
+    titles, texts = await asyncio.gather(
+        aget_titles_by_article_id(article_id),
+        aget_plain_texts_by_title_ids([12, 13, 27]),
+    )
+"""
+
+import asyncio
+import functools
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import database
+
+_executor = ThreadPoolExecutor(max_workers=database.DB_POOL_SIZE, thread_name_prefix="db")
+
+
+async def run_in_db_executor(func, *args, **kwargs):
+    """在数据库线程池中执行任意同步函数"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+def _make_async(func):
+    """为同步辅助函数生成异步版本"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_in_db_executor(func, *args, **kwargs)
+    wrapper.__name__ = "a" + func.__name__
+    wrapper.__qualname__ = wrapper.__name__
+    return wrapper
+
+
+# 读取
+aget_all_articles = _make_async(database.get_all_articles)
+aget_all_articles_with_details = _make_async(database.get_all_articles_with_details)
+aget_article_id_by_title = _make_async(database.get_article_id_by_title)
+aget_titles_by_article_id = _make_async(database.get_titles_by_article_id)
+aget_titles_by_article = _make_async(database.get_titles_by_article)
+aget_plain_text_by_title = _make_async(database.get_plain_text_by_title)
+aget_plain_text_by_title_id = _make_async(database.get_plain_text_by_title_id)
+aget_plain_texts_by_title_ids = _make_async(database.get_plain_texts_by_title_ids)
+aget_section_bodies = _make_async(database.get_section_bodies)
+aget_section_subtree = _make_async(database.get_section_subtree)
+aget_section_ancestors = _make_async(database.get_section_ancestors)
+asearch_sections = _make_async(database.search_sections)
+asearch_articles = _make_async(database.search_articles)
+
+# 写入
+ainsert_article = _make_async(database.insert_article)
+ainsert_title = _make_async(database.insert_title)
+ainsert_plain_text = _make_async(database.insert_plain_text)
+ainsert_article_bulk = _make_async(database.insert_article_bulk)
+aupdate_article_bulk = _make_async(database.update_article_bulk)
+aimport_article = _make_async(database.import_article)
+aupdate_article_title = _make_async(database.update_article_title)
+aupdate_article_summary = _make_async(database.update_article_summary)
+aupdate_title = _make_async(database.update_title)
+aupdate_plain_text_by_title_id = _make_async(database.update_plain_text_by_title_id)
+adelete_article_by_title = _make_async(database.delete_article_by_title)
+adelete_title_by_id = _make_async(database.delete_title_by_id)
+
+
+def _load_article_tree(article_id):
+    article, sections = database.get_article_tree(article_id)
+    return article, list(sections)
+
+async def aget_article_tree(article_id):
+    """
+    get_article_tree 的异步版本
+
+    流式迭代器不能跨线程使用，因此章节在线程池中一次性读完后以列表返回。
+
+    Returns:
+        tuple: (文章 (id, title, summary) 或 None, 章节列表)
+    """
+    return await run_in_db_executor(_load_article_tree, article_id)
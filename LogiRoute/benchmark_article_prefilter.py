@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+选文章预筛选的召回率报告
+
+对 dataset.json 中的每个问题，用参考片段（content 字段）在正文中定位其所属文章作为标准答案，
+统计预筛选保留前 N 篇候选时标准答案文章仍在候选中的比例（recall@N），
+以及对应的选文章提示词长度和预筛选耗时。提示词长度只取决于 N，不再随文章总数增长。
+
+用法:
+    python benchmark_article_prefilter.py                       # 测试 embedding 和 bm25
+    python benchmark_article_prefilter.py bm25                  # 只测试指定方法
+    python benchmark_article_prefilter.py embedding --n 1,3,5   # 指定 N 的取值
+"""
+
+import json
+import os
+import statistics
+import sys
+import time
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import get_all_articles_with_details, iter_sections
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dataset.json")
+DEFAULT_NS = [1, 3, 5, 10, 20]
+# 用参考片段开头多少个字符在正文中定位文章
+FRAGMENT_CHARS = 30
+
+
+def _article_context_chars(article):
+    """与 get_enhanced_deepseek_response_article 中单篇文章的上下文格式一致"""
+    _, title, summary = article
+    return len(f"文章标题: {title}\n文章摘要: {summary if summary else '暂无摘要'}\n-------------------")
+
+def load_questions():
+    """返回 [(问题, 标准答案文章ID)]，参考片段无法唯一定位到一篇文章的问题被跳过"""
+    with open(DATASET_PATH, encoding="utf-8") as f:
+        dataset = json.load(f)
+    texts = {}
+    for article_id, _, _, _, text, _ in iter_sections():
+        if text:
+            texts.setdefault(article_id, []).append(text)
+    texts = {article_id: "\n".join(parts) for article_id, parts in texts.items()}
+
+    questions = []
+    for item in dataset:
+        fragment = (item.get("content") or "")[:FRAGMENT_CHARS]
+        matches = [article_id for article_id, text in texts.items() if fragment and fragment in text]
+        if len(matches) == 1:
+            questions.append((item["question"], matches[0]))
+    return questions, len(dataset)
+
+def rank_embedding(queries, k):
+    from embedding_index import update_article_embedding_index
+    index = update_article_embedding_index()
+    start = time.perf_counter()
+    ranked = index.search_articles_batch(queries, k)
+    elapsed = (time.perf_counter() - start) * 1000 / len(queries)
+    return [[article_id for article_id, _ in hits] for hits in ranked], elapsed
+
+def rank_bm25(queries, k):
+    from bm25_index import update_bm25_index
+    index = update_bm25_index()
+    start = time.perf_counter()
+    ranked = [[article_id for article_id, _ in index.search_articles(query, k)] for query in queries]
+    elapsed = (time.perf_counter() - start) * 1000 / len(queries)
+    return ranked, elapsed
+
+RANKERS = {"embedding": rank_embedding, "bm25": rank_bm25}
+
+def report(method, questions, articles, ns):
+    by_id = {article[0]: article for article in articles}
+    queries = [question for question, _ in questions]
+    ranked, per_query_ms = RANKERS[method](queries, max(ns))
+    print(f"\n[{method}] 平均预筛选耗时 {per_query_ms:.2f} ms/问题")
+    print(f"{'N':>5}  {'recall@N':>9}  {'提示词字符数(平均)':>18}")
+    for n in ns:
+        hits = sum(1 for (_, gold), candidates in zip(questions, ranked) if gold in candidates[:n])
+        prompt_chars = statistics.mean(
+            sum(_article_context_chars(by_id[article_id]) for article_id in candidates[:n] if article_id in by_id)
+            for candidates in ranked
+        )
+        print(f"{n:>5}  {hits / len(questions):>9.3f}  {prompt_chars:>18.0f}")
+
+def main():
+    args = sys.argv[1:]
+    ns = DEFAULT_NS
+    if "--n" in args:
+        position = args.index("--n")
+        ns = [int(n) for n in args[position + 1].split(",")]
+        del args[position:position + 2]
+    methods = args or list(RANKERS)
+
+    articles = get_all_articles_with_details()
+    questions, total = load_questions()
+    if not questions:
+        print("没有可以定位到文章的问题，请先导入文章。")
+        return
+    full_chars = sum(_article_context_chars(article) for article in articles)
+    print(f"文章数: {len(articles)}，可定位问题: {len(questions)}/{total}，"
+          f"不筛选时提示词字符数: {full_chars}")
+    for method in methods:
+        report(method, questions, articles, [n for n in ns if n <= len(articles)] or [len(articles)])
+
+if __name__ == "__main__":
+    main()
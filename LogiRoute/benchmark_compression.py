@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+正文压缩存储的读取基准测试
+
+依次把当前数据库中的全部正文改写为各存储格式（明文、zlib、zstd），
+测量单条读取和批量读取的延迟，以及每次读取从数据库接收的字节数。
+测试结束后恢复为 PLAIN_TEXT_COMPRESSION 配置的格式。
+
+用法:
+    python benchmark_compression.py               # 测试 none、zlib（以及已安装时的 zstd）
+    python benchmark_compression.py none zlib     # 只测试指定格式
+"""
+
+import os
+import statistics
+import sys
+import time
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import database
+import instrumentation
+from migrations import apply_migrations
+
+# 每种格式重复测量的轮数
+ROUNDS = 5
+# 批量读取时每批的标题ID数量
+BATCH_SIZE = 50
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * percent / 100), len(ordered) - 1)]
+
+def _stored_bytes():
+    """统计 plain_text 中明文列和压缩列实际占用的字节数"""
+    text_bytes = 0
+    packed_bytes = 0
+    compressed_rows = 0
+    with database.get_cursor() as (connection, cursor):
+        cursor.execute("SELECT text_content, compressed_content FROM plain_text")
+        for text_content, compressed_content in cursor.fetchall():
+            if text_content:
+                text_bytes += len(text_content.encode("utf-8"))
+            if compressed_content:
+                packed_bytes += len(compressed_content)
+                compressed_rows += 1
+    return text_bytes, packed_bytes, compressed_rows
+
+def benchmark_mode(mode, title_ids):
+    """把正文改写为 mode 格式后测量读取延迟和接收字节数"""
+    changed = database.recompress_plain_texts(mode, allow_unsearchable=True)
+    text_bytes, packed_bytes, compressed_rows = _stored_bytes()
+    print(f"\n[{mode}] 改写 {changed} 行，压缩行数: {compressed_rows}，"
+          f"存储: 明文 {text_bytes / 1024:.1f} KB + 压缩 {packed_bytes / 1024:.1f} KB")
+
+    instrumentation.reset()
+    instrumentation.enable()
+    single_ms = []
+    batch_ms = []
+    try:
+        for _ in range(ROUNDS):
+            for title_id in title_ids:
+                start = time.perf_counter()
+                database.get_plain_text_by_title_id(title_id)
+                single_ms.append((time.perf_counter() - start) * 1000)
+            for i in range(0, len(title_ids), BATCH_SIZE):
+                start = time.perf_counter()
+                database.get_plain_texts_by_title_ids(title_ids[i:i + BATCH_SIZE])
+                batch_ms.append((time.perf_counter() - start) * 1000)
+    finally:
+        instrumentation.disable()
+
+    single = instrumentation.get_stats()["get_plain_text_by_title_id"]
+    print(f"  单条读取: p50 {_percentile(single_ms, 50):.3f} ms  p95 {_percentile(single_ms, 95):.3f} ms  "
+          f"平均 {statistics.mean(single_ms):.3f} ms  每次接收 {single.bytes_received / single.calls:.0f} B")
+    print(f"  批量读取({BATCH_SIZE}条): p50 {_percentile(batch_ms, 50):.3f} ms  "
+          f"p95 {_percentile(batch_ms, 95):.3f} ms  平均 {statistics.mean(batch_ms):.3f} ms")
+
+def main():
+    modes = sys.argv[1:] or ["none", "zlib"] + (["zstd"] if database.zstandard is not None else [])
+    apply_migrations()
+
+    title_ids = [title_id for _, title_id, _, _, text, _ in database.iter_sections() if text]
+    if not title_ids:
+        print("数据库中没有正文，请先导入文章。")
+        return
+    print(f"后端: {database.DB_BACKEND}，正文条数: {len(title_ids)}，每种格式 {ROUNDS} 轮，"
+          f"压缩阈值 {database.PLAIN_TEXT_COMPRESS_MIN_BYTES} B")
+
+    try:
+        for mode in modes:
+            benchmark_mode(mode, title_ids)
+    finally:
+        restored = database.recompress_plain_texts(database.PLAIN_TEXT_COMPRESSION, allow_unsearchable=True)
+        print(f"\n已恢复为 {database.PLAIN_TEXT_COMPRESSION} 格式（改写 {restored} 行）")
+
+if __name__ == "__main__":
+    main()
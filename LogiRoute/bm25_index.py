@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+章节级 BM25 词法索引（本地计算，不调用大模型）
+
+- 每个章节是一篇文档，字段为章节标题、章节摘要和章节自身的正文，
+  词频按字段加权（标题 x3、摘要 x2、正文 x1）后计算 BM25 得分。
+- 中文分词: 安装了 jieba 时使用 jieba 搜索引擎模式，否则使用汉字二元组（bigram）；
+  英文和数字按单词切分并转小写。索引文件记录使用的分词器，分词器变化时需要重建。
+- 索引保存为 pickle 文件（BM25_INDEX_PATH），同时记录已处理到的变更日志版本；
+  refresh() 通过变更日志只重新索引有变化的文章。
+- 索引文件由导入脚本、增量摘要生成和 build/update 命令维护（update_bm25_index）；
+  查询时只加载索引文件，不会在用户请求中扫描语料。
+- 既可以单独作为检索器使用（search），也可以为大模型的选文章、选章节两步预先筛选候选
+  （prefilter_articles / prefilter_sections）。
+
+用法:
+    python bm25_index.py build             # 全量构建并保存
+    python bm25_index.py update            # 按变更日志增量更新（索引文件不存在时全量构建）
+    python bm25_index.py search "问题"      # 检索并打印前 10 个章节及耗时
+"""
+
+import math
+import os
+import pickle
+import re
+import sys
+import time
+from collections import Counter
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import get_article_tree, get_change_watermark, iter_sections, save_change_checkpoint
+from changelog import ChangeConsumer
+
+try:
+    import jieba
+except ImportError:
+    jieba = None
+
+# 分词器: auto（有 jieba 时用 jieba，否则 bigram）、jieba 或 bigram
+BM25_TOKENIZER = os.getenv("BM25_TOKENIZER", "auto").lower()
+BM25_INDEX_PATH = os.getenv(
+    "BM25_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "bm25_index.pkl")
+)
+# 索引文件格式版本，结构变化时递增
+INDEX_FORMAT_VERSION = 1
+# 变更日志中本索引的消费者名称
+BM25_CONSUMER = "bm25_index"
+
+# BM25 参数和字段权重
+BM25_K1 = 1.2
+BM25_B = 0.75
+FIELD_WEIGHTS = {"title": 3.0, "summary": 2.0, "body": 1.0}
+
+_TOKEN_PATTERN = re.compile(r"[\u4e00-\u9fff]+|[a-z0-9]+")
+_CJK_PATTERN = re.compile(r"[\u4e00-\u9fff]")
+
+
+def _tokenizer_name():
+    if BM25_TOKENIZER == "jieba" and jieba is None:
+        raise RuntimeError("BM25_TOKENIZER=jieba 但未安装 jieba")
+    if BM25_TOKENIZER in ("jieba", "bigram"):
+        return BM25_TOKENIZER
+    return "jieba" if jieba is not None else "bigram"
+
+def _bigram_tokens(text):
+    tokens = []
+    for run in _TOKEN_PATTERN.findall(text.lower()):
+        if _CJK_PATTERN.match(run) and len(run) > 1:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+def _jieba_tokens(text):
+    tokens = []
+    for word in jieba.lcut_for_search(text.lower()):
+        tokens.extend(_TOKEN_PATTERN.findall(word))
+    return tokens
+
+def tokenize(text, tokenizer=None):
+    """把文本切分为检索词列表（tokenizer 为 jieba 或 bigram，默认按 BM25_TOKENIZER 选择）"""
+    if not text:
+        return []
+    tokenizer = tokenizer or _tokenizer_name()
+    return _jieba_tokens(text) if tokenizer == "jieba" else _bigram_tokens(text)
+
+
+class BM25Index:
+    """
+    可增量更新的 BM25 倒排索引
+
+    postings 为 {词: {title_id: 加权词频}}；每个章节记录所属文章、标题、文档长度和包含的词，
+    删除或重新索引章节时据此从倒排表中移除。
+    """
+
+    def __init__(self, tokenizer=None):
+        self.tokenizer = tokenizer or _tokenizer_name()
+        self.version = 0
+        self.postings = {}
+        self.docs = {}           # title_id -> (article_id, title, 文档长度, 词元组)
+        self.article_docs = {}   # article_id -> [title_id, ...]
+        self.total_length = 0.0
+
+    # ---------- 构建与更新 ----------
+
+    def add_section(self, article_id, title_id, title, summary, body):
+        """索引一个章节（已存在时先移除旧版本）"""
+        if title_id in self.docs:
+            self.remove_section(title_id)
+        frequencies = Counter()
+        for field, text in (("title", title), ("summary", summary), ("body", body)):
+            weight = FIELD_WEIGHTS[field]
+            for token in tokenize(text, self.tokenizer):
+                frequencies[token] += weight
+        length = sum(frequencies.values())
+        for token, frequency in frequencies.items():
+            self.postings.setdefault(token, {})[title_id] = frequency
+        self.docs[title_id] = (article_id, title, length, tuple(frequencies))
+        self.article_docs.setdefault(article_id, []).append(title_id)
+        self.total_length += length
+
+    def remove_section(self, title_id):
+        doc = self.docs.pop(title_id, None)
+        if doc is None:
+            return
+        article_id, _, length, terms = doc
+        for token in terms:
+            postings = self.postings.get(token)
+            if postings is not None:
+                postings.pop(title_id, None)
+                if not postings:
+                    del self.postings[token]
+        self.total_length -= length
+        siblings = self.article_docs.get(article_id)
+        if siblings is not None:
+            siblings.remove(title_id)
+            if not siblings:
+                del self.article_docs[article_id]
+
+    def remove_article(self, article_id):
+        for title_id in list(self.article_docs.get(article_id, ())):
+            self.remove_section(title_id)
+
+    def reindex_article(self, article_id):
+        """从数据库重新读取一篇文章的全部章节并替换索引中的旧内容"""
+        self.remove_article(article_id)
+        article, sections = get_article_tree(article_id)
+        if article is None:
+            return
+        for title_id, title, _, summary, body in sections:
+            self.add_section(article_id, title_id, title, summary, body)
+
+    @classmethod
+    def build(cls, tokenizer=None):
+        """从数据库全量构建索引"""
+        index = cls(tokenizer)
+        # 先取版本号再读数据，构建期间的写入会在下次 refresh 时重新处理（处理是幂等的）
+        index.version = get_change_watermark()
+        for article_id, title_id, _, title, body, summary in iter_sections():
+            index.add_section(article_id, title_id, title, summary, body)
+        return index
+
+    def apply_changes(self, changes):
+        """应用一批变更（changelog.ChangeSet）；以文章为单位重新索引"""
+        if changes.reload:
+            rebuilt = BM25Index.build(self.tokenizer)
+            self.__dict__.update(rebuilt.__dict__)
+            return
+        for article_id in changes.deleted_article_ids():
+            self.remove_article(article_id)
+        for article_id in changes.article_ids() - changes.deleted_article_ids():
+            self.reindex_article(article_id)
+
+    def refresh(self, consumer=None):
+        """
+        按变更日志增量更新，返回处理的变更条数
+
+        检查点同时保存在索引对象（随文件持久化）和变更日志的消费者记录中；
+        索引文件比消费者检查点旧（例如从备份恢复）时无法增量更新，改为全量重建。
+        """
+        consumer = consumer or ChangeConsumer(BM25_CONSUMER)
+        if self.version < consumer.checkpoint:
+            rebuilt = BM25Index.build(self.tokenizer)
+            self.__dict__.update(rebuilt.__dict__)
+            return 0
+        processed = 0
+        while True:
+            changes = consumer.poll(after=self.version)
+            if changes is None:
+                return processed
+            self.apply_changes(changes)
+            self.version = changes.version
+            processed += len(changes)
+
+    # ---------- 持久化 ----------
+
+    def save(self, path=BM25_INDEX_PATH):
+        """原子地写入索引文件"""
+        state = {
+            "format_version": INDEX_FORMAT_VERSION,
+            "tokenizer": self.tokenizer,
+            "version": self.version,
+            "postings": self.postings,
+            "docs": self.docs,
+        }
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path=BM25_INDEX_PATH):
+        """读取索引文件；文件不存在、格式版本或分词器不一致时返回 None"""
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        if state.get("format_version") != INDEX_FORMAT_VERSION or state.get("tokenizer") != _tokenizer_name():
+            return None
+        index = cls(state["tokenizer"])
+        index.version = state["version"]
+        index.postings = state["postings"]
+        index.docs = state["docs"]
+        for title_id, (article_id, _, length, _) in index.docs.items():
+            index.article_docs.setdefault(article_id, []).append(title_id)
+            index.total_length += length
+        return index
+
+    # ---------- 检索 ----------
+
+    def _scores(self, query, article_ids=None, title_ids=None):
+        count = len(self.docs)
+        if not count:
+            return {}
+        average_length = self.total_length / count or 1.0
+        scores = {}
+        for token, query_frequency in Counter(tokenize(query, self.tokenizer)).items():
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            if title_ids is not None:
+                # 只为给定的章节查倒排表，不遍历整个倒排列表
+                matches = [(title_id, postings[title_id]) for title_id in title_ids if title_id in postings]
+            else:
+                matches = postings.items()
+            for title_id, frequency in matches:
+                article_id, _, length, _ = self.docs[title_id]
+                if article_ids is not None and article_id not in article_ids:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                scores[title_id] = scores.get(title_id, 0.0) + \
+                    query_frequency * idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return scores
+
+    def search(self, query, k=10, article_ids=None):
+        """
+        检索最相关的章节
+
+        Args:
+            query (str): 检索问题
+            k (int): 返回的最大结果数
+            article_ids (iterable): 只在这些文章内检索，为 None 时检索全部
+
+        Returns:
+            list: [(title_id, article_id, title, score), ...]，与 database.search_sections 格式一致
+        """
+        if article_ids is not None:
+            article_ids = set(article_ids)
+        scores = self._scores(query, article_ids)
+        top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(title_id, self.docs[title_id][0], self.docs[title_id][1], score) for title_id, score in top]
+
+    def score_sections(self, query, title_ids):
+        """只为这些章节计算得分，返回 {title_id: score}，未命中的章节不在结果中"""
+        return self._scores(query, title_ids=set(title_ids))
+
+    def search_articles(self, query, k=10):
+        """按文章内得分最高的章节为文章排序，返回 [(article_id, score), ...]"""
+        best = {}
+        for title_id, score in self._scores(query).items():
+            article_id = self.docs[title_id][0]
+            if score > best.get(article_id, 0.0):
+                best[article_id] = score
+        return sorted(best.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def __len__(self):
+        return len(self.docs)
+
+
+def update_bm25_index(path=BM25_INDEX_PATH):
+    """
+    更新索引文件（导入、变更处理流程和命令行调用，不在查询路径上执行）
+
+    索引文件不存在或已过期时全量构建，否则按变更日志增量更新；没有变化时不重写文件。
+
+    Returns:
+        BM25Index: 更新后的索引
+    """
+    index = BM25Index.load(path)
+    if index is None:
+        index = BM25Index.build()
+        version = None
+    else:
+        version = index.version
+        index.refresh()
+    if index.version != version:
+        index.save(path)
+        save_change_checkpoint(BM25_CONSUMER, index.version)
+    return index
+
+
+_index = None
+_missing_warned = False
+
+def get_bm25_index(path=BM25_INDEX_PATH, refresh=False):
+    """
+    返回进程内的索引
+
+    只加载索引文件，不在查询时构建；文件不存在或已过期时返回 None（只提示一次），
+    需先执行 python bm25_index.py build。之后直接返回内存中的索引，
+    refresh=True 时重新加载文件以获得导入或 update 命令写入的更新。
+    """
+    global _index, _missing_warned
+    if _index is not None and not refresh:
+        return _index
+    index = BM25Index.load(path)
+    if index is None:
+        if not _missing_warned:
+            _missing_warned = True
+            print(f"BM25 索引文件不存在或已过期: {path}，请先执行 python bm25_index.py build")
+        return _index
+    _index = index
+    return _index
+
+def prefilter_articles(query, articles_details, n):
+    """
+    用 BM25 为选文章步骤筛选候选
+
+    Args:
+        articles_details (list): [(id, title, summary), ...]
+        n (int): 保留的候选数
+
+    Returns:
+        list: 按 BM25 得分排序的前 n 篇文章；没有任何命中或索引不存在时原样返回
+    """
+    index = get_bm25_index()
+    if index is None:
+        return articles_details
+    ranked = [article_id for article_id, _ in index.search_articles(query, n)]
+    if not ranked:
+        return articles_details
+    by_id = {article[0]: article for article in articles_details}
+    return [by_id[article_id] for article_id in ranked if article_id in by_id] or articles_details
+
+def prefilter_sections(query, titles, n):
+    """
+    用 BM25 为选章节步骤筛选候选
+
+    Args:
+        titles (list): query_article_titles 返回的章节字典列表（含 id）
+        n (int): 保留的候选数
+
+    Returns:
+        list: 命中的前 n 个章节（保持原有顺序）；没有任何命中或索引不存在时原样返回
+    """
+    index = get_bm25_index()
+    if index is None:
+        return titles
+    article_ids = {index.docs[t["id"]][0] for t in titles if t["id"] in index.docs}
+    candidates = {hit[0] for hit in index.search(query, n, article_ids)}
+    return [t for t in titles if t["id"] in candidates] or titles
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "search"
+    if command == "build":
+        start = time.perf_counter()
+        index = BM25Index.build()
+        index.save()
+        save_change_checkpoint(BM25_CONSUMER, index.version)
+        print(f"已构建 BM25 索引（{index.tokenizer} 分词）: {len(index)} 个章节，{len(index.postings)} 个词，"
+              f"耗时 {time.perf_counter() - start:.2f} 秒")
+    elif command == "update":
+        start = time.perf_counter()
+        index = update_bm25_index()
+        print(f"BM25 索引已更新到版本 {index.version}: {len(index)} 个章节，"
+              f"耗时 {time.perf_counter() - start:.2f} 秒")
+    elif command == "search" and len(sys.argv) > 2:
+        index = get_bm25_index()
+        if index is None:
+            sys.exit(1)
+        start = time.perf_counter()
+        hits = index.search(sys.argv[2])
+        elapsed = (time.perf_counter() - start) * 1000
+        for title_id, article_id, title, score in hits:
+            print(f"{score:8.3f}  [文章 {article_id} / 章节 {title_id}] {title}")
+        print(f"检索耗时 {elapsed:.2f} ms")
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+变更日志（change_log）的消费接口
+
+database.py 中的写入辅助函数在同一事务中向 change_log 追加 (entity, entity_id, article_id, operation)，
+version 单调递增。摘要生成、检索索引、缓存等下游各自以一个消费者名称记录检查点，
+每次只处理检查点之后的变更，而不必全量重建：
+
+    consumer = ChangeConsumer("bm25_index", entities=["title", "plain_text"])
+    consumer.process(lambda changes: index.apply(changes))
+
+处理函数抛出异常时检查点不前移，下次会重新收到同一批变更（至少一次语义），处理逻辑应当幂等。
+收到 reload（快照加载等全量替换）时应全量重建。
+
+版本号在插入时分配、提交时才可见，并发写入时较小的版本可能较晚出现。每批只返回到第一个版本号空洞之前
+（见 database.get_change_watermark），空洞被提交的变更填上（或等待超过 CHANGE_LOG_GAP_TIMEOUT 秒）后才会越过。
+
+用法:
+    python changelog.py status       # 打印最新版本号及各消费者的检查点和积压数量
+    python changelog.py tail [条数]   # 打印最近的变更
+    python changelog.py prune        # 删除所有消费者都已处理过的变更
+"""
+
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import (
+    DEFAULT_BATCH_SIZE, Error, get_change_checkpoint, get_change_watermark, get_changes_since,
+    get_cursor, get_latest_change_version, save_change_checkpoint,
+)
+
+# 改变内容的操作（不含只改摘要的 summary）
+CONTENT_OPERATIONS = ("insert", "update", "delete")
+
+
+class ChangeSet:
+    """
+    一批变更，按 (entity, entity_id) 合并为最后一次操作
+
+    Attributes:
+        changes (list): 原始变更行 (version, entity, entity_id, article_id, operation)
+        version (int): 检查点可以前移到的版本号（包括被实体和操作类型过滤掉的行）
+        reload (bool): 本批中是否有全量替换
+    """
+
+    def __init__(self, changes, version, operations=None):
+        self.changes = [
+            row for row in changes
+            if operations is None or row[4] in operations or row[1] == "corpus"
+        ]
+        self.version = version
+        self.reload = any(row[4] == "reload" for row in self.changes)
+        self._latest = {}
+        for _, entity, entity_id, article_id, operation in self.changes:
+            self._latest[(entity, entity_id)] = (article_id, operation)
+
+    def __len__(self):
+        return len(self.changes)
+
+    def __bool__(self):
+        return bool(self.changes)
+
+    def _ids(self, entities, deleted):
+        return {
+            entity_id for (entity, entity_id), (_, operation) in self._latest.items()
+            if entity in entities and (operation == "delete") == deleted
+        }
+
+    def article_ids(self):
+        """有任何变更（包括章节和正文）的文章ID"""
+        return {article_id for article_id, _ in self._latest.values() if article_id is not None}
+
+    def deleted_article_ids(self):
+        """被删除的文章ID（其章节和正文已级联删除）"""
+        return self._ids(("article",), deleted=True)
+
+    def title_ids(self):
+        """标题或正文被插入、修改的章节ID"""
+        return self._ids(("title", "plain_text"), deleted=False) - self.deleted_title_ids()
+
+    def deleted_title_ids(self):
+        """被删除的章节ID（不含随文章级联删除的章节）"""
+        return self._ids(("title",), deleted=True)
+
+
+class ChangeConsumer:
+    """
+    按检查点增量读取变更日志
+
+    Args:
+        name (str): 消费者名称，检查点按名称保存
+        entities (list): 只关心的实体，为 None 时读取全部
+        operations (tuple): 只关心的操作类型，为 None 时读取全部（reload 总是保留）
+        batch_size (int): 每批读取的变更条数
+    """
+
+    def __init__(self, name, entities=None, operations=None, batch_size=DEFAULT_BATCH_SIZE):
+        self.name = name
+        self.entities = entities
+        self.operations = operations
+        self.batch_size = batch_size
+
+    @property
+    def checkpoint(self):
+        return get_change_checkpoint(self.name)
+
+    def poll(self, after=None):
+        """
+        读取检查点（或 after）之后的下一批变更，检查点无法前移时返回 None
+
+        只返回到第一个版本号空洞之前：空洞可能属于尚未提交的事务，越过它会永久漏掉该事务的变更。
+        每批最多越过 batch_size 个版本；其中没有关心的实体时返回空的 ChangeSet，
+        检查点仍前移到其 version，不会停在无关的变更之前。
+        """
+        after = self.checkpoint if after is None else after
+        rows = get_changes_since(after, self.entities, self.batch_size)
+        watermark = get_change_watermark(after, rows[-1][0] if rows else None, self.batch_size)
+        if watermark <= after:
+            return None
+        return ChangeSet([row for row in rows if row[0] <= watermark], watermark, self.operations)
+
+    def commit(self, change_set):
+        """确认一批变更已处理，检查点前移到该批的最后版本"""
+        return save_change_checkpoint(self.name, change_set.version)
+
+    def process(self, handler):
+        """
+        循环读取并处理全部积压的变更
+
+        Args:
+            handler (callable): 接收 ChangeSet；被过滤后为空的批次不调用，直接前移检查点
+
+        Returns:
+            int: 处理的变更条数
+        """
+        processed = 0
+        after = self.checkpoint
+        while True:
+            change_set = self.poll(after)
+            if change_set is None:
+                return processed
+            if change_set:
+                handler(change_set)
+                processed += len(change_set)
+            if not self.commit(change_set):
+                return processed
+            after = change_set.version
+
+    def lag(self):
+        """检查点之后尚未处理的变更条数"""
+        try:
+            with get_cursor() as (connection, cursor):
+                cursor.execute("SELECT COUNT(*) FROM change_log WHERE version > %s", (self.checkpoint,))
+                return cursor.fetchone()[0]
+        except Error as e:
+            print(f"统计积压变更时出错: {e}")
+            return 0
+
+
+def list_checkpoints():
+    """返回 [(消费者, 版本号, 更新时间), ...]"""
+    try:
+        with get_cursor() as (connection, cursor):
+            cursor.execute("SELECT consumer, version, updated_at FROM change_log_checkpoint ORDER BY consumer")
+            return cursor.fetchall()
+    except Error as e:
+        print(f"获取变更检查点时出错: {e}")
+        return []
+
+def prune_change_log():
+    """
+    删除所有消费者都已处理过的变更，返回删除的条数；没有消费者时不删除
+
+    最新的一条总是保留，使 get_latest_change_version 在清理后仍然返回当前版本号。
+    """
+    try:
+        with get_cursor() as (connection, cursor):
+            cursor.execute("SELECT MIN(version) FROM change_log_checkpoint")
+            oldest = cursor.fetchone()[0]
+            if oldest is None:
+                return 0
+            cursor.execute("SELECT MAX(version) FROM change_log")
+            latest = cursor.fetchone()[0] or 0
+            cursor.execute("DELETE FROM change_log WHERE version <= %s", (min(oldest, latest - 1),))
+            connection.commit()
+            return cursor.rowcount
+    except Error as e:
+        print(f"清理变更日志时出错: {e}")
+        return 0
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    if command == "status":
+        latest = get_latest_change_version()
+        print(f"最新变更版本: {latest}")
+        for consumer, version, updated_at in list_checkpoints():
+            print(f"  {consumer}: 检查点 {version}，积压 {ChangeConsumer(consumer).lag()} 条，更新于 {updated_at}")
+    elif command == "tail":
+        count = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+        rows = get_changes_since(max(get_latest_change_version() - count, 0), limit=count)
+        for version, entity, entity_id, article_id, operation in rows:
+            print(f"{version}\t{operation}\t{entity}:{entity_id}\t文章 {article_id}")
+    elif command == "prune":
+        print(f"已删除 {prune_change_log()} 条已处理的变更")
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+检索路径使用的只读语料接口
+
+设置环境变量 CORPUS_MODE=memory 后，启动时把全部文章、章节、正文和摘要一次性加载到内存，
+之后的目录、章节列表和正文查询都不再访问数据库：
+- CORPUS_SNAPSHOT 指定快照文件（snapshot.py 导出）时从快照加载，否则从数据库读取一次。
+- 章节按列存放在 array 中，标题和路径等重复出现的字符串经过 intern，
+  文章和章节记录使用 __slots__。
+
+默认 CORPUS_MODE=db，本模块的函数直接就是 database.py 中的同名辅助函数。
+检索脚本和 query_data.py 从本模块导入读取函数，两种模式可以无缝切换。
+写入（前端编辑、导入、摘要生成）始终通过 database.py，内存语料不会随之更新。
+"""
+
+import os
+import sys
+import time
+from array import array
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import Error, decode_plain_text, get_all_sections, get_cursor, normalize_title
+
+# 语料模式: db (默认) 或 memory
+CORPUS_MODE = os.getenv("CORPUS_MODE", "db").lower()
+# memory 模式下加载的快照文件，为空时从数据库加载
+CORPUS_SNAPSHOT = os.getenv("CORPUS_SNAPSHOT", "")
+
+
+class Article:
+    """文章记录，start/end 为其章节在章节数组中的下标范围"""
+
+    __slots__ = ("id", "title", "normalized_title", "summary", "start", "end")
+
+    def __init__(self, id, title, normalized_title, summary):
+        self.id = id
+        self.title = title
+        self.normalized_title = normalized_title
+        self.summary = summary
+        self.start = 0
+        self.end = 0
+
+
+class Section:
+    """章节记录（由 MemoryCorpus.get_section 按需生成）"""
+
+    __slots__ = ("id", "article_id", "title", "level", "summary",
+                 "parent_id", "position", "path", "body_title_id")
+
+    def __init__(self, id, article_id, title, level, summary, parent_id, position, path, body_title_id):
+        self.id = id
+        self.article_id = article_id
+        self.title = title
+        self.level = level
+        self.summary = summary
+        self.parent_id = parent_id
+        self.position = position
+        self.path = path
+        self.body_title_id = body_title_id
+
+
+def _intern(value):
+    return sys.intern(value) if value is not None else None
+
+
+class MemoryCorpus:
+    """
+    只读内存语料，提供与 database.py 读取辅助函数相同的查询接口和返回格式
+
+    Args:
+        articles (iterable): (id, title, normalized_title, summary)
+        sections (iterable): (id, article_id, title, level, summary, parent_id, position, path, body_title_id)
+        bodies (dict): {title_id: 正文}
+    """
+
+    def __init__(self, articles, sections, bodies):
+        self._articles = []
+        self._article_by_id = {}
+        self._article_by_title = {}
+        self._article_by_normalized = {}
+        for article_id, title, normalized, summary in sorted(articles, key=lambda row: row[0]):
+            article = Article(article_id, _intern(title), _intern(normalized or normalize_title(title)), summary)
+            self._articles.append(article)
+            self._article_by_id[article_id] = article
+            self._article_by_title.setdefault(article.title, article)
+            self._article_by_normalized.setdefault(article.normalized_title, article)
+
+        # 章节按 (article_id, path) 即文档顺序排序后列式存放；0 表示没有父章节或正文章节
+        self._ids = array("q")
+        self._article_ids = array("q")
+        self._levels = array("i")
+        self._positions = array("i")
+        self._parent_ids = array("q")
+        self._body_ids = array("q")
+        self._titles = []
+        self._summaries = []
+        self._paths = []
+        self._bodies = []
+        self._row_by_id = {}
+        self._row_by_title = {}
+        for row, (title_id, article_id, title, level, summary, parent_id, position, path, body_title_id) in \
+                enumerate(sorted(sections, key=lambda section: (section[1], section[7] or "", section[0]))):
+            self._ids.append(title_id)
+            self._article_ids.append(article_id)
+            self._levels.append(level)
+            self._positions.append(position or 0)
+            self._parent_ids.append(parent_id or 0)
+            self._body_ids.append(body_title_id or 0)
+            self._titles.append(_intern(title))
+            self._summaries.append(summary)
+            self._paths.append(_intern(path))
+            body = bodies.get(title_id)
+            self._bodies.append(body)
+            self._row_by_id[title_id] = row
+            if body is not None:
+                self._row_by_title.setdefault(self._titles[-1], row)
+
+            article = self._article_by_id.get(article_id)
+            if article is not None:
+                if article.end == 0:
+                    article.start = row
+                article.end = row + 1
+
+    # ---------- 加载 ----------
+
+    @classmethod
+    def from_database(cls):
+        """从数据库一次性读取全部语料"""
+        with get_cursor() as (connection, cursor):
+            cursor.execute("SELECT id, title, normalized_title, summary FROM article")
+            articles = cursor.fetchall()
+        # 章节和正文可能分布在多个分片上（sharding.py）
+        sections, bodies = get_all_sections()
+        return cls(articles, sections, bodies)
+
+    @classmethod
+    def from_snapshot(cls, path):
+        """从 snapshot.py 导出的快照文件加载"""
+        from snapshot import read_snapshot
+        _, tables = read_snapshot(path)
+        articles = [(row[0], row[1], row[2], row[3]) for row in tables["article"]]
+        sections = [
+            (row[0], row[1], row[2], row[3], row[4], row[6], row[7], row[8], row[9])
+            for row in tables["title"]
+        ]
+        bodies = {row[1]: decode_plain_text(*row[2:]) for row in tables["plain_text"]}
+        return cls(articles, sections, bodies)
+
+    # ---------- 内部工具 ----------
+
+    def _section_tuple(self, row):
+        return self._ids[row], self._titles[row], self._levels[row], self._summaries[row]
+
+    def _find_article(self, title):
+        article = self._article_by_title.get(title)
+        if article is None:
+            article = self._article_by_normalized.get(normalize_title(title))
+        return article
+
+    def _subtree_rows(self, row):
+        article = self._article_by_id.get(self._article_ids[row])
+        start, end = (article.start, article.end) if article else (row, row + 1)
+        lower = self._paths[row]
+        if lower is None:
+            return [row]
+        upper = lower + "0"
+        return [r for r in range(start, end) if self._paths[r] is not None and lower <= self._paths[r] < upper]
+
+    # ---------- 与 database.py 相同的读取接口 ----------
+
+    def get_all_articles(self):
+        return [article.title for article in self._articles]
+
+    def get_all_articles_with_details(self):
+        return [(article.id, article.title, article.summary) for article in self._articles]
+
+    def get_article_id_by_title(self, title):
+        article = self._find_article(title)
+        if article is None:
+            return None
+        if article.title != title:
+            print(f"提示: 通过模糊匹配找到文章 '{article.title}' (ID: {article.id})")
+        return article.id
+
+    def get_titles_by_article_id(self, article_id):
+        article = self._article_by_id.get(article_id)
+        if article is None:
+            return []
+        return [self._section_tuple(row) for row in range(article.start, article.end)]
+
+    def get_titles_by_article(self, title):
+        article = self._find_article(title)
+        return self.get_titles_by_article_id(article.id) if article else []
+
+    def get_plain_text_by_title(self, title):
+        row = self._row_by_title.get(title)
+        return (self._bodies[row], self._summaries[row]) if row is not None else None
+
+    def get_plain_text_by_title_id(self, title_id):
+        row = self._row_by_id.get(title_id)
+        return self._bodies[row] if row is not None else None
+
+    def get_plain_texts_by_title_ids(self, title_ids):
+        texts = {}
+        for title_id in title_ids:
+            text = self.get_plain_text_by_title_id(title_id)
+            if text is not None:
+                texts[title_id] = text
+        return texts
+
+    def get_section_bodies(self, title_ids):
+        texts = {}
+        for title_id in title_ids:
+            row = self._row_by_id.get(title_id)
+            if row is None or not self._body_ids[row]:
+                continue
+            text = self.get_plain_text_by_title_id(self._body_ids[row])
+            if text is not None:
+                texts[title_id] = text
+        return texts
+
+    def get_article_tree(self, article_id):
+        article = self._article_by_id.get(article_id)
+        if article is None:
+            return None, iter(())
+        sections = (
+            (self._ids[row], self._titles[row], self._levels[row], self._summaries[row], self._bodies[row])
+            for row in range(article.start, article.end)
+        )
+        return (article.id, article.title, article.summary), sections
+
+    def get_section(self, title_id):
+        """返回章节记录 Section，不存在时为 None"""
+        row = self._row_by_id.get(title_id)
+        if row is None:
+            return None
+        return Section(self._ids[row], self._article_ids[row], self._titles[row], self._levels[row],
+                       self._summaries[row], self._parent_ids[row] or None, self._positions[row],
+                       self._paths[row], self._body_ids[row] or None)
+
+    def get_section_subtree(self, title_id):
+        row = self._row_by_id.get(title_id)
+        if row is None:
+            return []
+        rows = sorted(self._subtree_rows(row), key=lambda r: self._paths[r] or "")
+        return [
+            (self._ids[r], self._parent_ids[r] or None, self._positions[r], self._paths[r],
+             self._titles[r], self._levels[r], self._summaries[r], self._bodies[r])
+            for r in rows
+        ]
+
+    def get_section_ancestors(self, title_id):
+        ancestors = []
+        row = self._row_by_id.get(title_id)
+        while row is not None and self._parent_ids[row]:
+            row = self._row_by_id.get(self._parent_ids[row])
+            if row is None:
+                break
+            ancestors.append((self._ids[row], self._parent_ids[row] or None, self._positions[row],
+                              self._paths[row], self._titles[row], self._levels[row], self._summaries[row]))
+        ancestors.reverse()
+        return ancestors
+
+    def iter_articles(self, batch_size=None):
+        for article in self._articles:
+            yield article.id, article.title, article.summary
+
+    def iter_sections(self, batch_size=None):
+        for row in range(len(self._ids)):
+            yield (self._article_ids[row], self._ids[row], self._levels[row], self._titles[row],
+                   self._bodies[row], self._summaries[row])
+
+    @property
+    def article_count(self):
+        return len(self._articles)
+
+    def __len__(self):
+        return len(self._ids)
+
+
+_memory_corpus = None
+
+def load_memory_corpus(snapshot_path=None):
+    """加载内存语料（指定快照文件时从快照加载，否则从数据库加载）"""
+    start = time.perf_counter()
+    corpus = MemoryCorpus.from_snapshot(snapshot_path) if snapshot_path else MemoryCorpus.from_database()
+    source = snapshot_path or "数据库"
+    print(f"内存语料已从 {source} 加载: {corpus.article_count} 篇文章, {len(corpus)} 个章节，"
+          f"耗时 {time.perf_counter() - start:.2f} 秒")
+    return corpus
+
+def get_memory_corpus():
+    """返回进程内的内存语料（仅 CORPUS_MODE=memory 时存在）"""
+    return _memory_corpus
+
+
+if CORPUS_MODE == "memory":
+    try:
+        _memory_corpus = load_memory_corpus(CORPUS_SNAPSHOT or None)
+    except Error as e:
+        raise RuntimeError(f"加载内存语料时出错: {e}") from e
+    get_all_articles = _memory_corpus.get_all_articles
+    get_all_articles_with_details = _memory_corpus.get_all_articles_with_details
+    get_article_id_by_title = _memory_corpus.get_article_id_by_title
+    get_titles_by_article_id = _memory_corpus.get_titles_by_article_id
+    get_titles_by_article = _memory_corpus.get_titles_by_article
+    get_plain_text_by_title = _memory_corpus.get_plain_text_by_title
+    get_plain_text_by_title_id = _memory_corpus.get_plain_text_by_title_id
+    get_plain_texts_by_title_ids = _memory_corpus.get_plain_texts_by_title_ids
+    get_section_bodies = _memory_corpus.get_section_bodies
+    get_article_tree = _memory_corpus.get_article_tree
+    get_section_subtree = _memory_corpus.get_section_subtree
+    get_section_ancestors = _memory_corpus.get_section_ancestors
+    iter_articles = _memory_corpus.iter_articles
+    iter_sections = _memory_corpus.iter_sections
+else:
+    from database import (
+        get_all_articles, get_all_articles_with_details, get_article_id_by_title,
+        get_titles_by_article_id, get_titles_by_article, get_plain_text_by_title,
+        get_plain_text_by_title_id, get_plain_texts_by_title_ids, get_section_bodies,
+        get_article_tree, get_section_subtree, get_section_ancestors,
+        iter_articles, iter_sections,
+    )
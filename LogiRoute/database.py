@@ -5,22 +5,282 @@
 创建数据库和表，包括article、title和plain_text表。
 """
 
+import difflib
+import functools
+import hashlib
+import inspect
 import os
-import mysql.connector
-from mysql.connector import Error
+import re
+import threading
+import time
+import zlib
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
+from instrumentation import assert_max_queries, instrumented, wrap_cursor
+
 # Load environment variables
 load_dotenv()
 
+# Storage Backend: mysql (默认) 或 sqlite
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql").lower()
+DB_SQLITE_PATH = os.getenv(
+    "DB_SQLITE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "rag_database.sqlite3")
+)
+
+if DB_BACKEND == "sqlite":
+    import sqlite_backend
+    from sqlite_backend import Error
+else:
+    import mysql.connector
+    from mysql.connector import Error, pooling
+    from mysql.connector.errors import PoolError
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 # Database Configuration
 DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_NAME = os.getenv("DB_NAME", "rag_database")
 DB_USER = os.getenv("DB_USER", "root")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "root123")
 
+# Connection Pool Configuration
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# 文章目录缓存：两次检查 catalog_version 之间的最小间隔（秒），0 表示每次读取都检查
+CATALOG_CACHE_CHECK_INTERVAL = float(os.getenv("CATALOG_CACHE_CHECK_INTERVAL", "5"))
+
+# 正文压缩存储：none (默认)、zlib 或 zstd（需要安装 zstandard）
+PLAIN_TEXT_COMPRESSION = os.getenv("PLAIN_TEXT_COMPRESSION", "none").lower()
+# 只压缩不小于该字节数的正文，短正文压缩收益不足以抵消解压开销
+PLAIN_TEXT_COMPRESS_MIN_BYTES = int(os.getenv("PLAIN_TEXT_COMPRESS_MIN_BYTES", "1024"))
+
+# 变更日志版本号空洞的最长等待时间（秒）：空洞之后的变更写入超过该时间后，
+# 认为占用空洞的事务已回滚（AUTO_INCREMENT 值不会回收），消费者不再等待
+CHANGE_LOG_GAP_TIMEOUT = float(os.getenv("CHANGE_LOG_GAP_TIMEOUT", "300"))
+
+# 分片存储（sharding.py）：逗号分隔的分片地址，MySQL 为 host:port，SQLite 后端为数据库文件路径；为空时不分片
+DB_SHARDS = [address.strip() for address in os.getenv("DB_SHARDS", "").split(",") if address.strip()]
+
+
+class ConnectionPool:
+    """
+    进程级MySQL连接池
+
+    - 连接在首次使用时才建立，握手和认证只在每个连接的生命周期内发生一次。
+    - 每个线程检出自己的连接；同一线程内嵌套调用会复用已检出的连接。
+    - 连接池耗尽时最多等待 timeout 秒，而不是立即报错。
+    - 健康检查：mysql.connector 在检出时会对连接执行 is_connected() 探活，
+      断开的连接会被自动重连后再交给调用方。
+    """
+
+    def __init__(self, pool_name, pool_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT, **connect_kwargs):
+        self.pool_name = pool_name
+        self.pool_size = pool_size
+        self.timeout = timeout
+        # consume_results=True: 未读完的结果集在连接归还前自动丢弃，避免污染下一个使用者
+        self.connect_kwargs = dict(connect_kwargs, consume_results=True)
+        self._pool = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._local = threading.local()
+
+    def _get_pool(self):
+        """懒加载底层连接池"""
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = pooling.MySQLConnectionPool(
+                        pool_name=self.pool_name,
+                        pool_size=self.pool_size,
+                        pool_reset_session=True,
+                        **self.connect_kwargs
+                    )
+        return self._pool
+
+    def _checkout(self):
+        """从连接池中取出一个连接，池耗尽时阻塞等待"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolError(f"连接池 '{self.pool_name}' 已耗尽 (等待 {self.timeout} 秒后超时)")
+        try:
+            return self._get_pool().get_connection()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, connection):
+        """将连接归还连接池"""
+        try:
+            # 对池化连接调用close()只会把连接放回池中
+            connection.close()
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self, shared=True):
+        """
+        检出当前线程的连接
+
+        Args:
+            shared (bool): 为True时同一线程内的嵌套调用复用同一个连接；
+                为False时总是检出一个独占连接（用于流式读取等长时间占用的场景）
+        """
+        held = getattr(self._local, "connection", None)
+        if shared and held is not None:
+            yield held
+            return
+
+        connection = self._checkout()
+        if shared:
+            self._local.connection = connection
+        try:
+            yield connection
+        except BaseException:
+            try:
+                connection.rollback()
+            except Error:
+                pass
+            raise
+        finally:
+            if shared:
+                self._local.connection = None
+            self._release(connection)
+
+
+if DB_BACKEND == "sqlite":
+    _pool = sqlite_backend.SQLiteConnectionPool(DB_SQLITE_PATH)
+else:
+    _pool = ConnectionPool(
+        "rag_pool",
+        host=DB_HOST,
+        database=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD
+    )
+
+def get_connection(shared=True):
+    """从进程级连接池检出连接（上下文管理器）"""
+    return _pool.connection(shared)
+
+@contextmanager
+def _primary_cursor(shared=True, **cursor_kwargs):
+    """在主库上检出连接并创建游标（不受分片绑定影响）"""
+    with get_connection(shared) as connection:
+        cursor = wrap_cursor(connection.cursor(**cursor_kwargs))
+        try:
+            yield connection, cursor
+        finally:
+            cursor.close()
+
+@contextmanager
+def get_cursor(shared=True, **cursor_kwargs):
+    """检出连接并创建游标，退出时关闭游标并归还连接；当前线程绑定了分片时使用分片的连接"""
+    shard = bound_shard()
+    if shard is None:
+        with _primary_cursor(shared, **cursor_kwargs) as (connection, cursor):
+            yield connection, cursor
+        return
+    previous = getattr(_shard_binding, "connection", None)
+    with shard.cursor(shared, **cursor_kwargs) as (connection, cursor):
+        _shard_binding.connection = _ShardConnection(connection)
+        try:
+            yield _shard_binding.connection, cursor
+        finally:
+            _shard_binding.connection = previous
+
+# 当前线程绑定的分片及其连接（见 bind_shard）
+_shard_binding = threading.local()
+
+def bound_shard():
+    """当前线程绑定的分片，未绑定时返回 None"""
+    return getattr(_shard_binding, "shard", None)
+
+@contextmanager
+def bind_shard(shard):
+    """
+    在当前线程内把本模块的辅助函数绑定到分片（sharding.ShardedStore 使用）
+
+    绑定期间 get_cursor 检出该分片的连接，新章节的ID由分片分配，
+    变更日志先暂存在分片连接上，分片事务提交后再写入主库的 change_log。
+    """
+    previous = bound_shard()
+    _shard_binding.shard = shard
+    try:
+        yield shard
+    finally:
+        _shard_binding.shard = previous
+
+class _ShardConnection:
+    """
+    分片连接的代理：事务中记录的变更日志在分片提交成功后才写入主库
+
+    消费者读到变更日志时章节已经在分片上可见；两次提交之间进程退出会丢失这部分变更日志。
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+        self.pending_changes = []
+
+    def commit(self):
+        self._connection.commit()
+        changes, self.pending_changes = self.pending_changes, []
+        if changes:
+            with _primary_cursor() as (connection, cursor):
+                _insert_change_log(cursor, changes)
+                connection.commit()
+
+    def rollback(self):
+        self.pending_changes = []
+        self._connection.rollback()
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+_sharded_store = None
+_sharded_store_lock = threading.Lock()
+
+def get_sharded_store():
+    """进程内共享的分片存储（sharding.ShardedStore），未配置 DB_SHARDS 时返回 None"""
+    global _sharded_store
+    if not DB_SHARDS:
+        return None
+    with _sharded_store_lock:
+        if _sharded_store is None:
+            from sharding import ShardedStore
+            _sharded_store = ShardedStore(DB_SHARDS)
+    return _sharded_store
+
+def sharded(func):
+    """
+    配置了 DB_SHARDS 时把辅助函数的调用转给 ShardedStore 的同名方法
+
+    分片存储在绑定目标分片（bind_shard）后再调用这里的实现，此时不再转发。
+    """
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def generator_wrapper(*args, **kwargs):
+            if DB_SHARDS and bound_shard() is None:
+                yield from getattr(get_sharded_store(), func.__name__)(*args, **kwargs)
+            else:
+                yield from func(*args, **kwargs)
+        return generator_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if DB_SHARDS and bound_shard() is None:
+            return getattr(get_sharded_store(), func.__name__)(*args, **kwargs)
+        return func(*args, **kwargs)
+    return wrapper
+
 def create_connection():
-    """创建数据库连接"""
+    """创建独立的数据库连接（不经过连接池，调用方负责关闭）"""
+    if DB_BACKEND == "sqlite":
+        return sqlite_backend.SQLiteConnection(DB_SQLITE_PATH)
     try:
         connection = mysql.connector.connect(
             host=DB_HOST,
@@ -36,6 +296,20 @@ def create_connection():
 
 def create_database_and_tables():
     """创建数据库和表"""
+    if DB_BACKEND == "sqlite":
+        try:
+            with get_connection() as connection:
+                sqlite_backend.create_tables(connection)
+            print("数据库和表创建成功!")
+        except Error as e:
+            print(f"创建数据库和表时出错: {e}")
+            return
+        from migrations import apply_migrations
+        apply_migrations()
+        if DB_SHARDS:
+            get_sharded_store().create_shard_tables()
+        return
+
     # 连接到MySQL服务器（不指定数据库）
     try:
         connection = mysql.connector.connect(
@@ -85,277 +359,1027 @@ def create_database_and_tables():
             
     except Error as e:
         print(f"创建数据库和表时出错: {e}")
+        return
     finally:
         if connection.is_connected():
             cursor.close()
             connection.close()
 
+    # 执行版本迁移（索引等后续结构变更）
+    from migrations import apply_migrations
+    apply_migrations()
+    if DB_SHARDS:
+        get_sharded_store().create_shard_tables()
+
+class CatalogCache:
+    """
+    文章目录（article 表）的进程内缓存
+
+    catalog_version 表中保存一个代数计数器，所有修改文章目录的写操作都在同一事务中将其加一。
+    缓存记录加载时的代数，最多每 check_interval 秒用一次主键查询比对代数，
+    因此多个进程/工作线程都能廉价地发现缓存过期；本进程内的写操作会立即使缓存失效。
+    """
+
+    def __init__(self, check_interval=CATALOG_CACHE_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._entries = {}
+        self._generation = None
+        self._checked_at = 0.0
+        # 每次 invalidate 加一，锁外查询期间发生失效时丢弃查询结果
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """清空缓存，下次读取时重新加载"""
+        with self._lock:
+            self._entries.clear()
+            self._generation = None
+            self._checked_at = 0.0
+            self._epoch += 1
+
+    def _current_generation(self):
+        try:
+            with get_cursor() as (connection, cursor):
+                cursor.execute("SELECT generation FROM catalog_version WHERE id = 1")
+                row = cursor.fetchone()
+                return row[0] if row else None
+        except Error:
+            # 迁移尚未执行时没有 catalog_version 表，此时不缓存
+            return None
+
+    def get(self, key, load):
+        """返回缓存的 key 对应的数据，过期或不存在时调用 load() 重新加载"""
+        now = time.monotonic()
+        with self._lock:
+            # 到期后由第一个发现的线程负责检查代数，其他线程在此期间继续使用现有缓存
+            check = now - self._checked_at >= self.check_interval or self._generation is None
+            if check:
+                self._checked_at = now
+            epoch = self._epoch
+        if check:
+            # 数据库往返在锁外进行，不阻塞其他读取线程
+            generation = self._current_generation()
+            with self._lock:
+                if self._epoch == epoch:
+                    if generation is None or generation != self._generation:
+                        self._entries.clear()
+                    self._generation = generation
+        with self._lock:
+            if key in self._entries:
+                return list(self._entries[key])
+            generation = self._generation
+
+        rows = load()
+        if rows is None:
+            return None
+        if generation is not None:
+            with self._lock:
+                if self._generation == generation:
+                    self._entries[key] = rows
+        return list(rows)
+
+
+_catalog_cache = CatalogCache()
+
+def bump_catalog_generation(cursor):
+    """在当前事务中递增文章目录代数（提交后还需调用 invalidate_catalog_cache）"""
+    cursor.execute("UPDATE catalog_version SET generation = generation + 1 WHERE id = 1")
+
+def invalidate_catalog_cache():
+    """使本进程的文章目录缓存失效"""
+    _catalog_cache.invalidate()
+
+# 变更日志的操作类型：insert、update、delete、summary（只有摘要变化）、reload（全部数据被替换）
+# entity 为 article、title 或 plain_text；plain_text 的 entity_id 是所属标题ID
+def _insert_change_log(cursor, changes):
+    cursor.executemany(
+        "INSERT INTO change_log (entity, entity_id, article_id, operation) VALUES (%s, %s, %s, %s)",
+        changes
+    )
+
+def record_changes(cursor, changes):
+    """
+    在当前事务中追加变更日志，changes 为 [(entity, entity_id, article_id, operation)]
+
+    cursor 属于绑定的分片时（见 bind_shard），变更日志在分片提交后写入主库。
+    """
+    if not changes:
+        return
+    shard_connection = getattr(_shard_binding, "connection", None)
+    if shard_connection is not None:
+        shard_connection.pending_changes.extend(changes)
+    else:
+        _insert_change_log(cursor, changes)
+
+def record_change(cursor, entity, entity_id, article_id, operation):
+    """在当前事务中追加一条变更日志"""
+    record_changes(cursor, [(entity, entity_id, article_id, operation)])
+
+def record_title_changes(cursor, entity, operation, where, params):
+    """为 title 表中满足 where 条件的章节追加变更日志（article_id 取自 title 表）"""
+    if bound_shard() is not None:
+        # 分片上没有 change_log 表，先查出章节再交给 record_changes
+        cursor.execute(f"SELECT %s, id, article_id, %s FROM title WHERE {where}", (entity, operation, *params))
+        record_changes(cursor, cursor.fetchall())
+        return
+    cursor.execute(f"""
+        INSERT INTO change_log (entity, entity_id, article_id, operation)
+        SELECT %s, id, article_id, %s FROM title WHERE {where}
+    """, (entity, operation, *params))
+
+def normalize_title(title):
+    """归一化标题：去除所有空白字符并转小写"""
+    return "".join(title.split()).lower()
+
+def compute_content_hash(data):
+    """计算内容的 SHA-256 十六进制摘要（str 按 UTF-8 编码）"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+def section_content_hash(title, level, content):
+    """章节内容哈希：标题、级别或正文任一变化都会改变哈希"""
+    return compute_content_hash(f"{level}\x1f{title}\x1f{content or ''}")
+
+_unsearchable_warned = False
+
+def _compression_format(compression=None):
+    """确定实际使用的压缩格式，未安装 zstandard 时 zstd 退回 zlib"""
+    global _unsearchable_warned
+    compression = (compression or PLAIN_TEXT_COMPRESSION).lower()
+    if compression not in ("zlib", "zstd"):
+        return None
+    if not compressed_text_searchable() and not _unsearchable_warned:
+        _unsearchable_warned = True
+        print("警告: 全文索引不包含压缩存储的正文，这些章节只能通过章节摘要被全文检索命中")
+    if compression == "zstd" and zstandard is None:
+        print("未安装 zstandard，正文压缩改用 zlib")
+        return "zlib"
+    return compression
+
+def encode_plain_text(text_content, compression=None):
+    """
+    把正文编码为 plain_text 的存储列
+    
+    Returns:
+        tuple: (text_content, content_format, compressed_content)
+            未压缩时 content_format 和 compressed_content 为 None；
+            压缩时 text_content 为 None，正文以压缩字节存入 compressed_content。
+    """
+    compression = _compression_format(compression)
+    if text_content is None or compression is None:
+        return text_content, None, None
+    raw = text_content.encode("utf-8")
+    if len(raw) < PLAIN_TEXT_COMPRESS_MIN_BYTES:
+        return text_content, None, None
+    if compression == "zstd":
+        packed = zstandard.ZstdCompressor(level=3).compress(raw)
+    else:
+        packed = zlib.compress(raw, 6)
+    if len(packed) >= len(raw):
+        return text_content, None, None
+    return None, compression, packed
+
+def decode_plain_text(text_content, content_format, compressed_content):
+    """根据格式标记还原正文，与 encode_plain_text 相对应"""
+    if not content_format:
+        return text_content
+    if content_format == "zlib":
+        raw = zlib.decompress(compressed_content)
+    elif content_format == "zstd":
+        if zstandard is None:
+            raise RuntimeError("正文以 zstd 压缩存储，需要安装 zstandard 才能读取")
+        raw = zstandard.ZstdDecompressor().decompress(compressed_content)
+    else:
+        raise ValueError(f"未知的正文存储格式: {content_format}")
+    return raw.decode("utf-8")
+
+if DB_BACKEND == "sqlite":
+    # SQL 中可调用 decode_plain_text(text_content, content_format, compressed_content)，
+    # 正文的 FTS5 索引和 LIKE 检索据此匹配压缩存储的正文
+    sqlite_backend.register_function("decode_plain_text", 3, decode_plain_text)
+
+def compressed_text_searchable():
+    """
+    压缩存储的正文能否被全文检索命中
+
+    SQLite 的 FTS5 表和 LIKE 检索都匹配解码后的正文；MySQL 的 FULLTEXT 索引只能建在
+    text_content 列上，压缩存储的正文不在索引中，这些章节只能通过章节摘要命中。
+    """
+    return DB_BACKEND == "sqlite"
+
+# 读取正文时选出的存储列，配合 decode_plain_text(*row[...]) 使用
+PLAIN_TEXT_COLUMNS = "pt.text_content, pt.content_format, pt.compressed_content"
+
+def _refresh_section_hash(cursor, title_id):
+    """根据当前的标题和正文重新计算章节哈希"""
+    cursor.execute(f"""
+        SELECT t.title, t.level, {PLAIN_TEXT_COLUMNS}
+        FROM title t LEFT JOIN plain_text pt ON pt.title_id = t.id
+        WHERE t.id = %s
+    """, (title_id,))
+    row = cursor.fetchone()
+    if row:
+        cursor.execute(
+            "UPDATE title SET content_hash = %s WHERE id = %s",
+            (section_content_hash(row[0], row[1], decode_plain_text(*row[2:])), title_id)
+        )
+
+# 物化路径中每一级序号的位数，如 "0002/0001" 表示第2个一级章节下的第1个子章节
+SECTION_PATH_DIGITS = 4
+
+def section_hierarchy(levels):
+    """
+    根据按文档顺序排列的章节级别计算章节层级
+    
+    Args:
+        levels (list): 各章节的级别，如 [1, 2, 2, 1, 2]
+    
+    Returns:
+        list: 与 levels 对应的 (父章节下标或 None, 在兄弟章节中的序号, 物化路径)
+    """
+    result = []
+    stack = []  # [(级别, 下标, 路径, 已有子章节数)]
+    root_count = 0
+    for index, level in enumerate(levels):
+        while stack and stack[-1][0] >= level:
+            stack.pop()
+        if stack:
+            parent = stack[-1]
+            parent[3] += 1
+            position = parent[3]
+            path = f"{parent[2]}/{position:0{SECTION_PATH_DIGITS}d}"
+            result.append((parent[1], position, path))
+        else:
+            root_count += 1
+            position = root_count
+            path = f"{position:0{SECTION_PATH_DIGITS}d}"
+            result.append((None, position, path))
+        stack.append([level, index, path, 0])
+    return result
+
+def rebuild_section_hierarchy(cursor, article_id):
+    """按章节顺序和级别重新计算一篇文章的 parent_id、position 和 path，只更新值有变化的章节"""
+    # 按现有的文档顺序（path）计算；刚插入、尚未计算路径的章节排在最后
+    cursor.execute(
+        "SELECT id, level, parent_id, position, path FROM title WHERE article_id = %s "
+        "ORDER BY path IS NULL, path, id", (article_id,)
+    )
+    rows = cursor.fetchall()
+    if not rows:
+        return
+    title_ids = [row[0] for row in rows]
+    updates = []
+    for row, (parent, position, path) in zip(rows, section_hierarchy([row[1] for row in rows])):
+        values = (title_ids[parent] if parent is not None else None, position, path)
+        if values != tuple(row[2:]):
+            updates.append((*values, row[0]))
+    if updates:
+        cursor.executemany("UPDATE title SET parent_id = %s, position = %s, path = %s WHERE id = %s", updates)
+
+def _place_new_section(cursor, article_id, title_id, level):
+    """
+    计算追加到文章末尾的新章节的 parent_id、position 和 path
+    
+    新章节排在文档最后且没有子章节，其余章节的层级都不变，只需写入这一行:
+    父章节是文档顺序上最后一个级别更小的章节，序号接在父章节已有的子章节之后。
+    """
+    cursor.execute("""
+        SELECT id, path FROM title
+        WHERE article_id = %s AND level < %s AND id <> %s AND path IS NOT NULL
+        ORDER BY path DESC, id DESC LIMIT 1
+    """, (article_id, level, title_id))
+    parent = cursor.fetchone()
+    if parent:
+        cursor.execute(
+            "SELECT COALESCE(MAX(position), 0) FROM title WHERE parent_id = %s AND id <> %s",
+            (parent[0], title_id)
+        )
+    else:
+        cursor.execute(
+            "SELECT COALESCE(MAX(position), 0) FROM title "
+            "WHERE article_id = %s AND parent_id IS NULL AND path IS NOT NULL AND id <> %s",
+            (article_id, title_id)
+        )
+    position = cursor.fetchone()[0] + 1
+    path = f"{position:0{SECTION_PATH_DIGITS}d}"
+    if parent:
+        path = f"{parent[1]}/{path}"
+    cursor.execute(
+        "UPDATE title SET parent_id = %s, position = %s, path = %s WHERE id = %s",
+        (parent[0] if parent else None, position, path, title_id)
+    )
+
+def section_body_targets(levels, has_body):
+    """
+    为每个章节确定实际承载正文的章节
+    
+    有正文的章节指向自身；没有正文的标题（如只有子章节的"第一章"）指向文档顺序上
+    第一个有正文的子孙章节；整棵子树都没有正文时为 None。
+    
+    Args:
+        levels (list): 按文档顺序排列的章节级别
+        has_body (list): 各章节是否有正文
+    
+    Returns:
+        list: 与 levels 对应的正文章节下标或 None
+    """
+    targets = []
+    for index, level in enumerate(levels):
+        target = None
+        j = index
+        while j < len(levels) and (j == index or levels[j] > level):
+            if has_body[j]:
+                target = j
+                break
+            j += 1
+        targets.append(target)
+    return targets
+
+def rebuild_section_bodies(cursor, article_id):
+    """重新计算一篇文章各章节的 body_title_id（章节或正文增删、级别变化后调用），只更新值有变化的章节"""
+    cursor.execute("""
+        SELECT t.id, t.level,
+               CASE WHEN pt.compressed_content IS NOT NULL OR pt.text_content <> '' THEN 1 ELSE 0 END,
+               t.body_title_id
+        FROM title t LEFT JOIN plain_text pt ON pt.title_id = t.id
+        WHERE t.article_id = %s
+        ORDER BY t.path IS NULL, t.path, t.id
+    """, (article_id,))
+    rows = cursor.fetchall()
+    if not rows:
+        return
+    title_ids = [row[0] for row in rows]
+    targets = section_body_targets([row[1] for row in rows], [bool(row[2]) for row in rows])
+    updates = [
+        (title_ids[target] if target is not None else None, row[0])
+        for row, target in zip(rows, targets)
+        if (title_ids[target] if target is not None else None) != row[3]
+    ]
+    if updates:
+        cursor.executemany("UPDATE title SET body_title_id = %s WHERE id = %s", updates)
+
+def _section_has_body(cursor, title_id):
+    """章节当前是否有正文"""
+    cursor.execute("""
+        SELECT CASE WHEN compressed_content IS NOT NULL OR text_content <> '' THEN 1 ELSE 0 END
+        FROM plain_text WHERE title_id = %s
+    """, (title_id,))
+    row = cursor.fetchone()
+    return bool(row and row[0])
+
+def _update_section_body_targets(cursor, title_id, had_body, has_body):
+    """
+    章节正文从无到有（或从有到无）后更新受影响章节的 body_title_id
+    
+    正文有无不变时无需更新。新增正文只影响该章节及其祖先（按物化路径的前缀找出）:
+    尚无正文章节、或正文章节排在该章节之后的，改为指向该章节。
+    正文被清空时受影响的范围不易确定，重新计算整篇文章（只写入有变化的行）。
+    """
+    if had_body == has_body:
+        return
+    cursor.execute("SELECT article_id, path FROM title WHERE id = %s", (title_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return
+    article_id, path = row
+    if not has_body or path is None:
+        rebuild_section_bodies(cursor, article_id)
+        return
+    parts = path.split("/")
+    prefixes = ["/".join(parts[:i]) for i in range(1, len(parts) + 1)]
+    placeholders = ", ".join(["%s"] * len(prefixes))
+    cursor.execute(f"""
+        SELECT t.id, b.path
+        FROM title t LEFT JOIN title b ON b.id = t.body_title_id
+        WHERE t.article_id = %s AND t.path IN ({placeholders})
+    """, (article_id, *prefixes))
+    updates = [
+        (title_id, ancestor_id)
+        for ancestor_id, target_path in cursor.fetchall()
+        if target_path is None or target_path > path
+    ]
+    if updates:
+        cursor.executemany("UPDATE title SET body_title_id = %s WHERE id = %s", updates)
+
+@instrumented
+def get_article_id_by_content_hash(content_hash):
+    """根据源文件内容哈希获取文章ID，不存在时返回 None"""
+    try:
+        with get_cursor() as (connection, cursor):
+            cursor.execute(
+                "SELECT id FROM article WHERE content_hash = %s LIMIT 1",
+                (content_hash,)
+            )
+            result = cursor.fetchone()
+            return result[0] if result else None
+    except Error as e:
+        print(f"按内容哈希获取文章ID时出错: {e}")
+        return None
+
+@instrumented
 def insert_article(title):
     """插入新文章并返回文章ID"""
-    connection = create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
-            cursor.execute("INSERT INTO article (title) VALUES (%s)", (title,))
-            connection.commit()
+    try:
+        with get_cursor() as (connection, cursor):
+            cursor.execute(
+                "INSERT INTO article (title, normalized_title) VALUES (%s, %s)",
+                (title, normalize_title(title))
+            )
             article_id = cursor.lastrowid
+            record_change(cursor, "article", article_id, article_id, "insert")
+            bump_catalog_generation(cursor)
+            connection.commit()
+            invalidate_catalog_cache()
             return article_id
-        except Error as e:
-            print(f"插入文章时出错: {e}")
-            return None
-        finally:
-            if connection.is_connected():
-                cursor.close()
-                connection.close()
-    return None
+    except Error as e:
+        print(f"插入文章时出错: {e}")
+        return None
 
+@instrumented
+@sharded
 def insert_title(article_id, title, level):
     """插入标题并返回标题ID"""
-    connection = create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
-            cursor.execute(
-                "INSERT INTO title (article_id, title, level) VALUES (%s, %s, %s)",
-                (article_id, title, level)
+    try:
+        with get_cursor() as (connection, cursor):
+            title_id, = _insert_titles(
+                cursor, article_id, [(title, level, section_content_hash(title, level, None), None, None)]
             )
+            record_change(cursor, "title", title_id, article_id, "insert")
+            # 新标题追加在文章末尾且没有正文，只需计算这一行的层级，body_title_id 保持为空
+            _place_new_section(cursor, article_id, title_id, level)
             connection.commit()
-            title_id = cursor.lastrowid
             return title_id
-        except Error as e:
-            print(f"插入标题时出错: {e}")
-            return None
-        finally:
-            if connection.is_connected():
-                cursor.close()
-                connection.close()
-    return None
+    except Error as e:
+        print(f"插入标题时出错: {e}")
+        return None
 
+@instrumented
+@sharded
 def insert_plain_text(title_id, text_content):
     """插入正文并返回正文ID"""
-    connection = create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
+    try:
+        with get_cursor() as (connection, cursor):
             cursor.execute(
-                "INSERT INTO plain_text (title_id, text_content) VALUES (%s, %s)",
-                (title_id, text_content)
+                "INSERT INTO plain_text (title_id, text_content, content_format, compressed_content) "
+                "VALUES (%s, %s, %s, %s)",
+                (title_id, *encode_plain_text(text_content))
             )
-            connection.commit()
             text_id = cursor.lastrowid
+            record_title_changes(cursor, "plain_text", "insert", "id = %s", (title_id,))
+            _refresh_section_hash(cursor, title_id)
+            _update_section_body_targets(cursor, title_id, False, bool(text_content))
+            connection.commit()
             return text_id
-        except Error as e:
-            print(f"插入正文时出错: {e}")
-            return None
-        finally:
-            if connection.is_connected():
-                cursor.close()
-                connection.close()
-    return None
+    except Error as e:
+        print(f"插入正文时出错: {e}")
+        return None
 
-def get_all_articles():
-    """获取所有文章标题"""
-    connection = create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
+def _insert_titles(cursor, article_id, rows, after_id=0):
+    """
+    插入一篇文章的章节标题，rows 为 [(title, level, content_hash, position, path)]，返回按插入顺序的章节ID
+
+    after_id 为该文章已有章节的最大ID。绑定分片时章节ID由分片分配（见 sharding.Shard.insert_titles）。
+    """
+    shard = bound_shard()
+    if shard is not None:
+        return shard.insert_titles(cursor, [(article_id, *row) for row in rows])
+    sql = ("INSERT INTO title (article_id, title, level, content_hash, position, path) "
+           "VALUES (%s, %s, %s, %s, %s, %s)")
+    if len(rows) == 1:
+        cursor.execute(sql, (article_id, *rows[0]))
+        return [cursor.lastrowid]
+    cursor.executemany(sql, [(article_id, *row) for row in rows])
+    # 新建的章节ID大于该文章所有已有（包括刚删除的）章节ID，按ID排序即为插入顺序
+    cursor.execute(
+        "SELECT id FROM title WHERE article_id = %s AND id > %s ORDER BY id",
+        (article_id, after_id)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+def _insert_sections(cursor, article_id, sections):
+    """在当前事务中写入新文章的全部章节标题和正文并记录变更日志，返回按章节顺序排列的标题ID列表"""
+    if not sections:
+        return []
+    hierarchy = section_hierarchy([s["level"] for s in sections])
+    title_ids = _insert_titles(cursor, article_id, [
+        (s["title"], s["level"], section_content_hash(s["title"], s["level"], s.get("content")), position, path)
+        for s, (_, position, path) in zip(sections, hierarchy)
+    ])
+
+    # 父章节ID和正文章节ID在插入后才知道，单独补写
+    targets = section_body_targets(
+        [s["level"] for s in sections], [bool(s.get("content")) for s in sections]
+    )
+    cursor.executemany(
+        "UPDATE title SET parent_id = %s, body_title_id = %s WHERE id = %s",
+        [
+            (title_ids[parent] if parent is not None else None,
+             title_ids[target] if target is not None else None,
+             title_id)
+            for title_id, (parent, _, _), target in zip(title_ids, hierarchy, targets)
+        ]
+    )
+
+    texts = [
+        (title_id, *encode_plain_text(s["content"]))
+        for title_id, s in zip(title_ids, sections) if s.get("content")
+    ]
+    if texts:
+        cursor.executemany(
+            "INSERT INTO plain_text (title_id, text_content, content_format, compressed_content) "
+            "VALUES (%s, %s, %s, %s)",
+            texts
+        )
+
+    record_changes(cursor, [("title", title_id, article_id, "insert") for title_id in title_ids])
+    record_changes(cursor, [("plain_text", text[0], article_id, "insert") for text in texts])
+    return title_ids
+
+@instrumented
+@sharded
+def insert_article_bulk(title, sections, content_hash=None):
+    """
+    在一个事务中写入文章及其全部章节标题和正文
+
+    Args:
+        title (str): 文章题目
+        sections (list): 章节列表，每项为 {"title": 标题, "level": 级别, "content": 正文}
+        content_hash (str): 源文件的内容哈希，用于重复导入时跳过未变化的文件
+
+    Returns:
+        tuple: (文章ID, 按章节顺序排列的标题ID列表)，失败时回滚并返回 None
+    """
+    try:
+        with get_cursor() as (connection, cursor):
+            try:
+                cursor.execute(
+                    "INSERT INTO article (title, normalized_title, content_hash) VALUES (%s, %s, %s)",
+                    (title, normalize_title(title), content_hash)
+                )
+                article_id = cursor.lastrowid
+                record_change(cursor, "article", article_id, article_id, "insert")
+                title_ids = _insert_sections(cursor, article_id, sections)
+                bump_catalog_generation(cursor)
+                connection.commit()
+                invalidate_catalog_cache()
+                return article_id, title_ids
+            except Error:
+                connection.rollback()
+                raise
+    except Error as e:
+        print(f"批量写入文章时出错: {e}")
+        return None
+
+def plan_section_updates(old_hashes, new_hashes):
+    """
+    把重新导入的章节列表对齐到文章已有的章节（按 title.content_hash 比较）
+
+    Args:
+        old_hashes (list): 已有章节按文档顺序的内容哈希
+        new_hashes (list): 新章节按文档顺序的内容哈希
+
+    Returns:
+        tuple: (matches, deleted, inserted)
+            matches 为 [(已有章节下标, 新章节下标)]，这些章节保留ID，哈希不同的原地更新；
+            deleted 为要删除的已有章节下标；inserted 为要新建的新章节下标
+    """
+    matches, deleted, inserted = [], [], []
+    matcher = difflib.SequenceMatcher(None, old_hashes, new_hashes, autojunk=False)
+    for _, i1, i2, j1, j2 in matcher.get_opcodes():
+        olds, news = range(i1, i2), range(j1, j2)
+        # 被替换的片段按位置一一对应原地更新，多出的删除或新建
+        matches.extend(zip(olds, news))
+        deleted.extend(olds[len(news):])
+        inserted.extend(news[len(olds):])
+    return matches, deleted, inserted
+
+def _update_sections(cursor, article_id, sections):
+    """在当前事务中把文章的章节同步为 sections 并记录变更日志（规则见 update_article_bulk），返回章节统计"""
+    new_hashes = [section_content_hash(s["title"], s["level"], s.get("content")) for s in sections]
+    cursor.execute("""
+        SELECT id, content_hash, parent_id, position, path, body_title_id
+        FROM title WHERE article_id = %s
+        ORDER BY path, id
+    """, (article_id,))
+    rows = cursor.fetchall()
+    matches, deleted, inserted = plan_section_updates([row[1] for row in rows], new_hashes)
+    changed = [(rows[i][0], j) for i, j in matches if rows[i][1] != new_hashes[j]]
+    changes = []
+
+    if changed:
+        cursor.executemany(
+            "UPDATE title SET title = %s, level = %s, content_hash = %s, summary = NULL WHERE id = %s",
+            [(sections[j]["title"], sections[j]["level"], new_hashes[j], title_id)
+             for title_id, j in changed]
+        )
+        texts = [(title_id, sections[j]["content"]) for title_id, j in changed if sections[j].get("content")]
+        if texts:
+            _upsert_plain_texts(cursor, texts)
+        emptied = [(title_id,) for title_id, j in changed if not sections[j].get("content")]
+        if emptied:
+            cursor.executemany("DELETE FROM plain_text WHERE title_id = %s", emptied)
+        changes += [("title", title_id, article_id, "update") for title_id, _ in changed]
+        changes += [("plain_text", title_id, article_id, "update") for title_id, _ in changed]
+
+    if deleted:
+        cursor.executemany("DELETE FROM title WHERE id = %s", [(rows[i][0],) for i in deleted])
+        changes += [("title", rows[i][0], article_id, "delete") for i in deleted]
+
+    final_ids = [None] * len(sections)
+    for i, j in matches:
+        final_ids[j] = rows[i][0]
+    if inserted:
+        title_ids = _insert_titles(
+            cursor, article_id,
+            [(sections[j]["title"], sections[j]["level"], new_hashes[j], None, None) for j in inserted],
+            after_id=max((row[0] for row in rows), default=0)
+        )
+        for j, title_id in zip(inserted, title_ids):
+            final_ids[j] = title_id
+        texts = [(final_ids[j], sections[j]["content"]) for j in inserted if sections[j].get("content")]
+        if texts:
+            _upsert_plain_texts(cursor, texts)
+        changes += [("title", final_ids[j], article_id, "insert") for j in inserted]
+        changes += [("plain_text", title_id, article_id, "insert") for title_id, _ in texts]
+
+    if changes:
+        # 按新的文档顺序写入层级和正文章节，只更新取值变化的行
+        levels = [s["level"] for s in sections]
+        targets = section_body_targets(levels, [bool(s.get("content")) for s in sections])
+        current = {row[0]: row[2:] for row in rows}
+        updates = []
+        for title_id, (parent, position, path), target in zip(final_ids, section_hierarchy(levels), targets):
+            values = (final_ids[parent] if parent is not None else None, position, path,
+                      final_ids[target] if target is not None else None)
+            if current.get(title_id) != values:
+                updates.append((*values, title_id))
+        if updates:
+            cursor.executemany(
+                "UPDATE title SET parent_id = %s, position = %s, path = %s, body_title_id = %s WHERE id = %s",
+                updates
+            )
+        record_changes(cursor, changes)
+    return {
+        "kept": len(matches) - len(changed),
+        "updated": len(changed),
+        "inserted": len(inserted),
+        "deleted": len(deleted),
+    }
+
+@instrumented
+@sharded
+def update_article_bulk(article_id, sections, content_hash=None):
+    """
+    在一个事务中把已有文章的章节同步为重新导入的 sections，只写入变化的章节
+
+    未变化的章节保留ID和摘要；变化的章节原地更新标题、级别和正文并清空其摘要（等待重新生成）；
+    多余的章节删除，新增的章节可以插入到任意位置（文档顺序由 path 决定，与ID无关）。
+    对齐规则见 plan_section_updates。
+
+    Args:
+        article_id (int): 文章ID
+        sections (list): 章节列表，格式同 insert_article_bulk
+        content_hash (str): 新的源文件哈希
+
+    Returns:
+        dict: {"kept": 未变化, "updated": 原地更新, "inserted": 新建, "deleted": 删除} 的章节数，
+              失败时回滚并返回 None
+    """
+    try:
+        with get_cursor() as (connection, cursor):
+            try:
+                stats = _update_sections(cursor, article_id, sections)
+                cursor.execute("UPDATE article SET content_hash = %s WHERE id = %s", (content_hash, article_id))
+                connection.commit()
+                return stats
+            except Error:
+                connection.rollback()
+                raise
+    except Error as e:
+        print(f"更新文章章节时出错: {e}")
+        return None
+
+@instrumented
+def get_article_content_hash(article_id):
+    """获取文章记录的源文件哈希，没有记录时返回 None"""
+    try:
+        with get_cursor() as (connection, cursor):
+            cursor.execute("SELECT content_hash FROM article WHERE id = %s", (article_id,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+    except Error as e:
+        print(f"获取文章内容哈希时出错: {e}")
+        return None
+
+@instrumented
+def update_article_content_hash(article_id, content_hash):
+    """只更新文章的源文件哈希（不改动章节）"""
+    try:
+        with get_cursor() as (connection, cursor):
+            cursor.execute("UPDATE article SET content_hash = %s WHERE id = %s", (content_hash, article_id))
+            connection.commit()
+            return cursor.rowcount > 0
+    except Error as e:
+        print(f"更新文章内容哈希时出错: {e}")
+        return False
+
+def import_article(title, sections, content_hash=None):
+    """
+    导入一篇文章（Markdown 和 DOCX 导入共用）
+
+    - 同名文章不存在：整篇写入（insert_article_bulk）。
+    - 同名文章存在但没有源文件哈希（迁移8之前导入）：无法判断是否变化，只回填哈希，章节和摘要保持不动。
+    - 同名文章存在且源文件哈希不同：只更新变化的章节（update_article_bulk），其余章节的ID和摘要保留。
+    - 未提供 content_hash 或哈希相同：跳过。
+
+    Returns:
+        tuple: (状态, 文章ID, 章节统计)，状态为 inserted、updated、backfilled 或 skipped；失败时返回 None
+    """
+    existing_id = get_article_id_by_title(title)
+    if existing_id is None:
+        result = insert_article_bulk(title, sections, content_hash=content_hash)
+        return ("inserted", result[0], {"inserted": len(result[1])}) if result else None
+    if content_hash is None:
+        return "skipped", existing_id, {}
+    stored_hash = get_article_content_hash(existing_id)
+    if stored_hash == content_hash:
+        return "skipped", existing_id, {}
+    if stored_hash is None:
+        return ("backfilled", existing_id, {}) if update_article_content_hash(existing_id, content_hash) else None
+    stats = update_article_bulk(existing_id, sections, content_hash)
+    return ("updated", existing_id, stats) if stats is not None else None
+
+def _load_all_articles():
+    try:
+        with get_cursor() as (connection, cursor):
             cursor.execute("SELECT title FROM article")
             articles = [row[0] for row in cursor.fetchall()]
             return articles
-        except Error as e:
-            print(f"获取文章列表时出错: {e}")
-            return []
-        finally:
-            if connection.is_connected():
-                cursor.close()
-                connection.close()
-    return []
+    except Error as e:
+        print(f"获取文章列表时出错: {e}")
+        return None
 
-def get_all_articles_with_details():
-    """获取所有文章的ID、标题和摘要"""
-    connection = create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
+@instrumented
+def get_all_articles():
+    """获取所有文章标题（经过目录缓存）"""
+    return _catalog_cache.get("titles", _load_all_articles) or []
+
+def _load_all_articles_with_details():
+    try:
+        with get_cursor() as (connection, cursor):
             cursor.execute("SELECT id, title, summary FROM article")
             articles = cursor.fetchall()
             return articles
-        except Error as e:
-            print(f"获取文章详情列表时出错: {e}")
-            return []
-        finally:
-            if connection.is_connected():
-                cursor.close()
-                connection.close()
-    return []
+    except Error as e:
+        print(f"获取文章详情列表时出错: {e}")
+        return None
+
+@instrumented
+def get_all_articles_with_details():
+    """获取所有文章的ID、标题和摘要（经过目录缓存）"""
+    return _catalog_cache.get("details", _load_all_articles_with_details) or []
+
+@instrumented
+def update_article_summary(article_id, summary):
+    """更新article表中的summary字段"""
+    try:
+        with get_cursor() as (connection, cursor):
+            cursor.execute(
+                "UPDATE article SET summary = %s WHERE id = %s",
+                (summary, article_id)
+            )
+            record_change(cursor, "article", article_id, article_id, "summary")
+            bump_catalog_generation(cursor)
+            connection.commit()
+            invalidate_catalog_cache()
+            return True
+    except Error as e:
+        print(f"更新文章摘要时出错: {e}")
+        return False
 
+@instrumented
 def get_article_id_by_title(title):
-    """根据文章标题获取文章ID"""
-    connection = create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
-            # 1. 尝试精确匹配
-            cursor.execute("SELECT id FROM article WHERE title = %s", (title,))
+    """根据文章标题获取文章ID（精确匹配优先，其次按归一化标题匹配）"""
+    try:
+        with get_cursor() as (connection, cursor):
+            # normalized_title 上有索引，精确匹配和模糊匹配合并为一次查询
+            cursor.execute("""
+                SELECT id, title FROM article
+                WHERE title = %s OR normalized_title = %s
+                ORDER BY title = %s DESC, id
+                LIMIT 1
+            """, (title, normalize_title(title), title))
             result = cursor.fetchone()
-            if result:
-                return result[0]
-            
-            # 2. 如果精确匹配失败，尝试去除空格后匹配
-            # 获取所有文章标题和ID
-            cursor.execute("SELECT id, title FROM article")
-            all_articles = cursor.fetchall()
-            
-            # 归一化输入标题 (去除所有空白字符并转小写)
-            normalized_input_title = "".join(title.split()).lower()
-            
-            for article_id, db_title in all_articles:
-                if "".join(db_title.split()).lower() == normalized_input_title:
-                    print(f"提示: 通过模糊匹配找到文章 '{db_title}' (ID: {article_id})")
-                    return article_id
-            
-            return None
-        except Error as e:
-            print(f"获取文章ID时出错: {e}")
-            return None
-        finally:
-            if connection.is_connected():
-                cursor.close()
-                connection.close()
-    return None
+            if not result:
+                return None
+
+            article_id, db_title = result
+            if db_title != title:
+                print(f"提示: 通过模糊匹配找到文章 '{db_title}' (ID: {article_id})")
+            return article_id
+    except Error as e:
+        print(f"获取文章ID时出错: {e}")
+        return None
+
+@instrumented
+def update_article_title(article_id, new_title):
+    """更新文章标题，同时同步归一化标题"""
+    try:
+        with get_cursor() as (connection, cursor):
+            cursor.execute(
+                "UPDATE article SET title = %s, normalized_title = %s WHERE id = %s",
+                (new_title, normalize_title(new_title), article_id)
+            )
+            updated = cursor.rowcount > 0
+            if updated:
+                record_change(cursor, "article", article_id, article_id, "update")
+            bump_catalog_generation(cursor)
+            connection.commit()
+            invalidate_catalog_cache()
+            return updated
+    except Error as e:
+        print(f"更新文章标题时出错: {e}")
+        return False
 
+@instrumented
+@sharded
 def get_titles_by_article_id(article_id):
     """根据文章ID获取所有标题"""
-    connection = create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
+    try:
+        with get_cursor() as (connection, cursor):
             cursor.execute(
-                "SELECT id, title, level, summary FROM title WHERE article_id = %s ORDER BY id",
+                "SELECT id, title, level, summary FROM title WHERE article_id = %s ORDER BY path, id",
                 (article_id,)
             )
             titles = cursor.fetchall()
             return titles
-        except Error as e:
-            print(f"获取标题列表时出错: {e}")
-            return []
-        finally:
-            if connection.is_connected():
-                cursor.close()
-                connection.close()
-    return []
+    except Error as e:
+        print(f"获取标题列表时出错: {e}")
+        return []
 
+@instrumented
+@sharded
 def get_titles_by_article(title):
-    """根据文章标题获取所有标题"""
-    article_id = get_article_id_by_title(title)
-    if article_id:
-        return get_titles_by_article_id(article_id)
-    return []
+    """根据文章标题获取所有标题（与 get_article_id_by_title 使用相同的匹配规则）"""
+    try:
+        with get_cursor() as (connection, cursor):
+            cursor.execute("""
+                SELECT id, title, level, summary FROM title
+                WHERE article_id = (
+                    SELECT id FROM article
+                    WHERE title = %s OR normalized_title = %s
+                    ORDER BY title = %s DESC, id
+                    LIMIT 1
+                )
+                ORDER BY path, id
+            """, (title, normalize_title(title), title))
+            return cursor.fetchall()
+    except Error as e:
+        print(f"获取标题列表时出错: {e}")
+        return []
 
+@instrumented
+@sharded
 def delete_article_by_title(title):
-    """根据文章标题删除文章"""
-    connection = create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
+    """根据文章标题删除文章（章节和正文级联删除，变更日志中只记录文章的 delete）"""
+    try:
+        with get_cursor() as (connection, cursor):
+            cursor.execute("SELECT id FROM article WHERE title = %s", (title,))
+            article_ids = [row[0] for row in cursor.fetchall()]
             cursor.execute("DELETE FROM article WHERE title = %s", (title,))
+            deleted = cursor.rowcount > 0
+            record_changes(cursor, [("article", article_id, article_id, "delete") for article_id in article_ids])
+            bump_catalog_generation(cursor)
             connection.commit()
-            return cursor.rowcount > 0
-        except Error as e:
-            print(f"删除文章时出错: {e}")
-            return False
-        finally:
-            if connection.is_connected():
-                cursor.close()
-                connection.close()
-    return False
+            invalidate_catalog_cache()
+            return deleted
+    except Error as e:
+        print(f"删除文章时出错: {e}")
+        return False
 
+@instrumented
+@sharded
 def delete_title_by_id(title_id):
     """根据标题ID删除标题"""
-    connection = create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
+    try:
+        with get_cursor() as (connection, cursor):
+            cursor.execute("SELECT article_id FROM title WHERE id = %s", (title_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return False
             cursor.execute("DELETE FROM title WHERE id = %s", (title_id,))
+            deleted = cursor.rowcount > 0
+            record_change(cursor, "title", title_id, row[0], "delete")
+            # 被删章节的子章节改挂到新的父章节下
+            rebuild_section_hierarchy(cursor, row[0])
+            rebuild_section_bodies(cursor, row[0])
             connection.commit()
-            return cursor.rowcount > 0
-        except Error as e:
-            print(f"删除标题时出错: {e}")
-            return False
-        finally:
-            if connection.is_connected():
-                cursor.close()
-                connection.close()
-    return False
+            return deleted
+    except Error as e:
+        print(f"删除标题时出错: {e}")
+        return False
 
+@instrumented
+@sharded
 def update_title(title_id, new_title, new_level):
     """更新标题"""
-    connection = create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
+    try:
+        with get_cursor() as (connection, cursor):
+            cursor.execute("SELECT article_id, level FROM title WHERE id = %s", (title_id,))
+            row = cursor.fetchone()
             cursor.execute(
                 "UPDATE title SET title = %s, level = %s WHERE id = %s",
                 (new_title, new_level, title_id)
             )
+            updated = cursor.rowcount > 0
+            if row:
+                record_change(cursor, "title", title_id, row[0], "update")
+            _refresh_section_hash(cursor, title_id)
+            # 级别变化会改变层级关系
+            if row and row[1] != new_level:
+                rebuild_section_hierarchy(cursor, row[0])
+                rebuild_section_bodies(cursor, row[0])
             connection.commit()
-            return cursor.rowcount > 0
-        except Error as e:
-            print(f"更新标题时出错: {e}")
-            return False
-        finally:
-            if connection.is_connected():
-                cursor.close()
-                connection.close()
-    return False
+            return updated
+    except Error as e:
+        print(f"更新标题时出错: {e}")
+        return False
 
+@instrumented
+@sharded
+def update_title_summary(title_id, summary):
+    """更新章节摘要"""
+    try:
+        with get_cursor() as (connection, cursor):
+            cursor.execute("UPDATE title SET summary = %s WHERE id = %s", (summary, title_id))
+            record_title_changes(cursor, "title", "summary", "id = %s", (title_id,))
+            connection.commit()
+            return True
+    except Error as e:
+        print(f"更新章节摘要时出错: {e}")
+        return False
+
+@instrumented
+@sharded
+def clear_title_summaries(article_id):
+    """清空文章全部章节的摘要"""
+    try:
+        with get_cursor() as (connection, cursor):
+            cursor.execute("UPDATE title SET summary = NULL WHERE article_id = %s", (article_id,))
+            record_title_changes(cursor, "title", "summary", "article_id = %s", (article_id,))
+            connection.commit()
+            return True
+    except Error as e:
+        print(f"清空章节摘要时出错: {e}")
+        return False
+
+def _upsert_plain_texts(cursor, texts):
+    """写入或覆盖正文，texts 为 [(标题ID, 正文)]"""
+    # plain_text.title_id 上有唯一键（迁移4），存在则更新，不存在则插入
+    # 存储格式随新内容重新确定，三列一起覆盖
+    if DB_BACKEND == "sqlite":
+        upsert = """ON CONFLICT (title_id) DO UPDATE SET
+            text_content = excluded.text_content,
+            content_format = excluded.content_format,
+            compressed_content = excluded.compressed_content"""
+    else:
+        upsert = """ON DUPLICATE KEY UPDATE
+            text_content = VALUES(text_content),
+            content_format = VALUES(content_format),
+            compressed_content = VALUES(compressed_content)"""
+    cursor.executemany(f"""
+        INSERT INTO plain_text (title_id, text_content, content_format, compressed_content)
+        VALUES (%s, %s, %s, %s)
+        {upsert}
+    """, [(title_id, *encode_plain_text(content)) for title_id, content in texts])
+
+@instrumented
+@sharded
 def update_plain_text_by_title_id(title_id, new_content):
     """根据标题ID更新正文"""
-    connection = create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
-            # 检查是否存在正文记录
-            cursor.execute(
-                "SELECT id FROM plain_text WHERE title_id = %s",
-                (title_id,)
-            )
-            result = cursor.fetchone()
-            
-            if result:
-                # 更新现有正文
-                text_id = result[0]
-                cursor.execute(
-                    "UPDATE plain_text SET text_content = %s WHERE id = %s",
-                    (new_content, text_id)
-                )
-            else:
-                # 插入新正文
-                cursor.execute(
-                    "INSERT INTO plain_text (title_id, text_content) VALUES (%s, %s)",
-                    (title_id, new_content)
-                )
-            
+    try:
+        with get_cursor() as (connection, cursor):
+            had_body = _section_has_body(cursor, title_id)
+            _upsert_plain_texts(cursor, [(title_id, new_content)])
+            record_title_changes(cursor, "plain_text", "update", "id = %s", (title_id,))
+            _refresh_section_hash(cursor, title_id)
+            _update_section_body_targets(cursor, title_id, had_body, bool(new_content))
             connection.commit()
             return True
-        except Error as e:
-            print(f"更新正文时出错: {e}")
-            return False
-        finally:
-            if connection.is_connected():
-                cursor.close()
-                connection.close()
-    return False
+    except Error as e:
+        print(f"更新正文时出错: {e}")
+        return False
 
+@instrumented
+@sharded
 def get_plain_text_by_title(title):
     """根据标题获取正文内容"""
-    connection = create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
+    try:
+        with get_cursor() as (connection, cursor):
             # 执行JOIN查询获取正文内容
-            cursor.execute("""
-                SELECT pt.text_content, t.summary
+            cursor.execute(f"""
+                SELECT {PLAIN_TEXT_COLUMNS}, t.summary
                 FROM plain_text pt
                 JOIN title t ON pt.title_id = t.id
                 WHERE t.title = %s
@@ -363,41 +1387,666 @@ def get_plain_text_by_title(title):
             
             result = cursor.fetchone()
             # 返回 (text_content, summary)
-            return (result[0], result[1]) if result else None
-        except Error as e:
-            print(f"获取正文内容时出错: {e}")
-            return None
-        finally:
-            if connection.is_connected():
-                cursor.close()
-                connection.close()
-    return None
+            return (decode_plain_text(*result[:3]), result[3]) if result else None
+    except Error as e:
+        print(f"获取正文内容时出错: {e}")
+        return None
 
 
+@instrumented
+@sharded
 def get_plain_text_by_title_id(title_id):
     """根据标题ID获取正文内容"""
-    connection = create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
+    try:
+        with get_cursor() as (connection, cursor):
             # 查询指定标题ID的正文内容
-            cursor.execute("""
-                SELECT pt.text_content 
+            cursor.execute(f"""
+                SELECT {PLAIN_TEXT_COLUMNS} 
                 FROM plain_text pt 
                 WHERE pt.title_id = %s
             """, (title_id,))
             
             result = cursor.fetchone()
-            return result[0] if result else None
-        except Error as e:
-            print(f"获取正文内容时出错: {e}")
+            return decode_plain_text(*result) if result else None
+    except Error as e:
+        print(f"获取正文内容时出错: {e}")
+        return None
+
+
+@instrumented
+@sharded
+def get_plain_texts_by_title_ids(title_ids):
+    """
+    根据标题ID列表批量获取正文内容，任意数量的ID只需一次查询
+
+    Args:
+        title_ids (list): 标题ID列表
+    
+    Returns:
+        dict: {标题ID: 正文内容}，没有正文的标题ID不会出现在结果中
+    """
+    ids = list(dict.fromkeys(title_ids))
+    if not ids:
+        return {}
+    try:
+        with get_cursor() as (connection, cursor):
+            placeholders = ", ".join(["%s"] * len(ids))
+            cursor.execute(f"""
+                SELECT pt.title_id, {PLAIN_TEXT_COLUMNS}
+                FROM plain_text pt
+                WHERE pt.title_id IN ({placeholders})
+            """, ids)
+            return {row[0]: decode_plain_text(*row[1:]) for row in cursor.fetchall()}
+    except Error as e:
+        print(f"批量获取正文内容时出错: {e}")
+        return {}
+
+@instrumented
+@sharded
+def get_section_bodies(title_ids):
+    """
+    获取章节实际承载的正文，一次查询
+
+    没有正文的标题通过入库时计算好的 body_title_id 解析到第一个有正文的子孙章节，
+    调用方无需再按 title_id+1 逐个试探。
+
+    Args:
+        title_ids (list): 章节ID列表
+    
+    Returns:
+        dict: {章节ID: 正文内容}，整棵子树都没有正文的章节不会出现在结果中
+    """
+    ids = list(dict.fromkeys(title_ids))
+    if not ids:
+        return {}
+    try:
+        with get_cursor() as (connection, cursor):
+            placeholders = ", ".join(["%s"] * len(ids))
+            cursor.execute(f"""
+                SELECT t.id, {PLAIN_TEXT_COLUMNS}
+                FROM title t
+                JOIN plain_text pt ON pt.title_id = t.body_title_id
+                WHERE t.id IN ({placeholders})
+            """, ids)
+            return {row[0]: decode_plain_text(*row[1:]) for row in cursor.fetchall()}
+    except Error as e:
+        print(f"获取章节正文时出错: {e}")
+        return {}
+
+def _stream_article_tree(article_id):
+    """逐行读取文章树：先产出文章行，再依次产出章节行"""
+    try:
+        # 流式读取期间需要一直占用连接，因此检出独占连接并使用非缓冲游标
+        with get_cursor(shared=False) as (connection, cursor):
+            cursor.execute(f"""
+                SELECT a.id, a.title, a.summary,
+                       t.id, t.title, t.level, t.summary, {PLAIN_TEXT_COLUMNS}
+                FROM article a
+                LEFT JOIN title t ON t.article_id = a.id
+                LEFT JOIN plain_text pt ON pt.title_id = t.id
+                WHERE a.id = %s
+                ORDER BY t.path, t.id
+            """, (article_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return
+            yield row[:3]
+            while row is not None:
+                # 没有任何章节的文章，LEFT JOIN 会得到一行章节列全为NULL的记录
+                if row[3] is not None:
+                    yield row[3:7] + (decode_plain_text(*row[7:]),)
+                row = cursor.fetchone()
+    except Error as e:
+        print(f"获取文章内容时出错: {e}")
+
+@instrumented
+@sharded
+def get_article_tree(article_id):
+    """
+    通过一次JOIN查询获取文章、按顺序排列的章节及其正文和摘要
+    
+    Args:
+        article_id (int): 文章ID
+    
+    Returns:
+        tuple: (文章, 章节迭代器)
+            文章为 (id, title, summary)，不存在时为 None；
+            章节迭代器逐行产出 (title_id, title, level, summary, text_content)。
+            迭代期间占用一个独占连接，迭代结束（或迭代器被关闭）后归还连接池。
+    """
+    rows = _stream_article_tree(article_id)
+    article = next(rows, None)
+    if article is None:
+        return None, iter(())
+    return article, rows
+
+@instrumented
+@sharded
+def get_section_subtree(title_id):
+    """
+    获取章节及其全部子孙章节（含正文和摘要），一次按 (article_id, path) 的范围查询
+    
+    子孙章节的路径都以该章节路径加 "/" 开头，而 "/" 排在数字之前，
+    因此 [path, path + "0") 恰好覆盖整棵子树。
+    
+    Args:
+        title_id (int): 章节ID
+    
+    Returns:
+        list: 按文档顺序排列的 (title_id, parent_id, position, path, title, level, summary, text_content)，
+              章节不存在时为空列表
+    """
+    upper = "s.path || '0'" if DB_BACKEND == "sqlite" else "CONCAT(s.path, '0')"
+    try:
+        with get_cursor() as (connection, cursor):
+            cursor.execute(f"""
+                SELECT t.id, t.parent_id, t.position, t.path, t.title, t.level, t.summary,
+                       {PLAIN_TEXT_COLUMNS}
+                FROM title s
+                JOIN title t ON t.article_id = s.article_id
+                    AND t.path >= s.path AND t.path < {upper}
+                LEFT JOIN plain_text pt ON pt.title_id = t.id
+                WHERE s.id = %s
+                ORDER BY t.path
+            """, (title_id,))
+            return [row[:7] + (decode_plain_text(*row[7:]),) for row in cursor.fetchall()]
+    except Error as e:
+        print(f"获取章节子树时出错: {e}")
+        return []
+
+@instrumented
+@sharded
+def get_section_ancestors(title_id):
+    """
+    获取章节的全部祖先章节，一次递归查询（每一层都是主键查找）
+    
+    Args:
+        title_id (int): 章节ID
+    
+    Returns:
+        list: 从顶级章节到直接父章节的 (title_id, parent_id, position, path, title, level, summary)
+    """
+    try:
+        with get_cursor() as (connection, cursor):
+            cursor.execute("""
+                WITH RECURSIVE ancestors (id, parent_id, position, path, title, level, summary, depth) AS (
+                    SELECT p.id, p.parent_id, p.position, p.path, p.title, p.level, p.summary, 1
+                    FROM title s JOIN title p ON p.id = s.parent_id
+                    WHERE s.id = %s
+                    UNION ALL
+                    SELECT p.id, p.parent_id, p.position, p.path, p.title, p.level, p.summary, a.depth + 1
+                    FROM ancestors a JOIN title p ON p.id = a.parent_id
+                )
+                SELECT id, parent_id, position, path, title, level, summary
+                FROM ancestors
+                ORDER BY depth DESC
+            """, (title_id,))
+            return cursor.fetchall()
+    except Error as e:
+        print(f"获取祖先章节时出错: {e}")
+        return []
+
+# 全量遍历时每次从服务器读取的行数
+DEFAULT_BATCH_SIZE = 500
+
+@instrumented
+def iter_articles(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    流式遍历所有文章，内存占用与文章总数无关
+    
+    Yields:
+        tuple: (id, title, summary)
+    """
+    try:
+        # 非缓冲游标：结果集留在服务器端，按批读取；遍历期间独占一个连接
+        with get_cursor(shared=False) as (connection, cursor):
+            cursor.execute("SELECT id, title, summary FROM article ORDER BY id")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+    except Error as e:
+        print(f"遍历文章时出错: {e}")
+
+@instrumented
+@sharded
+def iter_sections(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    按文章、章节顺序流式遍历全部章节，内存占用与语料规模无关
+    
+    Args:
+        batch_size (int): 每次从服务器读取的行数
+    
+    Yields:
+        tuple: (article_id, title_id, level, title, text_content, summary)
+    """
+    try:
+        with get_cursor(shared=False) as (connection, cursor):
+            cursor.execute(f"""
+                SELECT t.article_id, t.id, t.level, t.title, t.summary, {PLAIN_TEXT_COLUMNS}
+                FROM title t
+                LEFT JOIN plain_text pt ON pt.title_id = t.id
+                ORDER BY t.article_id, t.path, t.id
+            """)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row[:4] + (decode_plain_text(*row[5:]), row[4])
+    except Error as e:
+        print(f"遍历章节时出错: {e}")
+
+@instrumented
+@sharded
+def get_all_sections():
+    """
+    一次读取全部章节和正文（内存语料 corpus.Corpus 加载用）
+
+    Returns:
+        tuple: ([(id, article_id, title, level, summary, parent_id, position, path, body_title_id)],
+                {标题ID: 正文内容})
+    """
+    with get_cursor() as (connection, cursor):
+        cursor.execute("""
+            SELECT id, article_id, title, level, summary, parent_id, position, path, body_title_id
+            FROM title
+        """)
+        sections = cursor.fetchall()
+        cursor.execute("SELECT title_id, text_content, content_format, compressed_content FROM plain_text")
+        bodies = {row[0]: decode_plain_text(*row[1:]) for row in cursor.fetchall()}
+    return sections, bodies
+
+@instrumented
+@sharded
+def recompress_plain_texts(compression=None, batch_size=DEFAULT_BATCH_SIZE, allow_unsearchable=False):
+    """
+    按指定格式重写已有正文的存储方式（内容不变，章节哈希无需更新）
+    
+    Args:
+        compression (str): zlib、zstd 或 none（解压为明文），默认取 PLAIN_TEXT_COMPRESSION
+        batch_size (int): 每个事务处理的行数
+        allow_unsearchable (bool): 压缩后的正文不在全文索引中时（MySQL）仍然压缩
+    
+    Returns:
+        int: 存储格式发生变化的行数
+    """
+    compression = compression or PLAIN_TEXT_COMPRESSION
+    if _compression_format(compression) and not compressed_text_searchable() and not allow_unsearchable:
+        print("全文索引不包含压缩存储的正文，压缩后这些正文将无法被全文检索命中；"
+              "如仍需压缩请传入 allow_unsearchable=True")
+        return 0
+    changed = 0
+    last_id = 0
+    try:
+        with get_cursor() as (connection, cursor):
+            while True:
+                cursor.execute(f"""
+                    SELECT pt.id, {PLAIN_TEXT_COLUMNS}
+                    FROM plain_text pt
+                    WHERE pt.id > %s
+                    ORDER BY pt.id
+                    LIMIT %s
+                """, (last_id, batch_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                updates = []
+                for row in rows:
+                    encoded = encode_plain_text(decode_plain_text(*row[1:]), compression)
+                    if encoded[1] != row[2]:
+                        updates.append((*encoded, row[0]))
+                if updates:
+                    cursor.executemany("""
+                        UPDATE plain_text
+                        SET text_content = %s, content_format = %s, compressed_content = %s
+                        WHERE id = %s
+                    """, updates)
+                    connection.commit()
+                    changed += len(updates)
+            return changed
+    except Error as e:
+        print(f"重写正文存储格式时出错: {e}")
+        return changed
+
+@instrumented
+def get_change_checkpoint(consumer):
+    """获取消费者已处理到的变更版本号，从未处理过时返回 0"""
+    try:
+        with get_cursor() as (connection, cursor):
+            cursor.execute("SELECT version FROM change_log_checkpoint WHERE consumer = %s", (consumer,))
+            row = cursor.fetchone()
+            return row[0] if row else 0
+    except Error as e:
+        print(f"获取变更检查点时出错: {e}")
+        return 0
+
+@instrumented
+def save_change_checkpoint(consumer, version):
+    """保存消费者已处理到的变更版本号"""
+    try:
+        with get_cursor() as (connection, cursor):
+            if DB_BACKEND == "sqlite":
+                upsert = "ON CONFLICT (consumer) DO UPDATE SET version = excluded.version, updated_at = CURRENT_TIMESTAMP"
+            else:
+                upsert = "ON DUPLICATE KEY UPDATE version = VALUES(version), updated_at = CURRENT_TIMESTAMP"
+            cursor.execute(
+                f"INSERT INTO change_log_checkpoint (consumer, version) VALUES (%s, %s) {upsert}",
+                (consumer, version)
+            )
+            connection.commit()
+            return True
+    except Error as e:
+        print(f"保存变更检查点时出错: {e}")
+        return False
+
+@instrumented
+def get_changes_since(version, entities=None, limit=DEFAULT_BATCH_SIZE):
+    """
+    获取版本号大于 version 的变更
+    
+    Args:
+        version (int): 上次处理到的版本号
+        entities (list): 只返回这些实体的变更，为 None 时返回全部（reload 总是返回）
+        limit (int): 最多返回的条数
+    
+    Returns:
+        list: [(version, entity, entity_id, article_id, operation), ...]，按版本号升序
+    """
+    entity_filter = ""
+    params = [version]
+    if entities:
+        entity_filter = f"AND entity IN ({', '.join(['%s'] * (len(entities) + 1))})"
+        params.extend([*entities, "corpus"])
+    params.append(limit)
+    try:
+        with get_cursor() as (connection, cursor):
+            cursor.execute(f"""
+                SELECT version, entity, entity_id, article_id, operation
+                FROM change_log
+                WHERE version > %s {entity_filter}
+                ORDER BY version
+                LIMIT %s
+            """, params)
+            return cursor.fetchall()
+    except Error as e:
+        print(f"获取变更日志时出错: {e}")
+        return []
+
+@instrumented
+def get_change_watermark(after=None, until=None, limit=DEFAULT_BATCH_SIZE):
+    """
+    获取可以安全前移检查点的版本号：after 之后直到该版本的变更都已提交
+    
+    版本号在插入时分配、提交时才可见。并发写入时持有较小版本的事务可能晚于持有较大版本的事务提交，
+    此时 (after, until] 中出现空洞；检查点越过空洞后，该事务提交的变更将永远不会被处理。
+    因此返回第一个空洞之前的版本号；空洞之后的变更已写入超过 CHANGE_LOG_GAP_TIMEOUT 秒时跳过该空洞。
+    
+    Args:
+        after (int): 已处理到的版本号；为 None 时只检查最新的 limit 条变更
+                     （全量构建索引前取版本号时使用）
+        until (int): 最多返回到该版本号，为 None 时不限
+        limit (int): 最多检查的变更条数（after 之后的前 limit 条），返回的版本号不会越过它们
+    
+    Returns:
+        int: 安全的版本号；没有可前移的变更时返回 after（after 为 None 时返回 0）
+    """
+    if DB_BACKEND == "sqlite":
+        age = "(julianday('now') - julianday(changed_at)) * 86400"
+    else:
+        age = "TIMESTAMPDIFF(SECOND, changed_at, CURRENT_TIMESTAMP)"
+    until_filter = "AND version <= %s" if until is not None else ""
+    until_params = [until] if until is not None else []
+    try:
+        with get_cursor() as (connection, cursor):
+            if after is None:
+                cursor.execute(f"""
+                    SELECT version, {age} FROM change_log
+                    {"WHERE version <= %s" if until is not None else ""}
+                    ORDER BY version DESC
+                    LIMIT %s
+                """, (*until_params, limit))
+                rows = cursor.fetchall()[::-1]
+                if not rows:
+                    return 0
+                after = rows[0][0] - 1
+            else:
+                cursor.execute(f"""
+                    SELECT version, {age} FROM change_log
+                    WHERE version > %s {until_filter}
+                    ORDER BY version
+                    LIMIT %s
+                """, (after, *until_params, limit))
+                rows = cursor.fetchall()
+    except Error as e:
+        print(f"获取变更日志水位时出错: {e}")
+        return after or 0
+    watermark = after
+    for version, seconds in rows:
+        if version > watermark + 1 and seconds < CHANGE_LOG_GAP_TIMEOUT:
+            break
+        watermark = version
+    return watermark
+
+@instrumented
+def get_latest_change_version():
+    """获取变更日志的最新版本号，没有变更时返回 0"""
+    try:
+        with get_cursor() as (connection, cursor):
+            cursor.execute("SELECT MAX(version) FROM change_log")
+            return cursor.fetchone()[0] or 0
+    except Error as e:
+        print(f"获取最新变更版本时出错: {e}")
+        return 0
+
+# 没有全文索引时 LIKE 匹配最多使用的片段数（每个片段都要扫描一遍正文）
+LIKE_MAX_TERMS = 16
+
+_fulltext_ready = False
+
+def fulltext_index_exists():
+    """
+    全文索引是否可用
+
+    MySQL 总是返回 True；SQLite 不支持 FTS5 trigram 分词时迁移7会跳过 FTS5 表，此时返回 False，
+    全文检索退回 LIKE 匹配。
+    """
+    global _fulltext_ready
+    if DB_BACKEND != "sqlite" or _fulltext_ready:
+        return True
+    try:
+        with get_cursor() as (connection, cursor):
+            cursor.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'ft_plain_text_content'"
+            )
+            _fulltext_ready = cursor.fetchone()[0] > 0
+    except Error:
+        return False
+    return _fulltext_ready
+
+def _query_terms(query, max_terms):
+    """把问题切成重叠的三字片段（去重，保持出现顺序）"""
+    terms = []
+    for segment in re.split(r"[\s\W_]+", query):
+        for i in range(max(len(segment) - 2, 0)):
+            term = segment[i:i + 3]
+            if term not in terms:
+                terms.append(term)
+    return terms[:max_terms]
+
+def _fts5_query(query, max_terms=64):
+    """
+    把自然语言问题转换为 FTS5 trigram 查询
+
+    与 MySQL ngram 的自然语言模式类似：问题被切成重叠的三字片段，任一片段命中即可，
+    命中片段越多、越稀有，bm25 得分越高。
+    """
+    return " OR ".join(f'"{term}"' for term in _query_terms(query, max_terms))
+
+def _like_score(columns, terms):
+    """LIKE 匹配的得分表达式及参数：每个片段在每一列中出现一次得 1 分"""
+    parts = [f"(COALESCE({column}, '') LIKE %s)" for _ in terms for column in columns]
+    params = [f"%{term}%" for term in terms for _ in columns]
+    return " + ".join(parts), params
+
+def search_sections_sql(query, article_id=None, limit=10):
+    """
+    生成 search_sections 的SQL和参数（分片存储在各分片上执行同一条查询）
+
+    Returns:
+        tuple: (sql, params)，问题中没有可检索的片段时返回 None
+    """
+    article_filter = "WHERE t.article_id = %s" if article_id is not None else ""
+    if not fulltext_index_exists():
+        terms = _query_terms(query, LIKE_MAX_TERMS)
+        if not terms:
             return None
-        finally:
-            if connection.is_connected():
-                cursor.close()
-                connection.close()
-    return None
+        body = ("decode_plain_text(pt.text_content, pt.content_format, pt.compressed_content)"
+                if DB_BACKEND == "sqlite" else "pt.text_content")
+        score, params = _like_score([body, "t.summary"], terms)
+        sql = f"""
+            SELECT id, article_id, title, score FROM (
+                SELECT t.id, t.article_id, t.title, {score} AS score
+                FROM title t LEFT JOIN plain_text pt ON pt.title_id = t.id
+                {article_filter}
+            ) s
+            WHERE score > 0
+            ORDER BY score DESC, id
+            LIMIT %s
+        """
+        if article_id is not None:
+            params.append(article_id)
+        params.append(limit)
+        return sql, params
+    if DB_BACKEND == "sqlite":
+        match = _fts5_query(query)
+        if not match:
+            return None
+        # bm25() 越小越相关，取负值作为得分
+        sql = f"""
+            SELECT t.id, t.article_id, t.title, SUM(s.score) AS score
+            FROM (
+                SELECT pt.title_id AS title_id, -bm25(ft_plain_text_content) AS score
+                FROM ft_plain_text_content JOIN plain_text pt ON pt.id = ft_plain_text_content.rowid
+                WHERE ft_plain_text_content MATCH %s
+                UNION ALL
+                SELECT rowid AS title_id, -bm25(ft_title_summary) AS score
+                FROM ft_title_summary WHERE ft_title_summary MATCH %s
+            ) s
+            JOIN title t ON t.id = s.title_id
+            {article_filter}
+            GROUP BY t.id, t.article_id, t.title
+            ORDER BY score DESC
+            LIMIT %s
+        """
+    else:
+        match = query
+        sql = f"""
+            SELECT t.id, t.article_id, t.title, SUM(s.score) AS score
+            FROM (
+                SELECT title_id, MATCH(text_content) AGAINST (%s IN NATURAL LANGUAGE MODE) AS score
+                FROM plain_text
+                WHERE MATCH(text_content) AGAINST (%s IN NATURAL LANGUAGE MODE)
+                UNION ALL
+                SELECT id, MATCH(summary) AGAINST (%s IN NATURAL LANGUAGE MODE)
+                FROM title
+                WHERE MATCH(summary) AGAINST (%s IN NATURAL LANGUAGE MODE)
+            ) s
+            JOIN title t ON t.id = s.title_id
+            {article_filter}
+            GROUP BY t.id, t.article_id, t.title
+            ORDER BY score DESC
+            LIMIT %s
+        """
+    params = [match, match] if DB_BACKEND == "sqlite" else [match] * 4
+    if article_id is not None:
+        params.append(article_id)
+    params.append(limit)
+    return sql, params
 
+@instrumented
+@sharded
+def search_sections(query, article_id=None, limit=10):
+    """
+    在章节正文和章节摘要上做全文检索（不调用大模型）
+    
+    Args:
+        query (str): 检索问题
+        article_id (int): 只在指定文章内检索，为 None 时检索全部文章
+        limit (int): 返回的最大结果数
+    
+    Returns:
+        list: [(title_id, article_id, title, score), ...]，按得分从高到低排列
+    
+    SQLite 按解码后的正文检索；MySQL 的全文索引不包含压缩存储的正文（见 compressed_text_searchable）。
+    没有全文索引时（SQLite 不支持 FTS5）退回 LIKE 匹配，得分为命中的问题片段数。
+    """
+    statement = search_sections_sql(query, article_id, limit)
+    if statement is None:
+        return []
+    try:
+        with get_cursor() as (connection, cursor):
+            cursor.execute(*statement)
+            return [(title_id, art_id, title, float(score)) for title_id, art_id, title, score in cursor.fetchall()]
+    except Error as e:
+        print(f"全文检索章节时出错: {e}")
+        return []
+
+@instrumented
+def search_articles(query, limit=10):
+    """
+    在文章摘要上做全文检索
+    
+    Returns:
+        list: [(article_id, title, score), ...]，按得分从高到低排列
+    """
+    if not fulltext_index_exists():
+        terms = _query_terms(query, LIKE_MAX_TERMS)
+        if not terms:
+            return []
+        score, params = _like_score(["summary"], terms)
+        sql = f"""
+            SELECT id, title, score FROM (SELECT id, title, {score} AS score FROM article) s
+            WHERE score > 0
+            ORDER BY score DESC, id
+            LIMIT %s
+        """
+        params.append(limit)
+    elif DB_BACKEND == "sqlite":
+        match = _fts5_query(query)
+        if not match:
+            return []
+        sql = """
+            SELECT a.id, a.title, -bm25(ft_article_summary) AS score
+            FROM ft_article_summary JOIN article a ON a.id = ft_article_summary.rowid
+            WHERE ft_article_summary MATCH %s
+            ORDER BY score DESC
+            LIMIT %s
+        """
+        params = (match, limit)
+    else:
+        sql = """
+            SELECT id, title, MATCH(summary) AGAINST (%s IN NATURAL LANGUAGE MODE) AS score
+            FROM article
+            WHERE MATCH(summary) AGAINST (%s IN NATURAL LANGUAGE MODE)
+            ORDER BY score DESC
+            LIMIT %s
+        """
+        params = (query, query, limit)
+    try:
+        with get_cursor() as (connection, cursor):
+            cursor.execute(sql, params)
+            return [(art_id, title, float(score)) for art_id, title, score in cursor.fetchall()]
+    except Error as e:
+        print(f"全文检索文章时出错: {e}")
+        return []
+
+# 读取一篇文章的树（文章、章节、正文、摘要）允许的查询次数；
+# 前端展示和摘要生成用 assert_max_queries 锁定该上限，防止退化为N+1查询；
+# 分片时文章行在主库、章节在分片上，各需一次查询
+ARTICLE_TREE_MAX_QUERIES = 2 if DB_SHARDS else 1
 
 # 以下为测试代码
 if __name__ == "__main__":
@@ -422,3 +2071,8 @@ if __name__ == "__main__":
                 # 测试获取正文内容
                 content = get_plain_text_by_title_id(title_id)
                 print(f"获取到的正文内容: {content}")
+                
+                with assert_max_queries(ARTICLE_TREE_MAX_QUERIES):
+                    article, sections = get_article_tree(article_id)
+                    sections = list(sections)
+                print(f"文章树: {article}, 章节数: {len(sections)}")
@@ -12,7 +12,7 @@ DOCX文档解析并存入数据库的脚本
 
 import os
 import sys
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -23,10 +23,13 @@ from docx_parser import RAGFlowDocxParser
 # 导入数据库操作函数
 from database import (
     create_database_and_tables,
-    insert_article,
-    insert_title,
-    insert_plain_text
+    compute_content_hash,
+    get_article_id_by_content_hash,
+    get_titles_by_article_id,
+    import_article
 )
+from bm25_index import update_bm25_index
+from embedding_index import update_embedding_indexes
 
 def parse_docx_to_dict(file_path: str) -> Dict[str, List[str]]:
     """
@@ -101,13 +104,15 @@ def parse_docx_to_dict(file_path: str) -> Dict[str, List[str]]:
     
     return content_dict
 
-def save_dict_to_database(content_dict: Dict[str, List[str]], docx_file_path: str) -> bool:
+def save_dict_to_database(content_dict: Dict[str, List[str]], docx_file_path: str,
+                          content_hash: Optional[str] = None) -> bool:
     """
     将解析后的字典内容存入数据库
     
     Args:
         content_dict (Dict[str, List[str]]): 标题与段落内容的映射字典
         docx_file_path (str): 原始DOCX文件路径
+        content_hash (Optional[str]): 原始DOCX文件的内容哈希
         
     Returns:
         bool: 是否成功存入数据库
@@ -124,13 +129,8 @@ def save_dict_to_database(content_dict: Dict[str, List[str]], docx_file_path: st
         article_title = keys[0]
         print(f"文章题目: {article_title}")
         
-        # 插入文章并获取文章ID
-        article_id = insert_article(article_title)
-        if not article_id:
-            print("插入文章失败")
-            return False
-        
-        print(f"文章ID: {article_id}")
+        # 先构建章节列表，再在一个事务中写入文章、标题和正文
+        sections = []
         
         # 如果第一个键是"无标题段落"，说明文档没有标题，需要特殊处理
         start_index = 0
@@ -138,23 +138,14 @@ def save_dict_to_database(content_dict: Dict[str, List[str]], docx_file_path: st
             # 将"无标题段落"的内容作为文章正文处理
             paragraphs = content_dict[article_title]
             if paragraphs:
-                text_content = "\n\n".join(paragraphs)
                 # 为无标题文章创建一个标题记录
-                title_id = insert_title(article_id, "文章正文", 1)
-                if title_id:
-                    text_id = insert_plain_text(title_id, text_content)
-                    if text_id:
-                        print(f"无标题文章正文插入成功，标题ID: {title_id}, 正文ID: {text_id}")
-                    else:
-                        print("插入无标题文章正文失败")
-                else:
-                    print("插入无标题文章标题失败")
+                sections.append({
+                    "title": "文章正文",
+                    "level": 1,
+                    "content": "\n\n".join(paragraphs)
+                })
             start_index = 1  # 跳过"无标题段落"
         
-        # 处理后续的标题和正文内容
-        # 标题级别从1开始（如果已经处理了无标题段落，则从2开始）
-        level = 1 if article_title != "无标题段落" else 2
-        
         for i in range(start_index, len(keys)):
             key = keys[i]
             
@@ -162,31 +153,34 @@ def save_dict_to_database(content_dict: Dict[str, List[str]], docx_file_path: st
             if key == article_title and article_title == "无标题段落":
                 continue
             
-            # 插入标题并获取标题ID
-            title_id = insert_title(article_id, key, level=1)
-            if not title_id:
-                print(f"插入标题 '{key}' 失败")
-                continue
-            
-            print(f"标题 '{key}' 插入成功，标题ID: {title_id}")
-            
-            # 将该标题下的所有段落内容合并为一个字符串
+            # 将该标题下的所有段落内容合并为一个字符串（使用两个换行符分隔段落）
             paragraphs = content_dict[key]
-            if paragraphs:
-                # 使用两个换行符分隔段落
-                text_content = "\n\n".join(paragraphs)
-                
-                # 插入正文内容
-                text_id = insert_plain_text(title_id, text_content)
-                if text_id:
-                    print(f"正文内容插入成功，正文ID: {text_id}")
-                else:
-                    print(f"插入标题 '{key}' 的正文内容失败")
-            else:
+            if not paragraphs:
                 print(f"标题 '{key}' 下无正文内容")
-            
-            # 更新标题级别
-            # level = 1
+            sections.append({
+                "title": key,
+                "level": 1,
+                "content": "\n\n".join(paragraphs) if paragraphs else ""
+            })
+        
+        # 同名文章已存在时只更新变化的章节（与 Markdown 导入相同，见 database.import_article）
+        result = import_article(article_title, sections, content_hash=content_hash)
+        if not result:
+            print("插入文章失败")
+            return False
+        
+        status, article_id, stats = result
+        print(f"文章ID: {article_id}")
+        if status == "inserted":
+            for title_id, title, _, _ in get_titles_by_article_id(article_id):
+                print(f"标题 '{title}' 插入成功，标题ID: {title_id}")
+        elif status == "updated":
+            print(f"源文件已变化: 保留 {stats['kept']} 个章节，更新 {stats['updated']} 个，"
+                  f"新增 {stats['inserted']} 个，删除 {stats['deleted']} 个")
+        elif status == "backfilled":
+            print("文章已存在但没有源文件哈希，已记录哈希，章节保持不变")
+        else:
+            print("文章已存在，跳过")
         
         print("文档内容已成功存入数据库")
         return True
@@ -212,6 +206,14 @@ def main():
         return
     
     try:
+        # 源文件未变化时无需重新解析
+        with open(docx_path, 'rb') as f:
+            content_hash = compute_content_hash(f.read())
+        existing_id = get_article_id_by_content_hash(content_hash)
+        if existing_id:
+            print(f"文件未变化，已导入为文章ID {existing_id}，跳过")
+            return
+        
         # 解析DOCX文档并构建字典
         print("开始解析DOCX文档...")
         content_dict = parse_docx_to_dict(docx_path)
@@ -226,10 +228,13 @@ def main():
         
         # 将内容存入数据库
         print("\n开始将内容存入数据库...")
-        success = save_dict_to_database(content_dict, docx_path)
+        success = save_dict_to_database(content_dict, docx_path, content_hash=content_hash)
         
         if success:
             print("文档内容已成功存入数据库")
+            # 更新 BM25 和向量索引文件，检索时只需加载
+            update_bm25_index()
+            update_embedding_indexes()
         else:
             print("存入数据库失败")
             
@@ -0,0 +1,608 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+章节级稠密向量索引（本地 CPU 计算，不调用大模型）
+
+- 每个章节编码为一个向量: 章节标题 + 章节摘要 + 正文开头 EMBEDDING_BODY_CHARS 个字符，
+  使用与评估脚本相同的 HuggingFaceEmbeddings 模型（默认 BAAI/bge-large-zh-v1.5），向量归一化。
+- 全部向量存放在一个连续的 float32 NumPy 矩阵中，与章节ID、文章ID数组一起保存到磁盘:
+    {EMBEDDING_INDEX_PATH}.npy       向量矩阵 (章节数 x 维度)
+    {EMBEDDING_INDEX_PATH}.ids.npy   (title_id, article_id) 矩阵，按文章、章节排序
+    {EMBEDDING_INDEX_PATH}.json      模型名、正文截取长度、章节标题和变更日志版本
+- 检索是一次矩阵乘法 + argpartition 取前 k 个，支持一次检索多个问题和按文章过滤。
+- 与 bm25_index.py 相同，通过变更日志只为有变化的文章重新编码；已构建的索引文件由导入脚本、
+  增量摘要生成和 build/update 命令维护（update_embedding_index），查询时只加载索引文件。
+- ArticleEmbeddingIndex 另外为每篇文章的标题 + 摘要编码一个向量（{EMBEDDING_INDEX_PATH}.articles.*），
+  供选文章步骤只把前 N 篇候选文章发给大模型（prefilter_articles）。
+- 章节向量也可以为选章节步骤筛选候选（prefilter_sections）；EMBEDDING_SECTION_SEARCH=ivf 时改用
+  ann_index.py 的 IVF 近似最近邻索引，只扫描与问题最近的 ANN_NPROBE 个簇。
+
+用法:
+    python embedding_index.py build             # 全量编码章节和文章并保存
+    python embedding_index.py update            # 按变更日志增量更新，文章索引不存在时构建（导入和摘要生成后也会自动更新已有索引）
+    python embedding_index.py search "问题"      # 检索并打印前 10 个章节及耗时
+"""
+
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import (
+    get_all_articles_with_details, get_article_tree, get_change_watermark, iter_sections,
+    save_change_checkpoint,
+)
+from changelog import ChangeConsumer
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-large-zh-v1.5")
+EMBEDDING_INDEX_PATH = os.getenv(
+    "EMBEDDING_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "embedding_index")
+)
+# 参与编码的正文开头字符数（bge-large-zh 最多 512 个 token）
+EMBEDDING_BODY_CHARS = int(os.getenv("EMBEDDING_BODY_CHARS", "400"))
+# 每批编码的章节数
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+# bge 系列检索时给问题加的指令前缀（章节不加）
+EMBEDDING_QUERY_INSTRUCTION = os.getenv("EMBEDDING_QUERY_INSTRUCTION", "为这个句子生成表示以用于检索相关文章：")
+# 章节向量检索方式: exact（暴力检索全部章节向量）或 ivf（需先执行 python ann_index.py build）
+EMBEDDING_SECTION_SEARCH = os.getenv("EMBEDDING_SECTION_SEARCH", "exact").lower()
+# 索引文件格式版本，结构变化时递增
+INDEX_FORMAT_VERSION = 1
+# 变更日志中本索引的消费者名称
+EMBEDDING_CONSUMER = "embedding_index"
+ARTICLE_EMBEDDING_CONSUMER = "article_embedding_index"
+
+
+def load_embeddings(model_name=EMBEDDING_MODEL):
+    """加载编码模型（输出归一化向量，内积即余弦相似度）"""
+    from langchain_huggingface import HuggingFaceEmbeddings
+    print(f"Loading embeddings model ({model_name})...")
+    return HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs={"device": "cpu"},
+        encode_kwargs={"normalize_embeddings": True, "batch_size": EMBEDDING_BATCH_SIZE}
+    )
+
+_embeddings = {}
+
+def get_embeddings(model_name=EMBEDDING_MODEL):
+    """进程内共享的编码模型（章节索引和文章索引只加载一次）"""
+    if model_name not in _embeddings:
+        _embeddings[model_name] = load_embeddings(model_name)
+    return _embeddings[model_name]
+
+def encode_texts(embeddings, texts):
+    """分批编码，返回 (文本数 x 维度) 的 float32 矩阵"""
+    vectors = []
+    for i in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+        vectors.extend(embeddings.embed_documents(texts[i:i + EMBEDDING_BATCH_SIZE]))
+    return np.asarray(vectors, dtype=np.float32)
+
+def encode_queries(queries, embeddings=None):
+    """编码问题，返回 (问题数 x 维度) 的 float32 矩阵；embeddings 为 None 时使用进程共享的模型"""
+    return encode_texts(embeddings or get_embeddings(), [EMBEDDING_QUERY_INSTRUCTION + query for query in queries])
+
+def section_text(title, summary, body, body_chars=EMBEDDING_BODY_CHARS):
+    """章节参与编码的文本"""
+    parts = [title or ""]
+    if summary:
+        parts.append(summary)
+    if body:
+        parts.append(body[:body_chars])
+    return "\n".join(parts)
+
+
+class _Encoder:
+    """按需加载编码模型；子类设置 _embeddings 和 model_name"""
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            self._embeddings = get_embeddings(self.model_name)
+        return self._embeddings
+
+    def _encode(self, texts):
+        return encode_texts(self.embeddings, texts)
+
+    def encode_queries(self, queries):
+        return encode_queries(queries, self.embeddings)
+
+
+class EmbeddingIndex(_Encoder):
+    """
+    章节向量矩阵及其ID映射
+
+    Args:
+        embeddings: 编码模型（提供 embed_documents / embed_query），为 None 时首次使用前才加载
+    """
+
+    def __init__(self, embeddings=None, model_name=EMBEDDING_MODEL, body_chars=EMBEDDING_BODY_CHARS):
+        self._embeddings = embeddings
+        self.model_name = model_name
+        self.body_chars = body_chars
+        self.version = 0
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.title_ids = np.zeros(0, dtype=np.int64)
+        self.article_ids = np.zeros(0, dtype=np.int64)
+        self.titles = []
+
+    # ---------- 构建与更新 ----------
+
+    def _append(self, rows):
+        """rows: [(article_id, title_id, title, summary, body)]，追加到矩阵末尾后按 (文章, 章节) 重新排序"""
+        if not rows:
+            return
+        vectors = self._encode([section_text(title, summary, body, self.body_chars)
+                                for _, _, title, summary, body in rows])
+        matrix = vectors if not len(self.title_ids) else np.vstack([self.matrix, vectors])
+        title_ids = np.concatenate([self.title_ids, np.array([row[1] for row in rows], dtype=np.int64)])
+        article_ids = np.concatenate([self.article_ids, np.array([row[0] for row in rows], dtype=np.int64)])
+        titles = self.titles + [row[2] for row in rows]
+        order = np.lexsort((title_ids, article_ids))
+        self.matrix = np.ascontiguousarray(matrix[order])
+        self.title_ids = title_ids[order]
+        self.article_ids = article_ids[order]
+        self.titles = [titles[i] for i in order]
+
+    def remove_articles(self, article_ids):
+        keep = ~np.isin(self.article_ids, np.fromiter(article_ids, dtype=np.int64))
+        if keep.all():
+            return
+        self.matrix = np.ascontiguousarray(self.matrix[keep])
+        self.title_ids = self.title_ids[keep]
+        self.article_ids = self.article_ids[keep]
+        self.titles = [title for title, kept in zip(self.titles, keep) if kept]
+
+    def reindex_articles(self, article_ids):
+        """从数据库重新读取并编码这些文章的全部章节"""
+        article_ids = list(article_ids)
+        self.remove_articles(article_ids)
+        rows = []
+        for article_id in article_ids:
+            article, sections = get_article_tree(article_id)
+            if article is None:
+                continue
+            rows.extend((article_id, title_id, title, summary, body)
+                        for title_id, title, _, summary, body in sections)
+        self._append(rows)
+
+    @classmethod
+    def build(cls, embeddings=None):
+        """从数据库全量编码全部章节"""
+        index = cls(embeddings)
+        # 先取版本号再读数据，构建期间的写入会在下次 refresh 时重新处理
+        index.version = get_change_watermark()
+        rows = [(article_id, title_id, title, summary, body)
+                for article_id, title_id, _, title, body, summary in iter_sections()]
+        index._append(rows)
+        return index
+
+    def refresh(self, consumer=None):
+        """
+        按变更日志增量更新，返回处理的变更条数
+
+        索引文件比消费者检查点旧（例如从备份恢复）或遇到 reload 时全量重建。
+        """
+        consumer = consumer or ChangeConsumer(EMBEDDING_CONSUMER)
+        if self.version < consumer.checkpoint:
+            self._rebuild()
+            return 0
+        processed = 0
+        while True:
+            changes = consumer.poll(after=self.version)
+            if changes is None:
+                return processed
+            if changes.reload:
+                self._rebuild()
+            else:
+                self.remove_articles(changes.deleted_article_ids())
+                self.reindex_articles(changes.article_ids() - changes.deleted_article_ids())
+            self.version = max(self.version, changes.version)
+            processed += len(changes)
+
+    def _rebuild(self):
+        rebuilt = EmbeddingIndex.build(self._embeddings)
+        self.__dict__.update(rebuilt.__dict__)
+
+    # ---------- 持久化 ----------
+
+    def save(self, path=EMBEDDING_INDEX_PATH):
+        """写入矩阵、ID 和元数据（先写临时文件再替换）"""
+        files = {
+            f"{path}.npy": lambda f: np.save(f, self.matrix),
+            f"{path}.ids.npy": lambda f: np.save(f, np.column_stack([self.title_ids, self.article_ids])),
+            f"{path}.json": lambda f: f.write(json.dumps({
+                "format_version": INDEX_FORMAT_VERSION,
+                "model": self.model_name,
+                "body_chars": self.body_chars,
+                "version": self.version,
+                "titles": self.titles,
+            }, ensure_ascii=False).encode("utf-8")),
+        }
+        for file_path, write in files.items():
+            with open(f"{file_path}.tmp", "wb") as f:
+                write(f)
+        for file_path in files:
+            os.replace(f"{file_path}.tmp", file_path)
+
+    @classmethod
+    def load(cls, path=EMBEDDING_INDEX_PATH, embeddings=None, mmap=False):
+        """
+        读取索引；文件不存在或模型、正文截取长度与当前配置不一致时返回 None
+
+        mmap=True 时向量矩阵以只读内存映射方式打开，多个进程共享页缓存。
+        """
+        if not all(os.path.exists(f"{path}{suffix}") for suffix in (".npy", ".ids.npy", ".json")):
+            return None
+        with open(f"{path}.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        if (meta.get("format_version") != INDEX_FORMAT_VERSION or meta.get("model") != EMBEDDING_MODEL
+                or meta.get("body_chars") != EMBEDDING_BODY_CHARS):
+            return None
+        index = cls(embeddings, meta["model"], meta["body_chars"])
+        index.version = meta["version"]
+        index.titles = meta["titles"]
+        index.matrix = np.load(f"{path}.npy", mmap_mode="r" if mmap else None)
+        ids = np.load(f"{path}.ids.npy")
+        index.title_ids = ids[:, 0].copy()
+        index.article_ids = ids[:, 1].copy()
+        return index
+
+    # ---------- 检索 ----------
+
+    def article_ids_of(self, title_ids):
+        """返回这些章节所属的文章ID集合"""
+        return set(self.article_ids[np.isin(self.title_ids, np.fromiter(title_ids, dtype=np.int64))].tolist())
+
+    def similarities(self, query_vectors, article_ids=None):
+        """
+        计算问题与全部章节的余弦相似度
+
+        Returns:
+            ndarray: (问题数 x 章节数)，不在 article_ids 中的章节为 -inf
+        """
+        scores = np.asarray(query_vectors, dtype=np.float32) @ self.matrix.T
+        if article_ids is not None:
+            mask = ~np.isin(self.article_ids, np.fromiter(article_ids, dtype=np.int64))
+            scores[:, mask] = -np.inf
+        return scores
+
+    def _top_k(self, scores, k):
+        k = min(k, scores.shape[1])
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, columns in zip(scores, top):
+            columns = columns[np.argsort(-row[columns])]
+            results.append([
+                (int(self.title_ids[c]), int(self.article_ids[c]), self.titles[c], float(row[c]))
+                for c in columns if np.isfinite(row[c])
+            ])
+        return results
+
+    def search_batch(self, queries, k=10, article_ids=None):
+        """
+        一次检索多个问题
+
+        Args:
+            queries (list): 问题列表
+            k (int): 每个问题返回的最大结果数
+            article_ids (iterable): 只在这些文章内检索，为 None 时检索全部
+
+        Returns:
+            list: 每个问题一个 [(title_id, article_id, title, score), ...]，与 database.search_sections 格式一致
+        """
+        if not queries or not len(self.title_ids):
+            return [[] for _ in queries]
+        return self._top_k(self.similarities(self.encode_queries(queries), article_ids), k)
+
+    def search(self, query, k=10, article_ids=None):
+        return self.search_batch([query], k, article_ids)[0]
+
+    def __len__(self):
+        return len(self.title_ids)
+
+
+class ArticleEmbeddingIndex(_Encoder):
+    """
+    文章级向量矩阵（标题 + 摘要），用于限制选文章步骤发给大模型的候选数
+
+    文章数远少于章节数，变化的文章直接重新编码；只关心变更日志中的 article 实体。
+    """
+
+    def __init__(self, embeddings=None, model_name=EMBEDDING_MODEL):
+        self._embeddings = embeddings
+        self.model_name = model_name
+        self.version = 0
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.article_ids = np.zeros(0, dtype=np.int64)
+
+    @staticmethod
+    def article_text(title, summary):
+        return f"{title}\n{summary}" if summary else title
+
+    def _set_articles(self, articles):
+        """articles: [(id, title, summary)]，替换同ID的旧向量"""
+        self.remove_articles(article_id for article_id, _, _ in articles)
+        if not articles:
+            return
+        vectors = self._encode([self.article_text(title, summary) for _, title, summary in articles])
+        matrix = vectors if not len(self.article_ids) else np.vstack([self.matrix, vectors])
+        article_ids = np.concatenate([self.article_ids, np.array([row[0] for row in articles], dtype=np.int64)])
+        order = np.argsort(article_ids, kind="stable")
+        self.matrix = np.ascontiguousarray(matrix[order])
+        self.article_ids = article_ids[order]
+
+    def remove_articles(self, article_ids):
+        keep = ~np.isin(self.article_ids, np.fromiter(article_ids, dtype=np.int64))
+        if not keep.all():
+            self.matrix = np.ascontiguousarray(self.matrix[keep])
+            self.article_ids = self.article_ids[keep]
+
+    @classmethod
+    def build(cls, embeddings=None):
+        """从数据库编码全部文章的标题和摘要"""
+        index = cls(embeddings)
+        index.version = get_change_watermark()
+        index._set_articles(get_all_articles_with_details())
+        return index
+
+    def refresh(self, consumer=None):
+        """按变更日志增量更新（只处理 article 实体），返回处理的变更条数"""
+        consumer = consumer or ChangeConsumer(ARTICLE_EMBEDDING_CONSUMER, entities=["article"])
+        if self.version < consumer.checkpoint:
+            self.__dict__.update(ArticleEmbeddingIndex.build(self._embeddings).__dict__)
+            return 0
+        processed = 0
+        while True:
+            changes = consumer.poll(after=self.version)
+            if changes is None:
+                return processed
+            if changes.reload:
+                self.__dict__.update(ArticleEmbeddingIndex.build(self._embeddings).__dict__)
+            else:
+                self.remove_articles(changes.deleted_article_ids())
+                changed = changes.article_ids() - changes.deleted_article_ids()
+                if changed:
+                    self._set_articles([article for article in get_all_articles_with_details()
+                                        if article[0] in changed])
+            self.version = max(self.version, changes.version)
+            processed += len(changes)
+
+    def save(self, path=EMBEDDING_INDEX_PATH):
+        """写入矩阵和元数据（先写临时文件再替换）"""
+        with open(f"{path}.articles.npy.tmp", "wb") as f:
+            np.save(f, self.matrix)
+        with open(f"{path}.articles.json.tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "format_version": INDEX_FORMAT_VERSION,
+                "model": self.model_name,
+                "version": self.version,
+                "article_ids": self.article_ids.tolist(),
+            }, f)
+        os.replace(f"{path}.articles.npy.tmp", f"{path}.articles.npy")
+        os.replace(f"{path}.articles.json.tmp", f"{path}.articles.json")
+
+    @classmethod
+    def load(cls, path=EMBEDDING_INDEX_PATH, embeddings=None):
+        """读取文章索引；文件不存在或模型与当前配置不一致时返回 None"""
+        if not (os.path.exists(f"{path}.articles.npy") and os.path.exists(f"{path}.articles.json")):
+            return None
+        with open(f"{path}.articles.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format_version") != INDEX_FORMAT_VERSION or meta.get("model") != EMBEDDING_MODEL:
+            return None
+        index = cls(embeddings, meta["model"])
+        index.version = meta["version"]
+        index.matrix = np.load(f"{path}.articles.npy")
+        index.article_ids = np.array(meta["article_ids"], dtype=np.int64)
+        return index
+
+    def search_articles_batch(self, queries, k=10):
+        """一次为多个问题检索文章，每个问题返回 [(article_id, score), ...]"""
+        if not queries or not len(self.article_ids):
+            return [[] for _ in queries]
+        scores = self.encode_queries(queries) @ self.matrix.T
+        k = min(k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, columns in zip(scores, top):
+            columns = columns[np.argsort(-row[columns])]
+            results.append([(int(self.article_ids[c]), float(row[c])) for c in columns])
+        return results
+
+    def search_articles(self, query, k=10):
+        return self.search_articles_batch([query], k)[0]
+
+    def __len__(self):
+        return len(self.article_ids)
+
+
+def update_embedding_index(path=EMBEDDING_INDEX_PATH, build=True, embeddings=None):
+    """
+    更新章节索引文件（命令行、导入和变更处理流程调用，不在查询路径上执行）
+
+    索引文件不存在或已过期时 build=True 全量编码，否则返回 None；已有索引按变更日志增量更新，
+    没有变化时不重写文件。
+
+    Returns:
+        EmbeddingIndex: 更新后的索引
+    """
+    index = EmbeddingIndex.load(path, embeddings)
+    if index is None:
+        if not build:
+            return None
+        index = EmbeddingIndex.build(embeddings)
+        version = None
+    else:
+        version = index.version
+        index.refresh()
+    if index.version != version:
+        index.save(path)
+        save_change_checkpoint(EMBEDDING_CONSUMER, index.version)
+    return index
+
+def update_article_embedding_index(path=EMBEDDING_INDEX_PATH, build=True, embeddings=None):
+    """更新文章索引文件，规则同 update_embedding_index"""
+    index = ArticleEmbeddingIndex.load(path, embeddings)
+    if index is None:
+        if not build:
+            return None
+        index = ArticleEmbeddingIndex.build(embeddings)
+        version = None
+    else:
+        version = index.version
+        index.refresh()
+    if index.version != version:
+        index.save(path)
+        save_change_checkpoint(ARTICLE_EMBEDDING_CONSUMER, index.version)
+    return index
+
+def update_embedding_indexes(path=EMBEDDING_INDEX_PATH):
+    """导入和变更处理流程调用：增量更新已构建的向量索引文件，不存在的索引不构建（避免加载编码模型）"""
+    update_embedding_index(path, build=False)
+    update_article_embedding_index(path, build=False)
+
+
+_index = None
+_article_index = None
+_missing_warned = False
+_article_missing_warned = False
+
+def get_embedding_index(path=EMBEDDING_INDEX_PATH, refresh=False):
+    """
+    返回进程内的索引
+
+    只加载索引文件（向量矩阵内存映射），不在查询时编码；文件不存在或已过期时返回 None（只提示一次），
+    需先执行 python embedding_index.py build。之后直接返回内存中的索引，
+    refresh=True 时重新加载文件以获得导入或 update 命令写入的更新。
+    """
+    global _index, _missing_warned
+    if _index is not None and not refresh:
+        return _index
+    index = EmbeddingIndex.load(path, mmap=True)
+    if index is None:
+        if not _missing_warned:
+            _missing_warned = True
+            print(f"向量索引文件不存在或已过期: {path}，请先执行 python embedding_index.py build")
+        return _index
+    _index = index
+    return _index
+
+
+def get_article_embedding_index(path=EMBEDDING_INDEX_PATH, refresh=False):
+    """返回进程内的文章向量索引，只加载文件，规则同 get_embedding_index"""
+    global _article_index, _article_missing_warned
+    if _article_index is not None and not refresh:
+        return _article_index
+    index = ArticleEmbeddingIndex.load(path)
+    if index is None:
+        if not _article_missing_warned:
+            _article_missing_warned = True
+            print(f"文章向量索引文件不存在或已过期: {path}.articles.*，不筛选候选文章，"
+                  f"请先执行 python embedding_index.py update")
+        return _article_index
+    _article_index = index
+    return _article_index
+
+def prefilter_articles(query, articles_details, n):
+    """
+    用文章向量为选文章步骤筛选候选
+
+    Args:
+        articles_details (list): [(id, title, summary), ...]
+        n (int): 保留的候选数
+
+    Returns:
+        list: 按相似度排序的前 n 篇文章；索引为空或不存在时原样返回
+    """
+    index = get_article_embedding_index()
+    if index is None:
+        return articles_details
+    ranked = [article_id for article_id, _ in index.search_articles(query, n)]
+    by_id = {article[0]: article for article in articles_details}
+    return [by_id[article_id] for article_id in ranked if article_id in by_id] or articles_details
+
+def get_section_index():
+    """
+    按 EMBEDDING_SECTION_SEARCH 返回章节检索使用的索引，文件不存在时为 None
+
+    ivf 只使用 IVF 索引（问题由共享的编码模型编码），不加载章节向量矩阵。
+    """
+    if EMBEDDING_SECTION_SEARCH == "ivf":
+        from ann_index import get_ann_index
+        return get_ann_index()
+    return get_embedding_index()
+
+def search_section_ids(query, k, article_ids=None):
+    """
+    按 EMBEDDING_SECTION_SEARCH 检索最相似的章节，返回章节ID列表（按相似度排序）
+
+    ivf 只扫描 ANN_NPROBE 个簇，按文章过滤后命中可能少于 k 个；索引文件不存在时返回空列表。
+    """
+    index = get_section_index()
+    if index is None:
+        return []
+    return [hit[0] for hit in index.search(query, k, article_ids=article_ids)]
+
+def prefilter_sections(query, titles, n):
+    """
+    用章节向量为选章节步骤筛选候选
+
+    Args:
+        titles (list): query_article_titles 返回的章节字典列表（含 id）
+        n (int): 保留的候选数
+
+    Returns:
+        list: 命中的前 n 个章节（保持原有顺序）；没有任何命中或索引不存在时原样返回
+    """
+    index = get_section_index()
+    if index is None:
+        return titles
+    article_ids = index.article_ids_of(t["id"] for t in titles)
+    if not article_ids:
+        return titles
+    candidates = set(search_section_ids(query, n, article_ids))
+    return [t for t in titles if t["id"] in candidates] or titles
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "search"
+    if command == "build":
+        start = time.perf_counter()
+        index = EmbeddingIndex.build()
+        index.save()
+        save_change_checkpoint(EMBEDDING_CONSUMER, index.version)
+        article_index = ArticleEmbeddingIndex.build(index.embeddings)
+        article_index.save()
+        save_change_checkpoint(ARTICLE_EMBEDDING_CONSUMER, article_index.version)
+        print(f"已构建向量索引: {index.matrix.shape[0]} 个章节、{len(article_index)} 篇文章 x "
+              f"{index.matrix.shape[1]} 维，耗时 {time.perf_counter() - start:.2f} 秒")
+    elif command == "update":
+        index = update_embedding_index(build=False)
+        if index is None:
+            print("索引文件不存在或已过期，请先执行 build")
+            sys.exit(1)
+        print(f"章节索引当前版本 {index.version}")
+        article_index = update_article_embedding_index(embeddings=index.embeddings)
+        print(f"文章索引当前版本 {article_index.version}")
+    elif command == "search" and len(sys.argv) > 2:
+        index = get_embedding_index()
+        if index is None:
+            sys.exit(1)
+        start = time.perf_counter()
+        hits = index.search(sys.argv[2])
+        elapsed = (time.perf_counter() - start) * 1000
+        for title_id, article_id, title, score in hits:
+            print(f"{score:6.3f}  [文章 {article_id} / 章节 {title_id}] {title}")
+        print(f"检索耗时（含问题编码） {elapsed:.2f} ms")
+    else:
+        print(__doc__)
+        sys.exit(1)
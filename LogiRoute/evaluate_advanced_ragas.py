@@ -26,7 +26,7 @@ try:
         get_enhanced_deepseek_response_article,
         get_enhanced_deepseek_response_title,
         get_deepseek_response_rag,
-        get_plain_text_by_title_id,
+        get_section_bodies,
         DEEPSEEK_API_KEY,
         DEEPSEEK_BASE_URL,
         MODEL_NAME
@@ -99,19 +99,14 @@ def run_rag_pipeline(question, articles_details):
         return "无法解析章节ID", []
 
     # Level 3: Context Retrieval
+    # Fetch the body of every chosen ID in one query; headings without text
+    # resolve to their first descendant with text (body_title_id)
     contexts = []
+    texts = get_section_bodies(title_id_list)
     for tid in title_id_list:
-        try:
-            content = get_plain_text_by_title_id(tid)
-            if content:
-                contexts.append(content)
-            else:
-                # Retry next ID logic from original script
-                 content = get_plain_text_by_title_id(tid + 1)
-                 if content:
-                     contexts.append(content)
-        except Exception as e:
-            print(f"Error fetching content for ID {tid}: {e}")
+        content = texts.get(tid)
+        if content:
+            contexts.append(content)
     
     if not contexts:
         # If no context found, we return empty list. 
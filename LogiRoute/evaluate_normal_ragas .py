@@ -21,7 +21,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Import RAG functions from article_retriever deepseek.py
 try:
-    from database import get_all_articles, get_plain_text_by_title_id
+    from corpus import get_all_articles, get_section_bodies
     from query_data import query_article_titles
     # Import functions from article_retriever deepseek.py
     # Note: We import the module as a whole or specific functions. 
@@ -110,26 +110,17 @@ def run_rag_pipeline(question, articles_context):
         return "无法解析有效章节ID", []
 
     # Level 3: Context Retrieval
+    # Fetch the body of every chosen ID in one query; headings without text
+    # resolve to their first descendant with text (body_title_id)
     contexts = []
     all_contents = []
+    texts = get_section_bodies(title_id_list)
     for tid in title_id_list:
-        try:
-            content = get_plain_text_by_title_id(tid)
-            # Retry logic from article_retriever deepseek.py
-            current_tid = tid
-            while content is None:
-                # Limit retry to avoid infinite loop, though original script just says "try next ID"
-                # Let's try up to 5 next IDs
-                current_tid += 1
-                if current_tid > tid + 5: 
-                    break
-                content = get_plain_text_by_title_id(current_tid)
-            
-            if content:
-                contexts.append(content)
-                all_contents.extend(content)
-        except Exception as e:
-            print(f"Error fetching content for ID {tid}: {e}")
+        content = texts.get(tid)
+        
+        if content:
+            contexts.append(content)
+            all_contents.extend(content)
     
     if not contexts:
         return "无法获取章节内容", []
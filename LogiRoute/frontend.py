@@ -7,6 +7,7 @@
 
 import sys
 import os
+import itertools
 
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -25,8 +26,11 @@ from database import (
     update_title,
     update_plain_text_by_title_id,
     get_titles_by_article,
-    get_all_articles_with_details
+    get_all_articles_with_details,
+    get_article_tree,
+    ARTICLE_TREE_MAX_QUERIES
 )
+from instrumentation import assert_max_queries
 
 def display_menu():
     """显示主菜单"""
@@ -387,33 +391,28 @@ def display_article_content():
             article_id = get_article_id_by_title(article_title)
             
             if article_id:
-                # 获取文章的所有标题和正文
-                titles = get_titles_by_article_id(article_id)
-                if not titles:
-                    print(f"文章 '{article_title}' 暂无内容")
-                    return
-                
-                print(f"\n文章: {article_title}")
-                print("="*50)
-                
-                # 显示每个标题及其正文
-                for i, (title_id, title, level, _) in enumerate(titles, 1):
-                    # 根据标题级别添加缩进
-                    indent = "  " * (level - 1)
+                # 一次查询获取文章的所有标题和正文，逐行流式返回；查询次数超出上限时报错（防止退化为N+1查询）
+                with assert_max_queries(ARTICLE_TREE_MAX_QUERIES):
+                    _, sections = get_article_tree(article_id)
+                    first_section = next(sections, None)
+                    if first_section is None:
+                        print(f"文章 '{article_title}' 暂无内容")
+                        return
                     
-                    # 获取标题对应的正文
-                    try:
-                        from database import get_plain_text_by_title_id
-                        content = get_plain_text_by_title_id(title_id)
-                    except ImportError:
-                        content = "无法获取正文内容"
+                    print(f"\n文章: {article_title}")
+                    print("="*50)
                     
-                    print(f"{indent}[{level}级] {title}")
-                    if content:
-                        # 对正文进行适当的格式化
-                        formatted_content = "\n".join([f"{indent}  {line}" for line in content.split("\n") if line.strip()])
-                        print(f"{formatted_content}")
-                    print()  # 添加空行分隔
+                    # 显示每个标题及其正文
+                    for title_id, title, level, _, content in itertools.chain([first_section], sections):
+                        # 根据标题级别添加缩进
+                        indent = "  " * (level - 1)
+                        
+                        print(f"{indent}[{level}级] {title}")
+                        if content:
+                            # 对正文进行适当的格式化
+                            formatted_content = "\n".join([f"{indent}  {line}" for line in content.split("\n") if line.strip()])
+                            print(f"{formatted_content}")
+                        print()  # 添加空行分隔
             else:
                 print("获取文章ID失败!")
         else:
@@ -8,15 +8,27 @@ import requests
 import json
 import os
 from openai import OpenAI
-from mysql.connector import Error
 from dotenv import load_dotenv
 from database import (
-    create_connection,
+    Error,
+    get_cursor,
     get_all_articles,
+    get_all_articles_with_details,
     get_article_id_by_title,
+    get_article_tree,
     get_titles_by_article_id,
-    get_plain_text_by_title_id
+    clear_title_summaries,
+    update_article_summary,
+    update_title_summary,
+    ARTICLE_TREE_MAX_QUERIES
 )
+from instrumentation import assert_max_queries
+from changelog import CONTENT_OPERATIONS, ChangeConsumer
+from bm25_index import update_bm25_index
+from embedding_index import update_embedding_indexes
+
+# 变更日志中本脚本的消费者名称
+SUMMARY_CONSUMER = "summaries"
 
 # 加载环境变量
 load_dotenv()
@@ -123,70 +135,12 @@ def get_deepseek_summary(text, context_type="section"):
 #         print(f"调用Ollama API时出错: {e}")
 #         return None
 
-def update_title_summary(title_id, summary):
-    """更新title表中的summary字段"""
-    connection = create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
-            cursor.execute(
-                "UPDATE title SET summary = %s WHERE id = %s",
-                (summary, title_id)
-            )
-            connection.commit()
-            return True
-        except Error as e:
-            print(f"更新章节摘要时出错: {e}")
-            return False
-        finally:
-            if connection.is_connected():
-                cursor.close()
-                connection.close()
-    return False
-
-def update_article_summary(article_id, summary):
-    """更新article表中的summary字段"""
-    connection = create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
-            cursor.execute(
-                "UPDATE article SET summary = %s WHERE id = %s",
-                (summary, article_id)
-            )
-            connection.commit()
-            return True
-        except Error as e:
-            print(f"更新文章摘要时出错: {e}")
-            return False
-        finally:
-            if connection.is_connected():
-                cursor.close()
-                connection.close()
-    return False
-
 def get_title_summaries(article_id):
     """获取指定文章的所有章节摘要"""
-    connection = create_connection()
-    summaries = []
-    if connection:
-        try:
-            cursor = connection.cursor()
-            cursor.execute(
-                "SELECT title, summary FROM title WHERE article_id = %s ORDER BY id",
-                (article_id,)
-            )
-            results = cursor.fetchall()
-            for title, summary in results:
-                if summary:
-                    summaries.append(f"章节标题: {title}\n摘要: {summary}")
-        except Error as e:
-            print(f"获取章节摘要列表时出错: {e}")
-        finally:
-            if connection.is_connected():
-                cursor.close()
-                connection.close()
-    return summaries
+    return [
+        f"章节标题: {title}\n摘要: {summary}"
+        for _, title, _, summary in get_titles_by_article_id(article_id) if summary
+    ]
 
 def generate_summary_for_article(article_title):
     """
@@ -199,8 +153,10 @@ def generate_summary_for_article(article_title):
         print("未找到文章ID。")
         return False
 
-    # 2. 获取文章的所有标题
-    titles = get_titles_by_article_id(article_id)
+    # 2. 一次查询获取文章的所有标题及其正文（查询次数超出上限时报错，防止退化为N+1查询）
+    with assert_max_queries(ARTICLE_TREE_MAX_QUERIES):
+        _, sections = get_article_tree(article_id)
+        titles = list(sections)
     if not titles:
         print("该文章没有章节标题。")
         return False
@@ -211,11 +167,10 @@ def generate_summary_for_article(article_title):
     for title_row in titles:
         title_id = title_row[0]
         title_text = title_row[1]
+        content = title_row[4]
         
         print(f"\n正在处理章节: {title_text}")
         
-        # 获取正文内容
-        content = get_plain_text_by_title_id(title_id)
         if not content:
             print(f"  - 章节 '{title_text}' 没有正文内容，跳过。")
             continue
@@ -256,11 +211,8 @@ def generate_summary_for_article(article_title):
         if i >= 10: 
             break
             
-        t_id = title_row[0]
         t_text = title_row[1]
-        
-        # 获取正文
-        t_content = get_plain_text_by_title_id(t_id)
+        t_content = title_row[4]
         if not t_content:
             continue
             
@@ -299,22 +251,45 @@ def generate_summary_for_article(article_title):
         print("\n模型生成文章摘要失败。")
         return False
 
+def regenerate_changed_summaries():
+    """
+    只为上次运行以来标题或正文有变化的文章重新生成摘要
+
+    通过变更日志的 summaries 检查点增量处理；摘要本身的更新（summary 操作）不会触发重新生成。
+    """
+    consumer = ChangeConsumer(SUMMARY_CONSUMER, operations=CONTENT_OPERATIONS)
+    articles = {article_id: title for article_id, title, _ in get_all_articles_with_details()}
+
+    def handle(changes):
+        if changes.reload:
+            article_ids = set(articles)
+        else:
+            article_ids = changes.article_ids() - changes.deleted_article_ids()
+        pending = [articles[article_id] for article_id in sorted(article_ids) if article_id in articles]
+        print(f"\n{len(changes)} 条变更涉及 {len(pending)} 篇文章")
+        for i, title in enumerate(pending, 1):
+            print(f"\n{'='*20} 正在处理 [{i}/{len(pending)}] {title} {'='*20}")
+            generate_summary_for_article(title)
+
+    processed = consumer.process(handle)
+    if processed:
+        # 摘要是 BM25 和向量索引的编码字段，随之更新索引文件
+        update_bm25_index()
+        update_embedding_indexes()
+        print("\n增量摘要生成完成！")
+    else:
+        print("上次生成摘要以来没有内容变更。")
+
 def main():
     # 1. 获取所有文章并让用户选择
     articles_details = []
-    connection = create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
+    try:
+        with get_cursor() as (connection, cursor):
             cursor.execute("SELECT title, summary FROM article")
             articles_details = cursor.fetchall()
-        except Error as e:
-            print(f"获取文章列表时出错: {e}")
-            return
-        finally:
-            if connection.is_connected():
-                cursor.close()
-                connection.close()
+    except Error as e:
+        print(f"获取文章列表时出错: {e}")
+        return
 
     if not articles_details:
         print("数据库中没有文章。")
@@ -330,6 +305,7 @@ def main():
             print("\n操作选项:")
             print("输入数字: 选择单篇文章生成摘要")
             print("输入 batch: 批量为所有[未生成摘要]的文章生成摘要")
+            print("输入 changed: 只为上次以来标题或正文有变化的文章重新生成摘要")
             print("输入 q: 退出")
             choice = input("请输入指令: ").strip()
             
@@ -349,6 +325,9 @@ def main():
                     generate_summary_for_article(title)
                 print("\n批量处理完成！")
                 
+            elif choice.lower() == 'changed':
+                regenerate_changed_summaries()
+                
             else:
                 # 单个文章处理逻辑
                 idx = int(choice) - 1
@@ -368,19 +347,8 @@ def main():
                         if article_id:
                             update_article_summary(article_id, None)
                             # 同时清空所有章节的摘要
-                            connection = create_connection()
-                            if connection:
-                                try:
-                                    cursor = connection.cursor()
-                                    cursor.execute("UPDATE title SET summary = NULL WHERE article_id = %s", (article_id,))
-                                    connection.commit()
-                                    print("旧摘要已清空。")
-                                except Error as e:
-                                    print(f"清空旧摘要时出错: {e}")
-                                finally:
-                                    if connection.is_connected():
-                                        cursor.close()
-                                        connection.close()
+                            if clear_title_summaries(article_id):
+                                print("旧摘要已清空。")
                     
                     generate_summary_for_article(selected_article_title)
                 else:
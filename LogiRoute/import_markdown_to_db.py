@@ -1,6 +1,8 @@
 import os
 import re
 import database
+from bm25_index import update_bm25_index
+from embedding_index import update_embedding_indexes
 
 def parse_markdown_file(file_path):
     """
@@ -76,47 +78,33 @@ def parse_markdown_file(file_path):
         
     return article_title, sections
 
-def import_to_database(article_title, sections):
+def import_to_database(article_title, sections, content_hash=None):
     """
     将解析后的数据存入数据库
+    
+    content_hash 为源文件哈希；同名文章已存在但哈希不同时，说明源文件已变化，只更新变化的章节
+    （未变化章节的ID和摘要保留）。规则见 database.import_article。
     """
     print(f"正在处理文章: {article_title}")
     
-    # 1. 检查文章是否已存在
-    existing_id = database.get_article_id_by_title(article_title)
-    if existing_id:
-        print(f"  [跳过] 文章 '{article_title}' 已存在 (ID: {existing_id})")
-        return
-        
-    # 2. 插入文章表
-    article_id = database.insert_article(article_title)
-    if not article_id:
-        print(f"  [错误] 无法插入文章 '{article_title}'")
+    # 在一个事务中写入新文章，或只同步已有文章中变化的章节
+    result = database.import_article(article_title, sections, content_hash=content_hash)
+    if not result:
+        print(f"  [错误] 无法导入文章 '{article_title}'")
         return
-    print(f"  [成功] 插入文章 '{article_title}' (ID: {article_id})")
-    
-    # 3. 遍历章节插入 title 和 plain_text 表
-    count_titles = 0
-    count_texts = 0
-    
-    for section in sections:
-        title_text = section['title']
-        level = section['level']
-        content = section['content']
-        
-        # 插入 title 表
-        title_id = database.insert_title(article_id, title_text, level)
-        if title_id:
-            count_titles += 1
-            # 插入 plain_text 表 (如果有内容)
-            if content:
-                text_id = database.insert_plain_text(title_id, content)
-                if text_id:
-                    count_texts += 1
-        else:
-            print(f"  [警告] 无法插入标题 '{title_text}'")
-            
-    print(f"  完成: 插入 {count_titles} 个标题, {count_texts} 段正文。")
+    status, article_id, stats = result
+    if status == "skipped":
+        print(f"  [跳过] 文章 '{article_title}' 已存在 (ID: {article_id})")
+    elif status == "backfilled":
+        print(f"  [回填] 文章 '{article_title}' 没有源文件哈希，已记录哈希，章节保持不变 (ID: {article_id})")
+    elif status == "updated":
+        print(f"  [更新] 文章 '{article_title}' 的源文件已变化 (ID: {article_id})")
+        print(f"  完成: 保留 {stats['kept']} 个章节, 更新 {stats['updated']} 个, "
+              f"新增 {stats['inserted']} 个, 删除 {stats['deleted']} 个。")
+    else:
+        count_texts = sum(1 for section in sections if section['content'])
+        print(f"  [成功] 插入文章 '{article_title}' (ID: {article_id})")
+        print(f"  完成: 插入 {stats['inserted']} 个标题, {count_texts} 段正文。")
 
 def main():
     # 定义 markdown_output 文件夹路径
@@ -139,14 +127,25 @@ def main():
     for filename in files:
         file_path = os.path.join(markdown_dir, filename)
         try:
+            # 先比对源文件哈希，未变化的文件无需解析
+            with open(file_path, 'rb') as f:
+                content_hash = database.compute_content_hash(f.read())
+            existing_id = database.get_article_id_by_content_hash(content_hash)
+            if existing_id:
+                print(f"[跳过] 文件 '{filename}' 未变化 (文章ID: {existing_id})")
+                continue
+            
             article_title, sections = parse_markdown_file(file_path)
             if not sections:
                 print(f"警告: 文件 '{filename}' 内容为空或无法解析。")
                 continue
-            import_to_database(article_title, sections)
+            import_to_database(article_title, sections, content_hash=content_hash)
         except Exception as e:
             print(f"处理文件 '{filename}' 时发生未知错误: {e}")
 
+    # 导入结束后更新 BM25 和向量索引文件，检索时只需加载
+    update_bm25_index()
+    update_embedding_indexes()
     print("\n所有任务完成！")
 
 if __name__ == "__main__":
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库辅助函数的计时与往返次数统计（可选开启）
+
+设置环境变量 DB_INSTRUMENT=1 或调用 enable() 后，database.py 中每个辅助函数都会记录:
+调用次数、执行的SQL次数（数据库往返）、返回行数、收发字节数以及耗时直方图。
+关闭时仅多一次布尔判断，不影响正常路径。
+
+assert_max_queries(n) 可以锁定一段代码的查询次数上限，例如:
+    with assert_max_queries(1):
+        article, sections = get_article_tree(article_id)
+        list(sections)
+"""
+
+import functools
+import inspect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 耗时直方图的桶上界（毫秒）
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, float("inf"))
+
+_enabled = os.getenv("DB_INSTRUMENT", "0") == "1"
+_stats = {}
+_stats_lock = threading.Lock()
+_local = threading.local()
+
+
+class HelperStats:
+    """单个辅助函数的累计统计（多个线程共用，更新和读取都在锁内进行）"""
+
+    __slots__ = ("calls", "queries", "rows", "bytes_sent", "bytes_received", "total_ms", "histogram", "_lock")
+
+    def __init__(self):
+        self.calls = 0
+        self.queries = 0
+        self.rows = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.total_ms = 0.0
+        self.histogram = [0] * len(HISTOGRAM_BUCKETS_MS)
+        self._lock = threading.Lock()
+
+    def observe(self, elapsed_ms):
+        bucket = next(i for i, bound in enumerate(HISTOGRAM_BUCKETS_MS) if elapsed_ms <= bound)
+        with self._lock:
+            self.calls += 1
+            self.total_ms += elapsed_ms
+            self.histogram[bucket] += 1
+
+    def count_query(self, bytes_sent):
+        with self._lock:
+            self.queries += 1
+            self.bytes_sent += bytes_sent
+
+    def count_rows(self, rows, bytes_received):
+        with self._lock:
+            self.rows += rows
+            self.bytes_received += bytes_received
+
+    def snapshot(self):
+        """返回一致的副本，供报告读取"""
+        copy = HelperStats()
+        with self._lock:
+            copy.calls, copy.queries, copy.rows = self.calls, self.queries, self.rows
+            copy.bytes_sent, copy.bytes_received = self.bytes_sent, self.bytes_received
+            copy.total_ms, copy.histogram = self.total_ms, list(self.histogram)
+        return copy
+
+
+def enable():
+    """开启统计"""
+    global _enabled
+    _enabled = True
+
+def disable():
+    """关闭统计"""
+    global _enabled
+    _enabled = False
+
+def reset():
+    """清空已记录的统计数据"""
+    with _stats_lock:
+        _stats.clear()
+
+def get_stats():
+    """返回 {辅助函数名: HelperStats} 的快照"""
+    with _stats_lock:
+        stats = dict(_stats)
+    return {name: helper_stats.snapshot() for name, helper_stats in stats.items()}
+
+def _helper_stats(name):
+    with _stats_lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = HelperStats()
+        return stats
+
+def _helper_stack():
+    stack = getattr(_local, "helpers", None)
+    if stack is None:
+        stack = _local.helpers = []
+    return stack
+
+def _budgets():
+    budgets = getattr(_local, "budgets", None)
+    if budgets is None:
+        budgets = _local.budgets = []
+    return budgets
+
+def _active():
+    return _enabled or bool(getattr(_local, "budgets", None))
+
+def _payload_size(values):
+    size = 0
+    for value in values:
+        if isinstance(value, str):
+            size += len(value.encode("utf-8"))
+        elif isinstance(value, (bytes, bytearray)):
+            size += len(value)
+        elif value is not None:
+            size += 8
+    return size
+
+
+class InstrumentedCursor:
+    """记录SQL次数、行数和字节数的游标代理，统计归属于创建游标时所在的辅助函数"""
+
+    def __init__(self, cursor, helper):
+        self._cursor = cursor
+        self._stats = _helper_stats(helper)
+
+    def _count_query(self, params_size):
+        self._stats.count_query(params_size)
+        for budget in _budgets():
+            budget[0] += 1
+
+    def _count_rows(self, rows):
+        size = sum(_payload_size(row.values() if isinstance(row, dict) else row) for row in rows)
+        self._stats.count_rows(len(rows), size)
+        return rows
+
+    def execute(self, sql, params=None):
+        self._count_query(len(sql) + _payload_size(params or ()))
+        return self._cursor.execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        self._count_query(len(sql) + sum(_payload_size(p) for p in seq_of_params))
+        return self._cursor.executemany(sql, seq_of_params)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._count_rows([row])
+        return row
+
+    def fetchmany(self, size=1):
+        return self._count_rows(self._cursor.fetchmany(size))
+
+    def fetchall(self):
+        return self._count_rows(self._cursor.fetchall())
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._count_rows([row])
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def wrap_cursor(cursor):
+    """统计开启（或有查询次数断言生效）时返回游标代理，否则原样返回"""
+    if not _active():
+        return cursor
+    stack = _helper_stack()
+    return InstrumentedCursor(cursor, stack[-1] if stack else "<direct>")
+
+
+def instrumented(func):
+    """辅助函数装饰器：记录调用次数和耗时，并把其中的查询归属到该函数"""
+    name = func.__name__
+
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def generator_wrapper(*args, **kwargs):
+            if not _active():
+                yield from func(*args, **kwargs)
+                return
+            start = time.perf_counter()
+            stack = _helper_stack()
+            generator = func(*args, **kwargs)
+            try:
+                while True:
+                    # 每次恢复生成器时都压栈，保证流式读取的行数计入该函数
+                    stack.append(name)
+                    try:
+                        item = next(generator)
+                    except StopIteration:
+                        return
+                    finally:
+                        stack.pop()
+                    yield item
+            finally:
+                generator.close()
+                _helper_stats(name).observe((time.perf_counter() - start) * 1000)
+        return generator_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _active():
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        stack = _helper_stack()
+        stack.append(name)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stack.pop()
+            _helper_stats(name).observe((time.perf_counter() - start) * 1000)
+    return wrapper
+
+
+@contextmanager
+def assert_max_queries(max_queries):
+    """
+    断言代码块中当前线程执行的SQL次数不超过 max_queries
+
+    即使全局统计未开启也会生效；超出上限时抛出 AssertionError。
+    """
+    budget = [0]
+    budgets = _budgets()
+    budgets.append(budget)
+    try:
+        yield budget
+    finally:
+        budgets.remove(budget)
+    if budget[0] > max_queries:
+        raise AssertionError(f"执行了 {budget[0]} 次查询，超过上限 {max_queries} 次")
+
+
+def report():
+    """打印各辅助函数的统计汇总"""
+    stats = get_stats()
+    print("=" * 50)
+    print("数据库辅助函数统计")
+    print("=" * 50)
+    if not stats:
+        print("暂无统计数据（统计未开启或尚未调用任何辅助函数）")
+        return
+    labels = ["<=" + (f"{b:g}ms" if b != float("inf") else "inf") for b in HISTOGRAM_BUCKETS_MS]
+    for name, s in sorted(stats.items(), key=lambda item: item[1].total_ms, reverse=True):
+        avg_ms = s.total_ms / s.calls if s.calls else 0.0
+        print(f"{name:32s} 调用: {s.calls:6d} 查询: {s.queries:6d} 行数: {s.rows:8d} "
+              f"发送: {s.bytes_sent:10d}B 接收: {s.bytes_received:10d}B "
+              f"总耗时: {s.total_ms:9.1f}ms 平均: {avg_ms:7.2f}ms")
+        histogram = ", ".join(f"{label}: {count}" for label, count in zip(labels, s.histogram) if count)
+        if histogram:
+            print(f"{'':32s} 耗时分布: {histogram}")
@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库结构版本迁移
+
+schema_migrations 表记录已执行的迁移版本号，MIGRATIONS 中的步骤按版本号顺序执行。
+每个步骤在执行前都会检查对象是否已存在，因此重复执行是安全的。
+
+用法:
+    python migrations.py            # 执行未完成的迁移并打印 EXPLAIN 报告
+    python migrations.py --report   # 只打印 EXPLAIN 报告
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import (
+    DB_BACKEND, Error, get_connection, get_cursor, normalize_title,
+    rebuild_section_bodies, rebuild_section_hierarchy, section_content_hash,
+)
+
+
+def _index_exists(cursor, table, index_name):
+    """检查索引是否存在"""
+    if DB_BACKEND == "sqlite":
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND name = %s",
+            (table, index_name)
+        )
+        return cursor.fetchone()[0] > 0
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+    """, (table, index_name))
+    return cursor.fetchone()[0] > 0
+
+def _column_exists(cursor, table, column):
+    """检查列是否存在"""
+    if DB_BACKEND == "sqlite":
+        cursor.execute(f"PRAGMA table_info({table})")
+        return any(row[1] == column for row in cursor.fetchall())
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (table, column))
+    return cursor.fetchone()[0] > 0
+
+def _add_column(cursor, table, column, definition):
+    """列不存在时添加列"""
+    if _column_exists(cursor, table, column):
+        return
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def _add_index(cursor, table, index_name, columns, unique=False):
+    """索引不存在时创建索引"""
+    if _index_exists(cursor, table, index_name):
+        return
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    cursor.execute(f"CREATE {kind} {index_name} ON {table} ({columns})")
+
+
+def _m001_title_article_order(cursor):
+    # 按文章列出章节: WHERE article_id = ? ORDER BY id
+    _add_index(cursor, "title", "idx_title_article_id", "article_id, id")
+
+def _m002_title_article_title(cursor):
+    # 在文章内按章节标题定位
+    _add_index(cursor, "title", "idx_title_article_title", "article_id, title")
+
+def _m003_title_title(cursor):
+    # get_plain_text_by_title: JOIN ... WHERE t.title = ?
+    _add_index(cursor, "title", "idx_title_title", "title")
+
+def _m004_plain_text_unique_title(cursor):
+    # 每个标题只保留一条正文（保留最早插入的一条，与 fetchone() 的历史行为一致）
+    if _index_exists(cursor, "plain_text", "uk_plain_text_title_id"):
+        return
+    # 派生表包一层，避免 MySQL 不允许在子查询中引用被删除表的限制
+    cursor.execute("""
+        DELETE FROM plain_text
+        WHERE id NOT IN (
+            SELECT id FROM (SELECT MIN(id) AS id FROM plain_text GROUP BY title_id) keep
+        )
+    """)
+    _add_index(cursor, "plain_text", "uk_plain_text_title_id", "title_id", unique=True)
+
+def _m005_article_normalized_title(cursor):
+    # 归一化标题（去除空白、转小写）持久化并建索引，模糊匹配变为一次索引查找
+    _add_column(cursor, "article", "normalized_title", "VARCHAR(255)")
+    cursor.execute("SELECT id, title FROM article WHERE normalized_title IS NULL")
+    rows = cursor.fetchall()
+    if rows:
+        cursor.executemany(
+            "UPDATE article SET normalized_title = %s WHERE id = %s",
+            [(normalize_title(title), article_id) for article_id, title in rows]
+        )
+    _add_index(cursor, "article", "idx_article_normalized_title", "normalized_title")
+
+def _m006_catalog_version(cursor):
+    # 文章目录代数计数器，供各进程的目录缓存判断是否过期
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS catalog_version (
+            id INT PRIMARY KEY,
+            generation BIGINT NOT NULL
+        )
+    """)
+    cursor.execute("SELECT COUNT(*) FROM catalog_version WHERE id = 1")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute("INSERT INTO catalog_version (id, generation) VALUES (1, 0)")
+
+# 全文索引：(表, 索引名/FTS5表名, 列)
+FULLTEXT_INDEXES = [
+    ("plain_text", "ft_plain_text_content", "text_content"),
+    ("title", "ft_title_summary", "summary"),
+    ("article", "ft_article_summary", "summary"),
+]
+
+def _sqlite_fts5_available():
+    import sqlite_backend
+    with get_connection() as connection:
+        return sqlite_backend.fts5_available(connection)
+
+def _create_fts5_table(cursor, table, fts_table, column):
+    """SQLite: 为 table.column 创建外部内容 FTS5 表及同步触发器"""
+    cursor.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table}
+        USING fts5({column}, content='{table}', content_rowid='id', tokenize='trigram')
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts_table}(rowid, {column}) VALUES (new.id, new.{column});
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts_table}({fts_table}, rowid, {column}) VALUES ('delete', old.id, old.{column});
+        END
+    """)
+    _create_fts5_update_trigger(cursor, table, fts_table, column)
+    cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+
+def _create_fts5_update_trigger(cursor, table, fts_table, column):
+    """SQLite: 只在被索引的列变化时同步 FTS5 表（层级、哈希等其他列的更新不触发）"""
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF {column} ON {table} BEGIN
+            INSERT INTO {fts_table}({fts_table}, rowid, {column}) VALUES ('delete', old.id, old.{column});
+            INSERT INTO {fts_table}(rowid, {column}) VALUES (new.id, new.{column});
+        END
+    """)
+
+def _create_plain_text_fts5_table(cursor):
+    """
+    SQLite: 正文的 FTS5 表索引解码后的正文，压缩存储的正文也能被检索
+    
+    decode_plain_text 是 database.py 注册到每个 SQLite 连接的SQL函数；外部内容为同样解码的视图，
+    rebuild 和 bm25 因此与索引内容一致。已是该结构时不做任何操作，旧结构（迁移7）删除后重建。
+    """
+    cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'view' AND name = 'plain_text_search'")
+    if cursor.fetchone()[0] > 0:
+        return
+    for trigger in ("ai", "ad", "au"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS ft_plain_text_content_{trigger}")
+    cursor.execute("DROP TABLE IF EXISTS ft_plain_text_content")
+    cursor.execute("""
+        CREATE VIEW plain_text_search AS
+        SELECT id, title_id, decode_plain_text(text_content, content_format, compressed_content) AS text_content
+        FROM plain_text
+    """)
+    cursor.execute("""
+        CREATE VIRTUAL TABLE ft_plain_text_content
+        USING fts5(text_content, content='plain_text_search', content_rowid='id', tokenize='trigram')
+    """)
+    decoded = "decode_plain_text({row}.text_content, {row}.content_format, {row}.compressed_content)"
+    cursor.execute(f"""
+        CREATE TRIGGER ft_plain_text_content_ai AFTER INSERT ON plain_text BEGIN
+            INSERT INTO ft_plain_text_content(rowid, text_content) VALUES (new.id, {decoded.format(row="new")});
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER ft_plain_text_content_ad AFTER DELETE ON plain_text BEGIN
+            INSERT INTO ft_plain_text_content(ft_plain_text_content, rowid, text_content)
+            VALUES ('delete', old.id, {decoded.format(row="old")});
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER ft_plain_text_content_au
+        AFTER UPDATE OF text_content, content_format, compressed_content ON plain_text BEGIN
+            INSERT INTO ft_plain_text_content(ft_plain_text_content, rowid, text_content)
+            VALUES ('delete', old.id, {decoded.format(row="old")});
+            INSERT INTO ft_plain_text_content(rowid, text_content) VALUES (new.id, {decoded.format(row="new")});
+        END
+    """)
+    cursor.execute("INSERT INTO ft_plain_text_content(ft_plain_text_content) VALUES ('rebuild')")
+
+def _m007_fulltext_indexes(cursor):
+    # MySQL 使用 ngram 分词器的 FULLTEXT 索引；SQLite 使用 trigram 分词的 FTS5 表
+    if DB_BACKEND == "sqlite" and not _sqlite_fts5_available():
+        # 跳过全文索引，检索退回 LIKE 匹配；后续迁移照常执行
+        print("当前 SQLite 不支持 FTS5 trigram 分词（需要 3.34 及以上版本），跳过全文索引")
+        return
+    for table, index_name, column in FULLTEXT_INDEXES:
+        if DB_BACKEND == "sqlite":
+            _create_fts5_table(cursor, table, index_name, column)
+        elif not _index_exists(cursor, table, index_name):
+            cursor.execute(f"ALTER TABLE {table} ADD FULLTEXT INDEX {index_name} ({column}) WITH PARSER ngram")
+
+def _m008_content_hash(cursor):
+    # 文章保存源文件哈希，章节保存 (标题, 级别, 正文) 哈希，重复导入和下游缓存据此判断是否变化
+    _add_column(cursor, "article", "content_hash", "CHAR(64)")
+    _add_column(cursor, "title", "content_hash", "CHAR(64)")
+    _add_index(cursor, "article", "idx_article_content_hash", "content_hash")
+    cursor.execute("""
+        SELECT t.id, t.title, t.level, pt.text_content
+        FROM title t LEFT JOIN plain_text pt ON pt.title_id = t.id
+        WHERE t.content_hash IS NULL
+    """)
+    rows = cursor.fetchall()
+    if rows:
+        cursor.executemany(
+            "UPDATE title SET content_hash = %s WHERE id = %s",
+            [(section_content_hash(title, level, text), title_id) for title_id, title, level, text in rows]
+        )
+
+def _m009_plain_text_compression(cursor):
+    # 正文压缩存储：content_format 为空表示明文，否则正文以该格式压缩后存入 compressed_content
+    _add_column(cursor, "plain_text", "content_format", "VARCHAR(8)")
+    _add_column(cursor, "plain_text", "compressed_content", "BLOB" if DB_BACKEND == "sqlite" else "LONGBLOB")
+
+def _m010_section_hierarchy(cursor):
+    # 章节层级：父章节、兄弟序号和物化路径；(article_id, path) 索引支持子树范围查询
+    _add_column(cursor, "title", "parent_id", "INT")
+    _add_column(cursor, "title", "position", "INT")
+    _add_column(cursor, "title", "path", "VARCHAR(255)")
+    _add_index(cursor, "title", "idx_title_article_path", "article_id, path")
+    _add_index(cursor, "title", "idx_title_parent_id", "parent_id")
+    cursor.execute("SELECT DISTINCT article_id FROM title WHERE path IS NULL")
+    for (article_id,) in cursor.fetchall():
+        rebuild_section_hierarchy(cursor, article_id)
+
+def _m011_section_body_target(cursor):
+    # 每个章节实际承载正文的章节ID，检索时据此一次取回正文，不再试探 title_id+1
+    _add_column(cursor, "title", "body_title_id", "INT")
+    cursor.execute("SELECT DISTINCT article_id FROM title")
+    for (article_id,) in cursor.fetchall():
+        rebuild_section_bodies(cursor, article_id)
+
+def _m012_article_shard(cursor):
+    # 分片路由表：文章所在分片编号（sharding.py 使用，未启用分片时为空表）
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS article_shard (
+            article_id INT PRIMARY KEY,
+            shard INT NOT NULL
+        )
+    """)
+
+def _m013_change_log(cursor):
+    # 变更日志：写入辅助函数在同一事务中追加记录，version 单调递增
+    version_column = ("version INTEGER PRIMARY KEY AUTOINCREMENT" if DB_BACKEND == "sqlite"
+                      else "version BIGINT AUTO_INCREMENT PRIMARY KEY")
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS change_log (
+            {version_column},
+            entity VARCHAR(16) NOT NULL,
+            entity_id INT NOT NULL,
+            article_id INT,
+            operation VARCHAR(16) NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # 各消费者已处理到的版本号
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS change_log_checkpoint (
+            consumer VARCHAR(64) PRIMARY KEY,
+            version BIGINT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def _m014_fts5_update_of_column(cursor):
+    # SQLite: 迁移7创建的更新触发器对任何列的更新都会重写 FTS5 索引，改为只在被索引的列变化时触发
+    if DB_BACKEND != "sqlite":
+        return
+    for table, fts_table, column in FULLTEXT_INDEXES:
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name = %s", (f"{fts_table}_au",)
+        )
+        if cursor.fetchone()[0] == 0:
+            continue
+        cursor.execute(f"DROP TRIGGER {fts_table}_au")
+        _create_fts5_update_trigger(cursor, table, fts_table, column)
+
+def _m015_fulltext_decoded_plain_text(cursor):
+    # SQLite: 正文的 FTS5 表改为索引解码后的正文，压缩存储的正文不再从全文检索中消失
+    # （MySQL 的 FULLTEXT 只能建在列上，见 database.compressed_text_searchable）
+    if DB_BACKEND != "sqlite":
+        return
+    cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'ft_plain_text_content'")
+    if cursor.fetchone()[0] > 0:
+        _create_plain_text_fts5_table(cursor)
+
+# (版本号, 说明, 迁移函数)，版本号必须严格递增
+MIGRATIONS = [
+    (1, "title(article_id, id) 索引", _m001_title_article_order),
+    (2, "title(article_id, title) 索引", _m002_title_article_title),
+    (3, "title(title) 索引", _m003_title_title),
+    (4, "plain_text.title_id 唯一键", _m004_plain_text_unique_title),
+    (5, "article.normalized_title 列及索引", _m005_article_normalized_title),
+    (6, "catalog_version 目录代数表", _m006_catalog_version),
+    (7, "正文及摘要全文索引", _m007_fulltext_indexes),
+    (8, "文章及章节内容哈希", _m008_content_hash),
+    (9, "正文压缩存储列", _m009_plain_text_compression),
+    (10, "章节层级 parent_id/position/path", _m010_section_hierarchy),
+    (11, "章节正文解析 body_title_id", _m011_section_body_target),
+    (12, "article_shard 分片路由表", _m012_article_shard),
+    (13, "change_log 变更日志及消费检查点", _m013_change_log),
+    (14, "FTS5 更新触发器只在被索引的列变化时触发", _m014_fts5_update_of_column),
+    (15, "FTS5 正文索引包含压缩存储的正文", _m015_fulltext_decoded_plain_text),
+]
+
+
+def get_applied_versions(cursor):
+    """获取已执行的迁移版本号集合"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+def apply_migrations():
+    """按顺序执行所有未完成的迁移，返回本次执行的版本号列表"""
+    applied_now = []
+    try:
+        with get_cursor() as (connection, cursor):
+            applied = get_applied_versions(cursor)
+            for version, description, migrate in MIGRATIONS:
+                if version in applied:
+                    continue
+                print(f"执行迁移 {version}: {description}")
+                migrate(cursor)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                    (version, description)
+                )
+                connection.commit()
+                applied_now.append(version)
+    except Error as e:
+        print(f"执行数据库迁移时出错: {e}")
+    return applied_now
+
+
+# database.py 中各辅助函数使用的查询，参数仅用于生成执行计划
+HELPER_QUERIES = [
+    ("get_all_articles", "SELECT title FROM article", ()),
+    ("get_all_articles_with_details", "SELECT id, title, summary FROM article", ()),
+    ("get_article_id_by_title", """
+        SELECT id, title FROM article
+        WHERE title = %s OR normalized_title = %s
+        ORDER BY title = %s DESC, id
+        LIMIT 1
+    """, ("", "", "")),
+    ("get_titles_by_article_id",
+     "SELECT id, title, level, summary FROM title WHERE article_id = %s ORDER BY path, id", (0,)),
+    ("get_section_subtree", """
+        SELECT t.id FROM title t
+        WHERE t.article_id = %s AND t.path >= %s AND t.path < %s
+        ORDER BY t.path
+    """, (0, "0001", "00010")),
+    ("get_plain_text_by_title", """
+        SELECT pt.text_content, pt.content_format, pt.compressed_content, t.summary
+        FROM plain_text pt
+        JOIN title t ON pt.title_id = t.id
+        WHERE t.title = %s
+    """, ("",)),
+    ("get_plain_text_by_title_id", """
+        SELECT pt.text_content, pt.content_format, pt.compressed_content
+        FROM plain_text pt WHERE pt.title_id = %s
+    """, (0,)),
+    ("get_section_bodies", """
+        SELECT t.id, pt.text_content, pt.content_format, pt.compressed_content
+        FROM title t
+        JOIN plain_text pt ON pt.title_id = t.body_title_id
+        WHERE t.id IN (%s, %s)
+    """, (0, 0)),
+]
+
+def explain_report():
+    """对 HELPER_QUERIES 执行 EXPLAIN，打印仍然走全表扫描的查询"""
+    print("=" * 50)
+    print("查询执行计划报告")
+    print("=" * 50)
+    full_scans = []
+    if DB_BACKEND == "sqlite":
+        return _explain_report_sqlite(full_scans)
+    try:
+        with get_cursor(dictionary=True) as (connection, cursor):
+            for helper, sql, params in HELPER_QUERIES:
+                cursor.execute("EXPLAIN " + sql, params)
+                for row in cursor.fetchall():
+                    access_type = row.get("type")
+                    flag = "全表扫描" if access_type == "ALL" else "使用索引"
+                    print(f"{helper:32s} 表: {str(row.get('table')):10s} 类型: {str(access_type):8s} "
+                          f"索引: {str(row.get('key')):28s} 预估行数: {row.get('rows')}  [{flag}]")
+                    if access_type == "ALL":
+                        full_scans.append(helper)
+    except Error as e:
+        print(f"生成执行计划报告时出错: {e}")
+        return []
+
+    return _print_full_scans(full_scans)
+
+def _explain_report_sqlite(full_scans):
+    """SQLite 版本：通过 EXPLAIN QUERY PLAN 中的 SCAN 步骤识别全表扫描"""
+    try:
+        with get_cursor() as (connection, cursor):
+            for helper, sql, params in HELPER_QUERIES:
+                cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+                for row in cursor.fetchall():
+                    detail = row[3]
+                    is_full_scan = detail.startswith("SCAN") and "USING" not in detail
+                    flag = "全表扫描" if is_full_scan else "使用索引"
+                    print(f"{helper:32s} {detail:60s} [{flag}]")
+                    if is_full_scan:
+                        full_scans.append(helper)
+    except Error as e:
+        print(f"生成执行计划报告时出错: {e}")
+        return []
+    return _print_full_scans(full_scans)
+
+def _print_full_scans(full_scans):
+    """打印并返回存在全表扫描的辅助函数"""
+    print("-" * 50)
+    if full_scans:
+        print("以下辅助函数仍存在全表扫描: " + ", ".join(sorted(set(full_scans))))
+    else:
+        print("所有辅助函数查询均已使用索引。")
+    return full_scans
+
+
+if __name__ == "__main__":
+    if "--report" not in sys.argv:
+        applied = apply_migrations()
+        print(f"本次执行迁移: {applied if applied else '无'}")
+    explain_report()
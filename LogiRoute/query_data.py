@@ -12,7 +12,8 @@ import json
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from database import (
+# 读取函数来自 corpus：默认查询数据库，CORPUS_MODE=memory 时查询内存语料
+from corpus import (
     get_plain_text_by_title, 
     get_titles_by_article, 
     get_all_articles_with_details,
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+候选章节重排序（本地 CPU 计算，结果确定）
+
+选章节步骤原本把文章的全部章节以 JSON 发给大模型挑选 2 个，耗时长且结果不稳定。
+重排序器为 (问题, 章节) 对打分，可以缩小发给大模型的候选（narrow），也可以直接代替大模型挑选（replace）。
+
+可选的重排序器（RERANKER）:
+- cross-encoder: 交叉编码器（默认 BAAI/bge-reranker-base），输入为 章节标题 + 摘要 + 正文开头，
+  按 RERANKER_BATCH_SIZE 分批在 CPU 上推理，输入截断到 RERANKER_MAX_LENGTH 个 token 以限制延迟。
+- bm25: 直接使用 bm25_index.py 的得分，不需要加载模型。
+
+用法:
+    python reranker.py "问题" [文章题目]    # 对文章（默认第一篇）的全部章节重排序并打印耗时
+"""
+
+import abc
+import json
+import os
+import re
+import sys
+import time
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import get_section_bodies
+
+# 重排序器: cross-encoder 或 bm25
+RERANKER = os.getenv("RERANKER", "cross-encoder").lower()
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "BAAI/bge-reranker-base")
+RERANKER_BATCH_SIZE = int(os.getenv("RERANKER_BATCH_SIZE", "16"))
+RERANKER_MAX_LENGTH = int(os.getenv("RERANKER_MAX_LENGTH", "512"))
+
+_TAG_PATTERN = re.compile(r"<[^>]+>")
+
+
+def is_table_of_contents(title):
+    """章节标题（去掉 OCR 残留的 HTML 标签和空白后）是否为“目录”"""
+    return "".join(_TAG_PATTERN.sub("", title or "").split()) == "目录"
+
+
+class Reranker(abc.ABC):
+    """重排序器接口：为一组章节打分，分数越高越相关"""
+
+    @abc.abstractmethod
+    def score(self, query, sections):
+        """
+        Args:
+            query (str): 用户问题
+            sections (list): 章节字典列表，至少包含 id、title、summary
+
+        Returns:
+            list: 与 sections 一一对应的得分
+        """
+
+    def rerank(self, query, sections, k=None):
+        """按得分从高到低返回 [(章节字典, 得分), ...]，k 为 None 时返回全部"""
+        if not sections:
+            return []
+        ranked = sorted(zip(sections, self.score(query, sections)), key=lambda item: item[1], reverse=True)
+        return ranked[:k] if k is not None else ranked
+
+
+class CrossEncoderReranker(Reranker):
+    """基于 sentence-transformers CrossEncoder 的交叉编码器重排序"""
+
+    def __init__(self, model_name=RERANKER_MODEL, batch_size=RERANKER_BATCH_SIZE, max_length=RERANKER_MAX_LENGTH):
+        from sentence_transformers import CrossEncoder
+        print(f"Loading reranker model ({model_name})...")
+        self.model = CrossEncoder(model_name, max_length=max_length, device="cpu")
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+    def section_text(self, section, body):
+        # 中文大约一个字一个 token，超出 max_length 的部分会被截断，不必传入
+        parts = [section.get("title") or ""]
+        if section.get("summary"):
+            parts.append(section["summary"])
+        if body:
+            parts.append(body)
+        return "\n".join(parts)[:self.max_length]
+
+    def score(self, query, sections):
+        bodies = get_section_bodies([section["id"] for section in sections])
+        pairs = [(query, self.section_text(section, bodies.get(section["id"]))) for section in sections]
+        scores = self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+        return [float(score) for score in scores]
+
+
+class BM25Reranker(Reranker):
+    """使用 BM25 索引的得分，未命中的章节得 0 分"""
+
+    def __init__(self):
+        from bm25_index import get_bm25_index
+        self.index = get_bm25_index()
+        if self.index is None:
+            raise RuntimeError("BM25 索引不存在，请先执行 python bm25_index.py build")
+
+    def score(self, query, sections):
+        scores = self.index.score_sections(query, [section["id"] for section in sections])
+        return [scores.get(section["id"], 0.0) for section in sections]
+
+
+RERANKERS = {"cross-encoder": CrossEncoderReranker, "bm25": BM25Reranker}
+
+_reranker = None
+
+def get_reranker():
+    """返回进程内共享的重排序器（按 RERANKER 选择，首次调用时加载模型）"""
+    global _reranker
+    if _reranker is None:
+        if RERANKER not in RERANKERS:
+            raise ValueError(f"未知的重排序器 '{RERANKER}'，可选: {', '.join(RERANKERS)}")
+        _reranker = RERANKERS[RERANKER]()
+    return _reranker
+
+def rerank_sections(query, sections, k=None):
+    """
+    对候选章节重排序（跳过“目录”章节）
+
+    Returns:
+        list: [(章节字典, 得分), ...]，按得分从高到低排列
+    """
+    candidates = [section for section in sections if not is_table_of_contents(section.get("title"))]
+    return get_reranker().rerank(query, candidates, k)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    from corpus import get_all_articles
+    from query_data import query_article_titles
+
+    question = sys.argv[1]
+    article_title = sys.argv[2] if len(sys.argv) > 2 else get_all_articles()[0]
+    sections = json.loads(query_article_titles(article_title))
+    get_reranker()
+    start = time.perf_counter()
+    ranked = rerank_sections(question, sections, 10)
+    elapsed = (time.perf_counter() - start) * 1000
+    for section, score in ranked:
+        print(f"{score:8.3f}  [{section['id']}] {section['title']}")
+    print(f"{RERANKER} 重排序 {len(sections)} 个章节，耗时 {elapsed:.1f} ms")
@@ -0,0 +1,753 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按文章把 title 和 plain_text 分布到多个数据库实例
+
+- 主库（database.py 使用的数据库）保存 article 表、article_shard 路由表和 change_log；
+  新文章按 article_id % 分片数 放置，路由表允许以后把文章迁移到其他分片。
+- 各分片保存所属文章的 title 和 plain_text。每个分片只分配 (id - 1) % 分片数 == 分片编号 的章节ID，
+  因此章节ID全局唯一，且不查路由表就能知道章节所在的分片。
+- 配置 DB_SHARDS 后，database.py 中读写章节和正文的辅助函数（@sharded）都转给 ShardedStore 的同名方法：
+  按文章或章节ID路由的调用在目标分片上执行原来的实现（database.bind_shard），
+  按章节ID批量读取和全文检索在各分片上并行执行后合并结果。
+- 分片上的写入照常记录 title/plain_text 变更日志，分片事务提交后写入主库的 change_log。
+- 批量导入先在主库写入全部新文章，再由每个分片一个线程并行写入章节和正文；
+  同名文章已存在时按 database.import_article 的规则只更新变化的章节。
+
+配置分片（逗号分隔，MySQL 为 host:port，SQLite 后端为数据库文件路径）:
+    DB_SHARDS=127.0.0.1:3307,127.0.0.1:3308
+
+本机测试时可以启动多个 mysqld 实例（各实例上的 DB_NAME 数据库由 init 创建），例如:
+    mysqld --initialize-insecure --datadir=/tmp/shard0
+    mysqld --datadir=/tmp/shard0 --port=3307 --socket=/tmp/shard0.sock --mysqlx=OFF &
+    （shard1 使用 --port=3308，以此类推；DB_USER/DB_PASSWORD 需能登录每个实例）
+
+用法:
+    python sharding.py init      # 在主库和各分片上建表
+    python sharding.py import    # 并行导入 markdown_output 中的文件
+    python sharding.py stats     # 打印各分片的文章和章节数量
+    python sharding.py check     # 在各分片上做一次写入、读取、更新和删除的往返检查
+"""
+
+import heapq
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import database
+from database import (
+    DB_BACKEND, DB_SHARDS, Error, bind_shard, bump_catalog_generation, decode_plain_text, get_cursor,
+    invalidate_catalog_cache, normalize_title, record_change, record_changes, search_sections_sql,
+    PLAIN_TEXT_COLUMNS,
+)
+from instrumentation import instrumented, wrap_cursor
+
+if DB_BACKEND == "sqlite":
+    import sqlite_backend
+else:
+    import mysql.connector
+
+# 分片上的表结构（与主库迁移后的 title/plain_text 一致，但没有指向 article 的外键；
+# 章节ID总是由 Shard.insert_titles 显式分配，因此不使用自增）
+MYSQL_SHARD_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS title (
+        id INT PRIMARY KEY,
+        article_id INT NOT NULL,
+        title VARCHAR(255) NOT NULL,
+        level INT NOT NULL,
+        summary TEXT,
+        content_hash CHAR(64),
+        parent_id INT,
+        position INT,
+        path VARCHAR(255),
+        body_title_id INT,
+        INDEX idx_title_article_id (article_id, id),
+        INDEX idx_title_article_path (article_id, path),
+        INDEX idx_title_title (title),
+        FULLTEXT INDEX ft_title_summary (summary) WITH PARSER ngram
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS plain_text (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        title_id INT,
+        text_content TEXT,
+        content_format VARCHAR(8),
+        compressed_content LONGBLOB,
+        UNIQUE INDEX uk_plain_text_title_id (title_id),
+        FULLTEXT INDEX ft_plain_text_content (text_content) WITH PARSER ngram,
+        FOREIGN KEY (title_id) REFERENCES title(id) ON DELETE CASCADE
+    )
+    """,
+]
+
+SQLITE_SHARD_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS title (
+        id INTEGER PRIMARY KEY,
+        article_id INT NOT NULL,
+        title VARCHAR(255) NOT NULL,
+        level INT NOT NULL,
+        summary TEXT,
+        content_hash CHAR(64),
+        parent_id INT,
+        position INT,
+        path VARCHAR(255),
+        body_title_id INT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_title_article_id ON title (article_id, id)",
+    "CREATE INDEX IF NOT EXISTS idx_title_article_path ON title (article_id, path)",
+    "CREATE INDEX IF NOT EXISTS idx_title_title ON title (title)",
+    """
+    CREATE TABLE IF NOT EXISTS plain_text (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title_id INT UNIQUE,
+        text_content TEXT,
+        content_format VARCHAR(8),
+        compressed_content BLOB,
+        FOREIGN KEY (title_id) REFERENCES title(id) ON DELETE CASCADE
+    )
+    """,
+]
+
+
+class Shard:
+    """一个分片实例及其连接池"""
+
+    def __init__(self, index, count, address):
+        self.index = index
+        self.count = count
+        self.address = address
+        if DB_BACKEND == "sqlite":
+            self._pool = sqlite_backend.SQLiteConnectionPool(address)
+        else:
+            self.host, _, port = address.partition(":")
+            self.port = int(port or 3306)
+            self._pool = database.ConnectionPool(
+                f"rag_shard_{index}",
+                host=self.host,
+                port=self.port,
+                database=database.DB_NAME,
+                user=database.DB_USER,
+                password=database.DB_PASSWORD
+            )
+
+    def create_database(self):
+        """MySQL 分片：在实例上创建 DB_NAME 数据库（连接池的连接都指定了该数据库）"""
+        if DB_BACKEND == "sqlite":
+            return
+        connection = mysql.connector.connect(
+            host=self.host, port=self.port, user=database.DB_USER, password=database.DB_PASSWORD
+        )
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{database.DB_NAME}`")
+            cursor.close()
+        finally:
+            connection.close()
+
+    @contextmanager
+    def cursor(self, shared=True, **cursor_kwargs):
+        """与 database.get_cursor 相同，只是连接来自该分片"""
+        with self._pool.connection(shared) as connection:
+            cursor = wrap_cursor(connection.cursor(**cursor_kwargs))
+            try:
+                yield connection, cursor
+            finally:
+                cursor.close()
+
+    def insert_titles(self, cursor, rows):
+        """
+        在分片上插入章节 rows = [(article_id, title, level, content_hash, position, path)]，返回章节ID
+
+        第一行在 INSERT ... SELECT 中读取 MAX(id) 并分配下一个满足分片规则的ID（SQLite 与 MySQL 相同），
+        语句执行后本事务持有写锁（InnoDB 为新行的行锁，其他事务读取 MAX(id) 时等待），
+        其余行依次按分片数跨步递增；并发写入同一分片不会分到相同的ID，冲突时后到的事务失败回滚。
+        """
+        cursor.execute("""
+            INSERT INTO title (id, article_id, title, level, content_hash, position, path)
+            SELECT m + 1 + ((%s - m) %% %s + %s) %% %s, %s, %s, %s, %s, %s, %s
+            FROM (SELECT COALESCE(MAX(id), 0) AS m FROM title) AS last_title
+        """, (self.index, self.count, self.count, self.count, *rows[0]))
+        if DB_BACKEND == "sqlite":
+            first_id = cursor.lastrowid
+        else:
+            # title.id 不是自增列，MySQL 不返回 lastrowid；本事务刚插入的行就是当前最大ID
+            cursor.execute("SELECT MAX(id) FROM title")
+            first_id = cursor.fetchone()[0]
+        title_ids = [first_id + i * self.count for i in range(len(rows))]
+        if len(rows) > 1:
+            cursor.executemany(
+                "INSERT INTO title (id, article_id, title, level, content_hash, position, path) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                [(title_id, *row) for title_id, row in zip(title_ids[1:], rows[1:])]
+            )
+        return title_ids
+
+    def __repr__(self):
+        return f"Shard({self.index}, {self.address})"
+
+
+class ShardedStore:
+    """
+    分片存储：路由、并行导入和分散-汇聚读取
+
+    与 database.py 中 @sharded 辅助函数同名的方法参数和返回格式都与之一致，
+    通常通过这些辅助函数间接调用（database.get_sharded_store）。
+    """
+
+    def __init__(self, addresses=None):
+        addresses = addresses if addresses is not None else DB_SHARDS
+        if not addresses:
+            raise ValueError("未配置分片，请设置 DB_SHARDS")
+        self.shards = [Shard(index, len(addresses), address) for index, address in enumerate(addresses)]
+        self._routes = {}
+        self._routes_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix="shard")
+
+    # ---------- 建表与路由 ----------
+
+    def create_shard_tables(self):
+        """在每个分片上建表（database.create_database_and_tables 在主库迁移后调用）"""
+        from migrations import _create_fts5_table, _create_plain_text_fts5_table, _sqlite_fts5_available
+        fulltext = DB_BACKEND == "sqlite" and _sqlite_fts5_available()
+        for shard in self.shards:
+            try:
+                shard.create_database()
+                with shard.cursor() as (connection, cursor):
+                    for ddl in (SQLITE_SHARD_TABLES if DB_BACKEND == "sqlite" else MYSQL_SHARD_TABLES):
+                        cursor.execute(ddl)
+                    if fulltext:
+                        _create_plain_text_fts5_table(cursor)
+                        _create_fts5_table(cursor, "title", "ft_title_summary", "summary")
+                    connection.commit()
+                print(f"分片 {shard.index} ({shard.address}) 建表完成")
+            except Error as e:
+                print(f"分片 {shard.index} 建表时出错: {e}")
+
+    def default_shard_index(self, article_id):
+        """新文章的默认放置位置"""
+        return article_id % len(self.shards)
+
+    def shard_for_article(self, article_id, create=False):
+        """
+        根据路由表返回文章所在的分片
+
+        文章还没有路由时（例如 insert_article 刚创建的文章），create 为真则按默认位置写入路由，否则返回 None。
+        """
+        shard_index = self._routes.get(article_id)
+        if shard_index is None:
+            try:
+                with get_cursor() as (connection, cursor):
+                    cursor.execute("SELECT shard FROM article_shard WHERE article_id = %s", (article_id,))
+                    row = cursor.fetchone()
+                    if row is None and create:
+                        row = (self.default_shard_index(article_id),)
+                        cursor.execute(
+                            "INSERT INTO article_shard (article_id, shard) VALUES (%s, %s)",
+                            (article_id, row[0])
+                        )
+                        connection.commit()
+            except Error as e:
+                print(f"查询分片路由时出错: {e}")
+                return None
+            if row is None:
+                return None
+            shard_index = row[0]
+            with self._routes_lock:
+                self._routes[article_id] = shard_index
+        return self.shards[shard_index]
+
+    def shard_for_title(self, title_id):
+        """章节ID按分配规则直接映射到分片"""
+        return self.shards[(title_id - 1) % len(self.shards)]
+
+    def _group_titles(self, title_ids):
+        groups = {}
+        for title_id in dict.fromkeys(title_ids):
+            groups.setdefault(self.shard_for_title(title_id), []).append(title_id)
+        return groups
+
+    @staticmethod
+    def _run_on_shard(shard, func, *args):
+        with bind_shard(shard):
+            return func(*args)
+
+    def _scatter(self, calls):
+        """并行执行 [(分片, 函数, 参数...)]，每个函数在绑定了对应分片的线程中执行，返回各自结果组成的列表"""
+        futures = [self._executor.submit(self._run_on_shard, shard, func, *args) for shard, func, *args in calls]
+        return [future.result() for future in futures]
+
+    def _on_title_shard(self, func, title_id, *args):
+        """在章节所在的分片上执行 database.py 中的辅助函数"""
+        with bind_shard(self.shard_for_title(title_id)):
+            return func(title_id, *args)
+
+    def _on_article_shard(self, func, article_id, *args, default=None):
+        """在文章所在的分片上执行 database.py 中的辅助函数，文章没有路由时返回 default"""
+        shard = self.shard_for_article(article_id)
+        if shard is None:
+            return default
+        with bind_shard(shard):
+            return func(article_id, *args)
+
+    # ---------- 写入 ----------
+
+    def _import_to_shard(self, items):
+        """单个分片的导入线程：逐篇写入，返回 ({成功的文章ID: 章节ID列表}, 失败的文章ID列表)"""
+        imported, failed = {}, []
+        for article_id, sections in items:
+            try:
+                with get_cursor() as (connection, cursor):
+                    try:
+                        imported[article_id] = database._insert_sections(cursor, article_id, sections)
+                        connection.commit()
+                    except Error:
+                        connection.rollback()
+                        raise
+            except Error as e:
+                print(f"分片 {database.bound_shard().index} 写入文章 {article_id} 时出错: {e}")
+                failed.append(article_id)
+        return imported, failed
+
+    def _import(self, articles):
+        """主库写入文章和路由后各分片并行写入章节，返回 {文章题目: (文章ID, 章节ID列表)}"""
+        placed = []
+        try:
+            with get_cursor() as (connection, cursor):
+                try:
+                    for title, sections, content_hash in articles:
+                        cursor.execute(
+                            "INSERT INTO article (title, normalized_title, content_hash) VALUES (%s, %s, %s)",
+                            (title, normalize_title(title), content_hash)
+                        )
+                        article_id = cursor.lastrowid
+                        shard_index = self.default_shard_index(article_id)
+                        cursor.execute(
+                            "INSERT INTO article_shard (article_id, shard) VALUES (%s, %s)",
+                            (article_id, shard_index)
+                        )
+                        placed.append((title, article_id, shard_index, sections))
+                    record_changes(cursor, [("article", article_id, article_id, "insert")
+                                            for _, article_id, _, _ in placed])
+                    bump_catalog_generation(cursor)
+                    connection.commit()
+                    invalidate_catalog_cache()
+                except Error:
+                    connection.rollback()
+                    raise
+        except Error as e:
+            print(f"在主库写入文章时出错: {e}")
+            return {}
+
+        with self._routes_lock:
+            self._routes.update({article_id: shard_index for _, article_id, shard_index, _ in placed})
+        by_shard = {}
+        for _, article_id, shard_index, sections in placed:
+            by_shard.setdefault(self.shards[shard_index], []).append((article_id, sections))
+        results = self._scatter([(shard, self._import_to_shard, items) for shard, items in by_shard.items()])
+
+        imported = {}
+        for shard_imported, shard_failed in results:
+            imported.update(shard_imported)
+            for article_id in shard_failed:
+                # 章节写入失败的文章从主库删除，避免目录中出现没有内容的文章
+                self.delete_article(article_id)
+        return {title: (article_id, imported[article_id])
+                for title, article_id, _, _ in placed if article_id in imported}
+
+    @instrumented
+    def import_articles(self, articles):
+        """
+        批量导入文章：新文章在主库写入文章和路由后，各分片并行写入章节和正文
+
+        同名文章已存在时不再插入（article.title 唯一），而是按 database.import_article 的规则
+        跳过、回填源文件哈希或通过 update_article_bulk 在分片上只重写变化的章节。
+
+        Args:
+            articles (list): [(文章题目, 章节列表, 源文件哈希或 None)]，章节格式同 insert_article_bulk
+
+        Returns:
+            dict: {文章题目: 文章ID}，包含新导入和已存在的文章，不含失败的文章
+        """
+        results, new_articles = {}, []
+        for title, sections, content_hash in articles:
+            if database.get_article_id_by_title(title) is None:
+                new_articles.append((title, sections, content_hash))
+                continue
+            result = database.import_article(title, sections, content_hash=content_hash)
+            if result:
+                results[title] = result[1]
+        results.update({title: article_id for title, (article_id, _) in self._import(new_articles).items()})
+        return results
+
+    def insert_article_bulk(self, title, sections, content_hash=None):
+        return self._import([(title, sections, content_hash)]).get(title)
+
+    def update_article_bulk(self, article_id, sections, content_hash=None):
+        """章节在分片上同步并提交后，再在主库更新文章的源文件哈希（中途失败时下次导入会重新比对）"""
+        shard = self.shard_for_article(article_id, create=True)
+        if shard is None:
+            return None
+        try:
+            with bind_shard(shard), get_cursor() as (connection, cursor):
+                try:
+                    stats = database._update_sections(cursor, article_id, sections)
+                    connection.commit()
+                except Error:
+                    connection.rollback()
+                    raise
+        except Error as e:
+            print(f"更新文章章节时出错: {e}")
+            return None
+        return stats if database.update_article_content_hash(article_id, content_hash) else None
+
+    def insert_title(self, article_id, title, level):
+        shard = self.shard_for_article(article_id, create=True)
+        if shard is None:
+            return None
+        with bind_shard(shard):
+            return database.insert_title(article_id, title, level)
+
+    def insert_plain_text(self, title_id, text_content):
+        return self._on_title_shard(database.insert_plain_text, title_id, text_content)
+
+    def delete_title_by_id(self, title_id):
+        return self._on_title_shard(database.delete_title_by_id, title_id)
+
+    def update_title(self, title_id, new_title, new_level):
+        return self._on_title_shard(database.update_title, title_id, new_title, new_level)
+
+    def update_plain_text_by_title_id(self, title_id, new_content):
+        return self._on_title_shard(database.update_plain_text_by_title_id, title_id, new_content)
+
+    def update_title_summary(self, title_id, summary):
+        return self._on_title_shard(database.update_title_summary, title_id, summary)
+
+    def clear_title_summaries(self, article_id):
+        return self._on_article_shard(database.clear_title_summaries, article_id, default=True)
+
+    def recompress_plain_texts(self, compression=None, batch_size=database.DEFAULT_BATCH_SIZE,
+                               allow_unsearchable=False):
+        return sum(self._scatter([
+            (shard, database.recompress_plain_texts, compression, batch_size, allow_unsearchable)
+            for shard in self.shards
+        ]))
+
+    @instrumented
+    def delete_article(self, article_id):
+        """
+        删除文章及其在分片上的章节和正文（变更日志中只记录文章的 delete）
+
+        先在分片上删除正文和章节，最后删除主库中的文章和路由。两次提交之间失败时文章和路由仍在，
+        分片上的删除可以重复执行，再次调用即可完成删除，不会留下没有章节的孤立正文。
+        """
+        shard = self.shard_for_article(article_id)
+        try:
+            if shard is not None:
+                with shard.cursor() as (connection, cursor):
+                    # 不依赖外键级联，显式删除正文
+                    cursor.execute(
+                        "DELETE FROM plain_text WHERE title_id IN (SELECT id FROM title WHERE article_id = %s)",
+                        (article_id,)
+                    )
+                    cursor.execute("DELETE FROM title WHERE article_id = %s", (article_id,))
+                    connection.commit()
+            with get_cursor() as (connection, cursor):
+                cursor.execute("DELETE FROM article_shard WHERE article_id = %s", (article_id,))
+                cursor.execute("DELETE FROM article WHERE id = %s", (article_id,))
+                record_change(cursor, "article", article_id, article_id, "delete")
+                bump_catalog_generation(cursor)
+                connection.commit()
+                invalidate_catalog_cache()
+            with self._routes_lock:
+                self._routes.pop(article_id, None)
+            return True
+        except Error as e:
+            print(f"删除分片文章时出错: {e}")
+            return False
+
+    def delete_article_by_title(self, title):
+        try:
+            with get_cursor() as (connection, cursor):
+                cursor.execute("SELECT id FROM article WHERE title = %s", (title,))
+                article_ids = [row[0] for row in cursor.fetchall()]
+        except Error as e:
+            print(f"删除文章时出错: {e}")
+            return False
+        return bool(article_ids) and all([self.delete_article(article_id) for article_id in article_ids])
+
+    # ---------- 读取 ----------
+
+    def get_titles_by_article_id(self, article_id):
+        return self._on_article_shard(database.get_titles_by_article_id, article_id, default=[])
+
+    def get_titles_by_article(self, title):
+        """文章匹配规则与 database.get_titles_by_article 相同"""
+        try:
+            with get_cursor() as (connection, cursor):
+                cursor.execute("""
+                    SELECT id FROM article
+                    WHERE title = %s OR normalized_title = %s
+                    ORDER BY title = %s DESC, id
+                    LIMIT 1
+                """, (title, normalize_title(title), title))
+                row = cursor.fetchone()
+        except Error as e:
+            print(f"获取标题列表时出错: {e}")
+            return []
+        return self.get_titles_by_article_id(row[0]) if row else []
+
+    def get_plain_text_by_title(self, title):
+        """在全部分片上查询，返回编号最小的分片上的结果"""
+        results = self._scatter([(shard, database.get_plain_text_by_title, title) for shard in self.shards])
+        return next((result for result in results if result is not None), None)
+
+    def get_plain_text_by_title_id(self, title_id):
+        return self._on_title_shard(database.get_plain_text_by_title_id, title_id)
+
+    def get_section_subtree(self, title_id):
+        return self._on_title_shard(database.get_section_subtree, title_id)
+
+    def get_section_ancestors(self, title_id):
+        return self._on_title_shard(database.get_section_ancestors, title_id)
+
+    def _gather_by_title(self, func, title_ids):
+        texts = {}
+        for result in self._scatter([(shard, func, ids) for shard, ids in self._group_titles(title_ids).items()]):
+            texts.update(result)
+        return texts
+
+    def get_plain_texts_by_title_ids(self, title_ids):
+        """按章节ID分组后在各分片上并行查询"""
+        return self._gather_by_title(database.get_plain_texts_by_title_ids, title_ids)
+
+    def get_section_bodies(self, title_ids):
+        """body_title_id 与章节属于同一文章，因此一定在同一分片"""
+        return self._gather_by_title(database.get_section_bodies, title_ids)
+
+    def get_article_tree(self, article_id):
+        """主库读取文章和路由、分片读取章节，共两次查询；章节在返回前全部读出"""
+        try:
+            with get_cursor() as (connection, cursor):
+                cursor.execute("""
+                    SELECT a.id, a.title, a.summary, s.shard
+                    FROM article a
+                    LEFT JOIN article_shard s ON s.article_id = a.id
+                    WHERE a.id = %s
+                """, (article_id,))
+                row = cursor.fetchone()
+        except Error as e:
+            print(f"获取文章内容时出错: {e}")
+            return None, iter(())
+        if row is None:
+            return None, iter(())
+        article, shard_index = row[:3], row[3]
+        if shard_index is None:
+            return article, iter(())
+        try:
+            with self.shards[shard_index].cursor() as (connection, cursor):
+                cursor.execute(f"""
+                    SELECT t.id, t.title, t.level, t.summary, {PLAIN_TEXT_COLUMNS}
+                    FROM title t LEFT JOIN plain_text pt ON pt.title_id = t.id
+                    WHERE t.article_id = %s
+                    ORDER BY t.path, t.id
+                """, (article_id,))
+                sections = [row[:4] + (decode_plain_text(*row[4:]),) for row in cursor.fetchall()]
+        except Error as e:
+            print(f"获取文章内容时出错: {e}")
+            sections = []
+        return article, iter(sections)
+
+    def get_all_sections(self):
+        sections, bodies = [], {}
+        for shard_sections, shard_bodies in self._scatter([(shard, database.get_all_sections)
+                                                           for shard in self.shards]):
+            sections.extend(shard_sections)
+            bodies.update(shard_bodies)
+        return sections, bodies
+
+    @staticmethod
+    def _search_shard(statement):
+        with get_cursor() as (connection, cursor):
+            cursor.execute(*statement)
+            return [(title_id, art_id, title, float(score)) for title_id, art_id, title, score in cursor.fetchall()]
+
+    def search_sections(self, query, article_id=None, limit=10):
+        """
+        指定文章时只查询该文章所在分片，否则在全部分片上检索后按得分合并
+
+        各分片独立计算词频统计，跨分片的得分只是近似可比。
+        """
+        statement = search_sections_sql(query, article_id, limit)
+        if statement is None:
+            return []
+        if article_id is not None:
+            shard = self.shard_for_article(article_id)
+            shards = [shard] if shard is not None else []
+        else:
+            shards = self.shards
+        try:
+            results = self._scatter([(shard, self._search_shard, statement) for shard in shards])
+        except Error as e:
+            print(f"全文检索章节时出错: {e}")
+            return []
+        return heapq.nlargest(limit, (hit for hits in results for hit in hits), key=lambda hit: hit[3])
+
+    def _iter_shard_sections(self, shard, batch_size):
+        # 各分片的生成器在同一线程中交替推进，不能使用线程级的分片绑定
+        with shard.cursor(shared=False) as (connection, cursor):
+            cursor.execute(f"""
+                SELECT t.article_id, t.id, t.level, t.title, t.summary, {PLAIN_TEXT_COLUMNS}
+                FROM title t
+                LEFT JOIN plain_text pt ON pt.title_id = t.id
+                ORDER BY t.article_id, t.path, t.id
+            """)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row[:4] + (decode_plain_text(*row[5:]), row[4])
+
+    def iter_sections(self, batch_size=database.DEFAULT_BATCH_SIZE):
+        """按文章ID归并遍历全部分片的章节（一篇文章只在一个分片上，文章内保持文档顺序）"""
+        try:
+            yield from heapq.merge(
+                *(self._iter_shard_sections(shard, batch_size) for shard in self.shards),
+                key=lambda row: row[0]
+            )
+        except Error as e:
+            print(f"遍历章节时出错: {e}")
+
+    def shard_stats(self):
+        """返回各分片的 (分片编号, 地址, 文章数, 章节数, 正文数)"""
+        def count():
+            shard = database.bound_shard()
+            with get_cursor() as (connection, cursor):
+                cursor.execute("SELECT COUNT(DISTINCT article_id), COUNT(*) FROM title")
+                articles, titles = cursor.fetchone()
+                cursor.execute("SELECT COUNT(*) FROM plain_text")
+                return shard.index, shard.address, articles, titles, cursor.fetchone()[0]
+        return self._scatter([(shard, count) for shard in self.shards])
+
+
+def check_shards(store):
+    """
+    在配置的分片上做一次往返检查（例如两个本地 mysqld 端口），返回是否全部通过
+
+    写入临时文章（每个分片至少两篇），检查章节ID分配、读取、重新导入、编辑、变更日志和删除，结束时删除临时文章。
+    """
+    titles = [f"__分片检查__ {i}" for i in range(2 * len(store.shards))]
+    for title in titles:
+        store.delete_article_by_title(title)
+    failures = []
+
+    def expect(condition, message):
+        print(f"  [{'通过' if condition else '失败'}] {message}")
+        if not condition:
+            failures.append(message)
+
+    def sections_of(title, revision):
+        return [
+            {"title": f"{title} 概述", "level": 1, "content": f"{title} 第{revision}版概述"},
+            {"title": f"{title} 细节", "level": 2, "content": ""},
+            {"title": f"{title} 细节一", "level": 3, "content": f"{title} 细节一正文"},
+        ]
+
+    version = database.get_latest_change_version()
+    imported = store.import_articles([(title, sections_of(title, 1), f"{title} v1") for title in titles])
+    expect(len(imported) == len(titles), f"导入 {len(imported)}/{len(titles)} 篇文章")
+    for title, article_id in imported.items():
+        shard = store.shard_for_article(article_id)
+        title_ids = [row[0] for row in database.get_titles_by_article_id(article_id)]
+        expect(len(title_ids) == 3 and all(store.shard_for_title(title_id) is shard for title_id in title_ids),
+               f"文章 {article_id} 的章节ID {title_ids} 属于分片 {shard.index}")
+        article, rows = database.get_article_tree(article_id)
+        contents = [s["content"] or None for s in sections_of(title, 1)]
+        expect(article is not None and [row[4] for row in rows] == contents, f"文章 {article_id} 的文章树与导入内容一致")
+        bodies = database.get_section_bodies(title_ids)
+        expect(bodies.get(title_ids[1]) == f"{title} 细节一正文", f"文章 {article_id} 的无正文章节解析到子章节正文")
+
+    title = titles[0]
+    article_id = imported.get(title)
+    if article_id is not None:
+        before = [row[0] for row in database.get_titles_by_article_id(article_id)]
+        again = store.import_articles([(title, sections_of(title, 2), f"{title} v2")])
+        after = [row[0] for row in database.get_titles_by_article_id(article_id)]
+        expect(again.get(title) == article_id and after == before, "同名文章重新导入时原地更新，章节ID不变")
+        expect(database.get_plain_text_by_title_id(after[0]) == f"{title} 第2版概述", "重新导入后正文已更新")
+        expect(database.update_plain_text_by_title_id(after[1], "编辑后的正文")
+               and database.get_plain_text_by_title_id(after[1]) == "编辑后的正文", "按章节ID编辑正文")
+        expect(database.update_title_summary(after[0], "检查摘要")
+               and database.get_titles_by_article_id(article_id)[0][3] == "检查摘要", "更新章节摘要")
+
+    changes = database.get_changes_since(version, limit=10000)
+    logged = {(entity, article_id) for _, entity, _, article_id, _ in changes}
+    expect(all(("title", article_id) in logged and ("plain_text", article_id) in logged
+               for article_id in imported.values()),
+           "分片上的章节和正文写入都记录在主库的变更日志中")
+
+    for title in titles:
+        store.delete_article_by_title(title)
+    expect(all(not database.get_titles_by_article_id(article_id) for article_id in imported.values()),
+           "删除后分片上没有残留章节")
+    for shard in store.shards:
+        with shard.cursor() as (connection, cursor):
+            cursor.execute(
+                "SELECT COUNT(*) FROM plain_text pt LEFT JOIN title t ON t.id = pt.title_id WHERE t.id IS NULL"
+            )
+            expect(cursor.fetchone()[0] == 0, f"分片 {shard.index} 上没有孤立正文")
+    print("分片检查通过" if not failures else f"分片检查失败 {len(failures)} 项")
+    return not failures
+
+
+def import_markdown_directory(store, markdown_dir=None):
+    """解析 markdown_output 中的全部文件并通过分片存储并行导入（跳过内容未变化的文件）"""
+    from import_markdown_to_db import parse_markdown_file
+
+    markdown_dir = markdown_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), "markdown_output")
+    articles = []
+    for filename in sorted(os.listdir(markdown_dir)):
+        if not filename.lower().endswith(".md"):
+            continue
+        file_path = os.path.join(markdown_dir, filename)
+        with open(file_path, "rb") as f:
+            content_hash = database.compute_content_hash(f.read())
+        if database.get_article_id_by_content_hash(content_hash):
+            print(f"[跳过] 文件 '{filename}' 未变化")
+            continue
+        article_title, sections = parse_markdown_file(file_path)
+        if sections:
+            articles.append((article_title, sections, content_hash))
+
+    start = time.perf_counter()
+    imported = store.import_articles(articles)
+    print(f"导入 {len(imported)}/{len(articles)} 篇文章到 {len(store.shards)} 个分片，"
+          f"耗时 {time.perf_counter() - start:.2f} 秒")
+    return imported
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    sharded_store = database.get_sharded_store()
+    if sharded_store is None:
+        sys.exit("未配置分片，请设置 DB_SHARDS")
+    if command == "init":
+        # 主库迁移完成后会在各分片上建表
+        database.create_database_and_tables()
+    elif command == "import":
+        import_markdown_directory(sharded_store)
+    elif command == "check":
+        if not check_shards(sharded_store):
+            sys.exit(1)
+    for index, address, article_count, title_count, text_count in sharded_store.shard_stats():
+        print(f"分片 {index} ({address}): 文章 {article_count}，章节 {title_count}，正文 {text_count}")
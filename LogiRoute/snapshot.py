@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+语料快照的导出与加载
+
+把文章、章节、正文、摘要以及入库时计算的派生列（内容哈希、章节层级、body_title_id、
+压缩正文）导出为单个带版本号的 Parquet 文件。新的检索节点加载快照即可提供服务，
+无需重新执行 OCR 导入和摘要生成。全文索引由数据库在写入时自动维护。
+
+三张表写入同一个宽表：table 列标明行所属的表，其余列按需填充（Parquet 对空列几乎不占空间）。
+
+用法:
+    python snapshot.py export [快照文件]    # 默认 rag_snapshot.parquet
+    python snapshot.py load [快照文件]      # 清空现有数据后加载，并打印各阶段耗时
+"""
+
+import os
+import sys
+import time
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import (
+    DB_BACKEND, DB_SHARDS, Error, bump_catalog_generation, create_database_and_tables,
+    get_cursor, invalidate_catalog_cache, record_change,
+)
+
+# 快照文件格式版本，列结构变化时递增
+SNAPSHOT_FORMAT_VERSION = 1
+DEFAULT_SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rag_snapshot.parquet")
+# 加载时每次 executemany 写入的行数
+LOAD_BATCH_SIZE = 1000
+
+# 各表导出的列，顺序即插入顺序；列名与数据库一致
+TABLE_COLUMNS = {
+    "article": ["id", "title", "normalized_title", "summary", "content_hash"],
+    "title": ["id", "article_id", "title", "level", "summary", "content_hash",
+              "parent_id", "position", "path", "body_title_id"],
+    "plain_text": ["id", "title_id", "text_content", "content_format", "compressed_content"],
+}
+
+# 宽表的列类型
+SNAPSHOT_SCHEMA = pa.schema([
+    ("table", pa.dictionary(pa.int8(), pa.string())),
+    ("id", pa.int64()),
+    ("article_id", pa.int64()),
+    ("title_id", pa.int64()),
+    ("title", pa.string()),
+    ("normalized_title", pa.string()),
+    ("level", pa.int32()),
+    ("summary", pa.string()),
+    ("content_hash", pa.string()),
+    ("parent_id", pa.int64()),
+    ("position", pa.int32()),
+    ("path", pa.string()),
+    ("body_title_id", pa.int64()),
+    ("text_content", pa.string()),
+    ("content_format", pa.string()),
+    ("compressed_content", pa.binary()),
+])
+
+
+def _schema_version(cursor):
+    cursor.execute("SELECT MAX(version) FROM schema_migrations")
+    return cursor.fetchone()[0] or 0
+
+def export_snapshot(path=DEFAULT_SNAPSHOT_PATH):
+    """
+    导出当前数据库为快照文件
+
+    Returns:
+        dict: 各表行数，失败时返回 None
+    """
+    if DB_SHARDS:
+        print("快照只包含主库中的表，配置了 DB_SHARDS 时无法导出")
+        return None
+    start = time.perf_counter()
+    columns = {field.name: [] for field in SNAPSHOT_SCHEMA}
+    counts = {}
+    try:
+        with get_cursor() as (connection, cursor):
+            schema_version = _schema_version(cursor)
+            for table, table_columns in TABLE_COLUMNS.items():
+                cursor.execute(f"SELECT {', '.join(table_columns)} FROM {table} ORDER BY id")
+                rows = cursor.fetchall()
+                counts[table] = len(rows)
+                columns["table"].extend([table] * len(rows))
+                for name, values in columns.items():
+                    if name == "table":
+                        continue
+                    if name in table_columns:
+                        index = table_columns.index(name)
+                        values.extend(row[index] for row in rows)
+                    else:
+                        values.extend([None] * len(rows))
+    except Error as e:
+        print(f"导出快照时出错: {e}")
+        return None
+
+    snapshot = pa.table(columns, schema=SNAPSHOT_SCHEMA).replace_schema_metadata({
+        "snapshot_format_version": str(SNAPSHOT_FORMAT_VERSION),
+        "schema_version": str(schema_version),
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    })
+    pq.write_table(snapshot, path, compression="zstd")
+    elapsed = time.perf_counter() - start
+    print(f"快照已导出到 {path}（{os.path.getsize(path) / 1024:.1f} KB，耗时 {elapsed:.2f} 秒）: {counts}")
+    return counts
+
+def read_snapshot(path=DEFAULT_SNAPSHOT_PATH):
+    """
+    读取快照文件并校验版本
+
+    Returns:
+        tuple: (元数据字典, {表名: [行元组, ...]})，行元组的列顺序与 TABLE_COLUMNS 一致
+    """
+    snapshot = pq.read_table(path)
+    metadata = {key.decode(): value.decode() for key, value in (snapshot.schema.metadata or {}).items()}
+    version = int(metadata.get("snapshot_format_version", 0))
+    if version != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"不支持的快照格式版本 {version}，当前版本为 {SNAPSHOT_FORMAT_VERSION}")
+
+    tables = {}
+    for table, table_columns in TABLE_COLUMNS.items():
+        rows = snapshot.filter(pc.equal(snapshot["table"].cast(pa.string()), table)).select(table_columns)
+        columns = rows.to_pydict()
+        tables[table] = list(zip(*(columns[name] for name in table_columns)))
+    return metadata, tables
+
+def load_snapshot(path=DEFAULT_SNAPSHOT_PATH):
+    """
+    清空现有数据并在一个事务中加载快照
+
+    Returns:
+        dict: 各阶段耗时（秒），失败时返回 None
+    """
+    if DB_SHARDS:
+        print("快照只能加载到主库中的表，配置了 DB_SHARDS 时无法加载")
+        return None
+    timings = {}
+    start = time.perf_counter()
+    metadata, tables = read_snapshot(path)
+    timings["read"] = time.perf_counter() - start
+
+    create_database_and_tables()
+    try:
+        with get_cursor() as (connection, cursor):
+            schema_version = _schema_version(cursor)
+            if schema_version < int(metadata.get("schema_version", 0)):
+                print(f"数据库结构版本 {schema_version} 低于快照的版本 {metadata['schema_version']}，无法加载")
+                return None
+            try:
+                phase = time.perf_counter()
+                # 删除文章会级联删除章节和正文
+                cursor.execute("DELETE FROM article")
+                timings["clear"] = time.perf_counter() - phase
+
+                for table, table_columns in TABLE_COLUMNS.items():
+                    phase = time.perf_counter()
+                    rows = tables[table]
+                    sql = (f"INSERT INTO {table} ({', '.join(table_columns)}) "
+                           f"VALUES ({', '.join(['%s'] * len(table_columns))})")
+                    for i in range(0, len(rows), LOAD_BATCH_SIZE):
+                        cursor.executemany(sql, rows[i:i + LOAD_BATCH_SIZE])
+                    timings[table] = time.perf_counter() - phase
+
+                # 全部数据被替换，变更日志的消费者需要全量重建
+                record_change(cursor, "corpus", 0, None, "reload")
+                bump_catalog_generation(cursor)
+                phase = time.perf_counter()
+                connection.commit()
+                timings["commit"] = time.perf_counter() - phase
+                invalidate_catalog_cache()
+            except Error:
+                connection.rollback()
+                raise
+    except Error as e:
+        print(f"加载快照时出错: {e}")
+        return None
+
+    timings["total"] = time.perf_counter() - start
+    counts = {table: len(rows) for table, rows in tables.items()}
+    print(f"快照 {path}（创建于 {metadata.get('created_at')}）已加载到 {DB_BACKEND}: {counts}")
+    print("耗时: " + ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in timings.items()))
+    return timings
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("export", "load"):
+        print(__doc__)
+        sys.exit(1)
+    snapshot_path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_SNAPSHOT_PATH
+    if sys.argv[1] == "export":
+        export_snapshot(snapshot_path)
+    else:
+        load_snapshot(snapshot_path)
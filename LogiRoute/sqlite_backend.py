@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQLite 嵌入式存储后端
+
+设置环境变量 DB_BACKEND=sqlite 后，database.py 中的全部辅助函数改为使用本地 SQLite 文件，
+检索、评估和前端脚本无需 MySQL 服务即可在进程内运行。
+
+- 连接启用 WAL 模式，读写互不阻塞。
+- 游标兼容 mysql.connector 的用法：%s 占位符、dictionary=True 等。
+- 通过 fts5_available() 检测当前 SQLite 是否支持 FTS5 全文检索；不支持时迁移跳过全文索引，检索退回 LIKE 匹配。
+- register_function() 注册的 Python 函数在每个连接上都可以在SQL中调用（如解码压缩存储的正文）。
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+Error = sqlite3.Error
+
+# 注册到每个连接的SQL函数：名称 -> (参数个数, 函数)
+_functions = {}
+
+def register_function(name, num_params, func):
+    """注册在每个 SQLite 连接上可调用的SQL函数（对之后打开的连接生效）"""
+    _functions[name] = (num_params, func)
+
+
+class SQLiteCursor:
+    """把 mysql.connector 风格的SQL（%s 占位符）转换为 sqlite3 风格（? 占位符）"""
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    @staticmethod
+    def _convert(sql, params):
+        sql = sql.replace("%s", "?")
+        if params is not None:
+            # mysql.connector 中 %% 表示字面量 %
+            sql = sql.replace("%%", "%")
+        return sql
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {column[0]: value for column, value in zip(self._cursor.description, row)}
+
+    def execute(self, sql, params=None):
+        self._cursor.execute(self._convert(sql, params), tuple(params) if params is not None else ())
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(self._convert(sql, ()), [tuple(p) for p in seq_of_params])
+        return self
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        for row in self._cursor:
+            yield self._row(row)
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """sqlite3 连接的薄封装，提供与 mysql.connector 连接一致的方法"""
+
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("PRAGMA foreign_keys=ON")
+        for name, (num_params, func) in _functions.items():
+            self._connection.create_function(name, num_params, func, deterministic=True)
+
+    def cursor(self, dictionary=False, **kwargs):
+        # buffered 等 mysql.connector 专有参数对 SQLite 没有意义，直接忽略
+        return SQLiteCursor(self._connection.cursor(), dictionary=dictionary)
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        self._connection.close()
+
+
+class SQLiteConnectionPool:
+    """
+    SQLite 连接管理，接口与 database.ConnectionPool 一致
+
+    每个线程持有一个长期打开的连接（SQLite 连接不能跨线程使用，且打开成本很低）；
+    shared=False 时为流式读取等场景单独打开一个连接，用完即关闭。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _thread_connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = SQLiteConnection(self.path)
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def connection(self, shared=True):
+        connection = self._thread_connection() if shared else SQLiteConnection(self.path)
+        try:
+            yield connection
+        except BaseException:
+            try:
+                connection.rollback()
+            except Error:
+                pass
+            raise
+        finally:
+            if not shared:
+                connection.close()
+
+
+def create_tables(connection):
+    """创建 article、title 和 plain_text 表（与 MySQL 结构一致，索引由迁移负责）"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS article (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title VARCHAR(255) NOT NULL UNIQUE,
+                summary TEXT
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS title (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                article_id INT,
+                title VARCHAR(255) NOT NULL,
+                level INT NOT NULL,
+                summary TEXT,
+                FOREIGN KEY (article_id) REFERENCES article(id) ON DELETE CASCADE
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS plain_text (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title_id INT,
+                text_content TEXT,
+                FOREIGN KEY (title_id) REFERENCES title(id) ON DELETE CASCADE
+            )
+        """)
+        connection.commit()
+    finally:
+        cursor.close()
+
+
+def fts5_available(connection):
+    """检测当前 SQLite 是否支持 FTS5 全文检索及其 trigram 分词器（SQLite 3.34 起提供）"""
+    if sqlite3.sqlite_version_info < (3, 34, 0):
+        return False
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+    finally:
+        cursor.close()